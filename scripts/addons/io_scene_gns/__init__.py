@@ -15,8 +15,16 @@ if "bpy" in locals():
     import importlib
     if "import_gns" in locals():
         importlib.reload(import_gns)
+    if "visibility" in locals():
+        importlib.reload(visibility)
     if "export_gns" in locals():
         importlib.reload(export_gns)
+    if "select_gns" in locals():
+        importlib.reload(select_gns)
+    if "pick_gns" in locals():
+        importlib.reload(pick_gns)
+    if "visangle_gns" in locals():
+        importlib.reload(visangle_gns)
 
 import bpy
 from bpy.props import (
@@ -25,6 +33,7 @@ from bpy.props import (
     FloatProperty,
     StringProperty,
     EnumProperty,
+    CollectionProperty,
 )
 from bpy_extras.io_utils import (
     ImportHelper,
@@ -35,6 +44,17 @@ from bpy_extras.io_utils import (
 )
 
 
+# one (arrangement, night, weather) map state in the import options
+class GNSMapStateItem(bpy.types.PropertyGroup):
+    arrangement : IntProperty()
+    isNight : BoolProperty()
+    weather : IntProperty()
+    use : BoolProperty(
+        name = "Import",
+        default = True,
+    )
+
+
 @orientation_helper(axis_forward='Z', axis_up='-Y')
 class ImportGNS(bpy.types.Operator, ImportHelper):
     bl_idname = "import_scene.gns"
@@ -47,6 +67,21 @@ class ImportGNS(bpy.types.Operator, ImportHelper):
         options = {'HIDDEN'},
     )
 
+    # shift/ctrl-click in the file browser picks more than one map
+    files : CollectionProperty(
+        type = bpy.types.OperatorFileListElement,
+        options = {'HIDDEN', 'SKIP_SAVE'},
+    )
+    directory : StringProperty(
+        subtype = 'DIR_PATH',
+        options = {'HIDDEN', 'SKIP_SAVE'},
+    )
+    use_directory : BoolProperty(
+        name = "Whole Directory",
+        description = "Import every .GNS in the picked file's directory, each into its own collection",
+        default = False,
+    )
+
 	# hmm I'm phasing this out ... not sure in place of what ...
 	# should maps be all (28,24,28) scaled?  should they be (28,28,28) scaled?
 	# should they be not scaled?
@@ -66,19 +101,81 @@ class ImportGNS(bpy.types.Operator, ImportHelper):
         default = 28.0,
     )
 
+    drop_decoded_textures : BoolProperty(
+        name = "Drop Decoded Textures",
+        description = "Free each texture's decoded color indexes once its Blender image is made, keeping only the packed 4bpp data",
+        default = True,
+    )
+    weld_vertices : BoolProperty(
+        name = "Weld Vertices",
+        description = "Share one vertex between polygon corners at the same position, normals and UVs stay per-corner.  Exports back the same",
+        default = False,
+    )
+    reuse_datablocks : BoolProperty(
+        name = "Reuse Datablocks",
+        description = "Reuse the images, palettes, materials, lights and background of an earlier import when they were made from the same data, instead of making copies",
+        default = True,
+    )
+
+    # filled in by check() with the map states of the picked file
+    map_states : CollectionProperty(
+        type = GNSMapStateItem,
+        options = {'HIDDEN'},
+    )
+    map_states_file : StringProperty(
+        options = {'HIDDEN'},
+    )
+
+    background : BoolProperty(
+        name = "Background Import",
+        description = "Import without freezing Blender, showing progress in the status bar.  Esc cancels and removes everything imported so far",
+        default = False,
+    )
+
     def execute(self, context):
         # print("Selected: " + context.active_object.name)
         from . import import_gns
 
+        import os
         keywords = self.as_keywords(
             ignore=(
                 "axis_forward",
                 "axis_up",
                 "filter_glob",
                 "split_mode",
+                "background",
+                "map_states",
+                "map_states_file",
+                "filepath",
+                "files",
+                "directory",
+                "use_directory",
             ),
         )
 
+        if self.use_directory:
+            filepaths = import_gns.listMaps(os.path.dirname(self.filepath))
+        elif len(self.files) > 1:
+            filepaths = [os.path.join(self.directory, file.name) for file in self.files]
+        else:
+            filepaths = [self.filepath]
+        if len(filepaths) == 0:
+            self.report({'ERROR'}, "no .GNS files to import")
+            return {'CANCELLED'}
+        keywords["filepaths"] = filepaths
+
+        # only import the checked map states, and only of the file the list is of
+        if self.map_states_file == self.filepath and self.filepath in filepaths:
+            mapStates = [
+                (item.arrangement, int(item.isNight), item.weather)
+                for item in self.map_states
+                if item.use
+            ]
+            if len(mapStates) == 0:
+                self.report({'ERROR'}, "no map states are checked")
+                return {'CANCELLED'}
+            keywords["map_states"] = {self.filepath: mapStates}
+
         global_matrix = axis_conversion(
             from_forward=self.axis_forward,
             from_up=self.axis_up,
@@ -86,11 +183,68 @@ class ImportGNS(bpy.types.Operator, ImportHelper):
         keywords["global_matrix"] = global_matrix
 
         if bpy.data.is_saved and context.preferences.filepaths.use_relative_paths:
-            import os
             keywords["relpath"] = os.path.dirname(bpy.data.filepath)
 
+        if self.background:
+            self.job = import_gns.BackgroundLoad(context, **keywords)
+            wm = context.window_manager
+            self.timer = wm.event_timer_add(.1, window=context.window)
+            wm.modal_handler_add(self)
+            return {'RUNNING_MODAL'}
+
         return import_gns.load(context, **keywords)
 
+    # the file browser calls this when the picked file changes
+    # scan the new file's records for its map states
+    def check(self, context):
+        changed = super().check(context)
+        if self.map_states_file == self.filepath:
+            return changed
+        from . import gns
+        import os
+        self.map_states_file = self.filepath
+        self.map_states.clear()
+        if os.path.isfile(self.filepath):
+            try:
+                mapStates = gns.GNS.readMapStates(self.filepath)
+            except Exception as e:
+                print("failed to read map states of", self.filepath, e)
+                mapStates = []
+            for (arrangement, isNight, weather) in mapStates:
+                item = self.map_states.add()
+                item.name = ('cfg=' + str(arrangement)
+                    + ' ' + ('night' if isNight else 'day')
+                    + ' weather=' + str(weather))
+                item.arrangement = arrangement
+                item.isNight = isNight
+                item.weather = weather
+        return True
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.job.cancel()
+            self.endModal(context)
+            self.report({'WARNING'}, "GNS import cancelled")
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            if self.job.error != None:
+                self.endModal(context)
+                self.report({'ERROR'}, "GNS import failed: " + str(self.job.error))
+                return {'CANCELLED'}
+            if self.job.done:
+                self.job.finish(context)
+                self.endModal(context)
+                return {'FINISHED'}
+            context.workspace.status_text_set(self.job.statusText())
+
+        # let the rest of blender keep working while we import
+        return {'PASS_THROUGH'}
+
+    def endModal(self, context):
+        context.window_manager.event_timer_remove(self.timer)
+        context.workspace.status_text_set(None)
+
     def draw(self, context):
         pass
 
@@ -116,6 +270,39 @@ class GNS_PT_import_include(bpy.types.Panel):
         sfile = context.space_data
         operator = sfile.active_operator
 
+        layout.prop(operator, "drop_decoded_textures")
+        layout.prop(operator, "weld_vertices")
+        layout.prop(operator, "reuse_datablocks")
+        layout.prop(operator, "use_directory")
+        layout.prop(operator, "background")
+
+
+class GNS_PT_import_map_states(bpy.types.Panel):
+    bl_space_type = 'FILE_BROWSER'
+    bl_region_type = 'TOOL_PROPS'
+    bl_label = "Map States"
+    bl_parent_id = "FILE_PT_operator"
+
+    @classmethod
+    def poll(cls, context):
+        sfile = context.space_data
+        operator = sfile.active_operator
+
+        return operator.bl_idname == "IMPORT_SCENE_OT_gns"
+
+    def draw(self, context):
+        layout = self.layout
+
+        sfile = context.space_data
+        operator = sfile.active_operator
+
+        if len(operator.map_states) == 0:
+            layout.label(text = "pick a .gns file to see its map states")
+            return
+        col = layout.column(heading = "Import", align = True)
+        for item in operator.map_states:
+            col.prop(item, "use", text = item.name)
+
 
 class GNS_PT_import_transform(bpy.types.Panel):
     bl_space_type = 'FILE_BROWSER'
@@ -215,9 +402,23 @@ class ExportGNS(bpy.types.Operator, ExportHelper):
     # TOOD texAnim, palAnim, meshAnim
     use_visangles : BoolProperty(
         name = "Vis. Angles",
-        description = "Write Visibility Angles",
+        description = "Write the visibility angles into chunk 0x2c, otherwise the chunk is left as it was",
         default = True,
     )
+    polygon_limits : EnumProperty(
+        name = "Polygon Limits",
+        description = "How many polygons of each type the mesh can have, tris get merged into quads and hidden faces dropped to fit",
+        items = (
+            ('VISANGLES', "Vis. Angle Slots", "As many as the visibility angle chunk has room for, 512/768/64/256"),
+            ('GANESHADX', "GaneshaDx", "The lower counts GaneshaDx sticks to, 360/710/64/256"),
+        ),
+        default = 'VISANGLES',
+    )
+    compute_visangles : BoolProperty(
+        name = "Compute Vis. Angles",
+        description = "Raycast which camera angles each face is hidden from, instead of using the mesh's hidden<angle> face attributes",
+        default = False,
+    )
 
     path_mode : path_reference_mode
 
@@ -278,6 +479,8 @@ class GNS_PT_export_include(bpy.types.Panel):
         layout.prop(operator, 'use_lights')
         # TOOD texAnim, palAnim, meshAnim
         layout.prop(operator, 'use_visangles')
+        layout.prop(operator, 'polygon_limits')
+        layout.prop(operator, 'compute_visangles')
 
 
 class GNS_PT_export_transform(bpy.types.Panel):
@@ -301,7 +504,6 @@ class GNS_PT_export_transform(bpy.types.Panel):
         sfile = context.space_data
         operator = sfile.active_operator
 
-        layout.prop(operator, 'global_scale')
         layout.prop(operator, 'path_mode')
         layout.prop(operator, 'axis_forward')
         layout.prop(operator, 'axis_up')
@@ -330,6 +532,169 @@ class GNS_PT_export_geometry(bpy.types.Panel):
         operator = sfile.active_operator
 
 
+class GNS_OT_select_tile_polygons(bpy.types.Operator):
+    bl_idname = "mesh.gns_select_tile_polygons"
+    bl_label = "Select GNS Tile Polygons"
+    bl_description = "Select the mesh faces on the selected tiles, or the tiles under the selected mesh faces, of the selected tile meshes and mesh"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    direction : EnumProperty(
+        name = "Direction",
+        items = (
+            ('TILES_TO_MESH', "Tiles to Mesh", "Select the mesh faces that sit on the selected tiles"),
+            ('MESH_TO_TILES', "Mesh to Tiles", "Select the tiles under the selected mesh faces"),
+        ),
+        default = 'TILES_TO_MESH',
+    )
+    extend : BoolProperty(
+        name = "Extend",
+        description = "Add to the current selection instead of replacing it",
+        default = False,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode in {'OBJECT', 'EDIT_MESH'}
+
+    def execute(self, context):
+        from . import select_gns
+        result = select_gns.selectLinked(context, self.direction, self.extend)
+        if isinstance(result, str):
+            self.report({'ERROR'}, result)
+            return {'CANCELLED'}
+        self.report({'INFO'}, "selected %d faces" % result)
+        return {'FINISHED'}
+
+
+def visAngleItems():
+    from . import gns
+    return [('ALL', "All Faces", "Show every face again")] + [
+        (name, name, "Only show the faces the game draws with the camera at " + name)
+        for name in gns.visAngleNames
+    ]
+
+class GNS_OT_show_vis_angle(bpy.types.Operator):
+    bl_idname = "object.gns_show_vis_angle"
+    bl_label = "Show GNS Vis Angle"
+    bl_description = "Only show the faces of the selected imported meshes that the game draws from one camera angle, using a geometry nodes modifier"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    angle : EnumProperty(
+        name = "Camera Angle",
+        items = visAngleItems(),
+        default = 'ALL',
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == 'OBJECT'
+
+    def execute(self, context):
+        from . import gns
+        from . import visangle_gns
+        angle = None if self.angle == 'ALL' else gns.visAngleNames.index(self.angle)
+        numShown, numFaces = visangle_gns.showVisAngle(context.selected_objects, angle)
+        if numFaces == 0:
+            self.report({'ERROR'}, "no selected mesh has the hidden<angle> face attributes")
+            return {'CANCELLED'}
+        self.report({'INFO'}, "showing %d of %d faces" % (numShown, numFaces))
+        return {'FINISHED'}
+
+
+class GNSFaceAttribute(bpy.types.PropertyGroup):
+    isBool : BoolProperty()
+    intValue : IntProperty(name = "Value")
+    boolValue : BoolProperty(name = "Value")
+
+
+class GNS_OT_edit_face_attributes(bpy.types.Operator):
+    bl_idname = "mesh.gns_edit_face_attributes"
+    bl_label = "Edit GNS Face Attributes"
+    bl_description = "Edit the custom attributes of one face"
+    bl_options = {'REGISTER', 'UNDO', 'INTERNAL'}
+
+    objectName : StringProperty(options = {'HIDDEN'})
+    faceIndex : IntProperty(options = {'HIDDEN'})
+    attributes : CollectionProperty(type = GNSFaceAttribute, options = {'HIDDEN'})
+
+    def invoke(self, context, event):
+        from . import pick_gns
+        mesh = bpy.data.objects[self.objectName].data
+        self.attributes.clear()
+        for attr in pick_gns.editableAttributes(mesh):
+            item = self.attributes.add()
+            item.name = attr.name
+            item.isBool = attr.data_type == 'BOOLEAN'
+            if item.isBool:
+                item.boolValue = attr.data[self.faceIndex].value
+            else:
+                item.intValue = attr.data[self.faceIndex].value
+        return context.window_manager.invoke_props_dialog(self)
+
+    def draw(self, context):
+        layout = self.layout
+        layout.label(text = self.objectName + ' face ' + str(self.faceIndex))
+        for item in self.attributes:
+            layout.prop(item, 'boolValue' if item.isBool else 'intValue', text = item.name)
+
+    def execute(self, context):
+        obj = bpy.data.objects.get(self.objectName)
+        if obj == None or self.faceIndex >= len(obj.data.polygons):
+            return {'CANCELLED'}
+        for item in self.attributes:
+            attr = obj.data.attributes.get(item.name)
+            if attr != None:
+                attr.data[self.faceIndex].value = item.boolValue if item.isBool else item.intValue
+        return {'FINISHED'}
+
+
+class GNS_OT_pick_face(bpy.types.Operator):
+    bl_idname = "view3d.gns_pick_face"
+    bl_label = "Pick GNS Faces"
+    bl_description = "Hover over imported tile and mesh faces to see their custom attributes, click to edit them, right-click or Esc to stop"
+
+    @classmethod
+    def poll(cls, context):
+        return context.area != None and context.area.type == 'VIEW_3D' and context.mode == 'OBJECT'
+
+    def invoke(self, context, event):
+        context.window_manager.modal_handler_add(self)
+        context.area.header_text_set("Pick GNS Faces: hover to inspect, click to edit, right-click or Esc to stop")
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        from . import pick_gns
+        if event.type in {'RIGHTMOUSE', 'ESC'}:
+            context.area.header_text_set(None)
+            return {'FINISHED'}
+        if not (event.type == 'MOUSEMOVE' or (event.type == 'LEFTMOUSE' and event.value == 'PRESS')):
+            return {'PASS_THROUGH'}
+
+        # the operator might have been started from a menu, so find the view's main region ourselves
+        region = next(r for r in context.area.regions if r.type == 'WINDOW')
+        mouseCoord = (event.mouse_x - region.x, event.mouse_y - region.y)
+        if not (0 <= mouseCoord[0] < region.width and 0 <= mouseCoord[1] < region.height):
+            return {'PASS_THROUGH'}
+        hit = pick_gns.pickFace(context, region, context.area.spaces.active.region_3d, mouseCoord)
+
+        if event.type == 'MOUSEMOVE':
+            context.area.header_text_set(pick_gns.faceSummary(*hit) if hit != None else "Pick GNS Faces: nothing under the mouse")
+            return {'PASS_THROUGH'}
+        if hit != None:
+            bpy.ops.mesh.gns_edit_face_attributes('INVOKE_DEFAULT', objectName = hit[0].name, faceIndex = hit[1])
+        return {'RUNNING_MODAL'}
+
+
+def menu_func_pick(self, context):
+    self.layout.separator()
+    self.layout.operator(GNS_OT_pick_face.bl_idname)
+    self.layout.operator_menu_enum(GNS_OT_show_vis_angle.bl_idname, 'angle')
+
+def menu_func_select(self, context):
+    self.layout.separator()
+    self.layout.operator(GNS_OT_select_tile_polygons.bl_idname, text="GNS Mesh Faces on Tiles").direction = 'TILES_TO_MESH'
+    self.layout.operator(GNS_OT_select_tile_polygons.bl_idname, text="GNS Tiles under Mesh Faces").direction = 'MESH_TO_TILES'
+
 def menu_func_import(self, context):
     self.layout.operator(ImportGNS.bl_idname, text="Final Fantasy Tactics (.gns)")
 
@@ -337,14 +702,21 @@ def menu_func_export(self, context):
     self.layout.operator(ExportGNS.bl_idname, text="Final Fantasy Tactics (.gns)")
 
 classes = (
+    GNSMapStateItem,
     ImportGNS,
     GNS_PT_import_include,
+    GNS_PT_import_map_states,
     GNS_PT_import_transform,
     GNS_PT_import_geometry,
     ExportGNS,
     GNS_PT_export_include,
     GNS_PT_export_transform,
     GNS_PT_export_geometry,
+    GNS_OT_select_tile_polygons,
+    GNS_OT_show_vis_angle,
+    GNSFaceAttribute,
+    GNS_OT_edit_face_attributes,
+    GNS_OT_pick_face,
 )
 
 
@@ -354,11 +726,23 @@ def register():
 
     bpy.types.TOPBAR_MT_file_import.append(menu_func_import)
     bpy.types.TOPBAR_MT_file_export.append(menu_func_export)
+    bpy.types.VIEW3D_MT_select_object.append(menu_func_select)
+    bpy.types.VIEW3D_MT_select_edit_mesh.append(menu_func_select)
+    bpy.types.VIEW3D_MT_object.append(menu_func_pick)
+
+    from . import pick_gns
+    pick_gns.register()
 
 
 def unregister():
+    from . import pick_gns
+    pick_gns.unregister()
+
+    bpy.types.VIEW3D_MT_object.remove(menu_func_pick)
     bpy.types.TOPBAR_MT_file_import.remove(menu_func_import)
     bpy.types.TOPBAR_MT_file_export.remove(menu_func_export)
+    bpy.types.VIEW3D_MT_select_object.remove(menu_func_select)
+    bpy.types.VIEW3D_MT_select_edit_mesh.remove(menu_func_select)
 
     for cls in classes:
         bpy.utils.unregister_class(cls)
@@ -0,0 +1,149 @@
+# fit an exported mesh into the polygon counts the VisAngleChunk (or GaneshaDx) has room for
+# works on the 4 group dicts of gns.MeshChunk.arraysToBin(), (triTex, quadTex, triUntex, quadUntex), plus 'visAngles' per group
+# passes, each only run while a group is still over its limit:
+#  1) merge pairs of tris into quads, for tris sharing an edge with the same vertexes, uvs, normals and face fields
+#     the PSX draws quad v0 v1 v2 v3 as tris v0 v1 v2 and v1 v2 v3, so a quad made of tris (p,q,r) and (r,q,s) looks the same
+#     the most coplanar pairs go first, pairs that aren't coplanar within planeTolerance are left alone
+#  2) drop faces with every visAngles bit set, those are hidden from every camera angle
+# each pass reports the counts after it and how long it took
+import time
+import numpy as np
+
+# (numTriTex, numQuadTex, numTriUntex, numQuadUntex)
+def polygonCounts(groups):
+    return tuple(len(group['pos']) for group in groups)
+
+def overLimit(groups, limits):
+    return any(count > limit for (count, limit) in zip(polygonCounts(groups), limits))
+
+# keep faces 'which' (index or bool array) of every per-face array of a group
+def selectFaces(group, which):
+    return {name : values[which] for (name, values) in group.items()}
+
+# int64 id per row of a 2D int array, equal rows get equal ids
+def rowIds(rows):
+    return np.unique(rows, axis=0, return_inverse=True)[1].reshape(-1)
+
+# merge up to maxMerges pairs of tris in triGroup into quads appended to quadGroup
+# returns (triGroup, quadGroup, number merged)
+def mergeTriPairs(triGroup, quadGroup, maxMerges, planeTolerance=.5):
+    numTris = len(triGroup['pos'])
+    if maxMerges <= 0 or numTris < 2:
+        return triGroup, quadGroup, 0
+
+    # a vertex is the same if its position, normal and uv are
+    vertexParts = [triGroup['pos'].reshape(-1, 3)]
+    for name in ('normal', 'uv'):
+        if name in triGroup:
+            vertexParts.append(triGroup[name].reshape(numTris * 3, -1))
+    vertexIds = rowIds(np.concatenate(vertexParts, axis=1).astype(np.int64)).reshape(numTris, 3)
+    numVertexIds = int(vertexIds.max()) + 1
+
+    # and the faces must agree on everything that isn't per-vertex
+    faceIds = rowIds(np.concatenate([np.zeros((numTris, 1), dtype=np.int64)] + [
+        values.reshape(numTris, -1).astype(np.int64)
+        for (name, values) in triGroup.items()
+        if not name in ('pos', 'normal', 'uv')
+    ], axis=1))
+
+    # directed edges q->r of tri (p,q,r), and its rotations (q,r,p) (r,p,q)
+    # the edge of the other tri is r->q
+    rot = np.array([[0, 1, 2], [1, 2, 0], [2, 0, 1]])
+    pqr = vertexIds[:,rot]                              # (numTris, 3 rotations, 3)
+    key = (faceIds[:,None] * numVertexIds + pqr[:,:,1]) * numVertexIds + pqr[:,:,2]
+    reverseKey = (faceIds[:,None] * numVertexIds + pqr[:,:,2]) * numVertexIds + pqr[:,:,1]
+    key = key.reshape(-1)
+    reverseKey = reverseKey.reshape(-1)
+    order = np.argsort(key, kind='stable')
+    found = np.searchsorted(key[order], reverseKey)
+    found = np.minimum(found, len(key) - 1)
+    matched = key[order][found] == reverseKey
+    edgeA = np.nonzero(matched)[0]
+    edgeB = order[found[matched]]
+    triA, rotA = edgeA // 3, edgeA % 3
+    triB, rotB = edgeB // 3, edgeB % 3
+    # each pair shows up from both sides, keep one
+    keep = triA < triB
+    triA, rotA, triB, rotB = triA[keep], rotA[keep], triB[keep], rotB[keep]
+    if len(triA) == 0:
+        return triGroup, quadGroup, 0
+
+    # A = (p,q,r), B = (r,q,s) rotated so s is its first vertex
+    pos = triGroup['pos'].astype(np.float64)
+    posA = pos[triA[:,None], rot[rotA]]
+    posS = pos[triB, rotB]
+    normalA = np.cross(posA[:,1] - posA[:,0], posA[:,2] - posA[:,0])
+    normalLen = np.linalg.norm(normalA, axis=1)
+    planeDist = np.abs(((posS - posA[:,0]) * normalA).sum(axis=1)) / np.maximum(normalLen, 1e-9)
+    ok = (normalLen > 0) & (planeDist <= planeTolerance)
+    triA, rotA, triB, rotB, planeDist = triA[ok], rotA[ok], triB[ok], rotB[ok], planeDist[ok]
+
+    # greedy, flattest first, each tri used once
+    used = np.zeros(numTris, dtype=bool)
+    chosen = []
+    for i in np.argsort(planeDist, kind='stable'):
+        a, b = triA[i], triB[i]
+        if used[a] or used[b]:
+            continue
+        used[a] = used[b] = True
+        chosen.append(i)
+        if len(chosen) >= maxMerges:
+            break
+    if len(chosen) == 0:
+        return triGroup, quadGroup, 0
+    chosen = np.array(chosen)
+    triA, rotA, triB, rotB = triA[chosen], rotA[chosen], triB[chosen], rotB[chosen]
+
+    # quad = (p, q, r, s), the per-face fields come from A, they're the same as B's
+    quads = {}
+    for (name, values) in triGroup.items():
+        if name in ('pos', 'normal', 'uv'):
+            quads[name] = np.concatenate([
+                values[triA[:,None], rot[rotA]],
+                values[triB, rotB][:,None],
+            ], axis=1)
+        else:
+            quads[name] = values[triA]
+    quadGroup = {name : np.concatenate([values, quads[name]]) for (name, values) in quadGroup.items()}
+    return selectFaces(triGroup, ~used), quadGroup, len(chosen)
+
+# drop up to maxDrops faces of the group that are hidden from every angle
+# returns (group, number dropped)
+def dropHidden(group, maxDrops):
+    if maxDrops <= 0 or not 'visAngles' in group:
+        return group, 0
+    hidden = np.nonzero(group['visAngles'] == 0xffff)[0][:maxDrops]
+    if len(hidden) == 0:
+        return group, 0
+    keep = np.ones(len(group['pos']), dtype=bool)
+    keep[hidden] = False
+    return selectFaces(group, keep), len(hidden)
+
+# limits = (triTex, quadTex, triUntex, quadUntex), like gns.VisAngleChunk.numSlots or gns.ganeshaDxPolygonLimits
+# returns (groups, report), report = list of (pass name, polygonCounts() after it, seconds)
+# check overLimit() afterwards, if nothing could be merged or dropped the groups can still be over
+def fitBudget(groups, limits, planeTolerance=.5):
+    groups = list(groups)
+    report = [('count', polygonCounts(groups), 0.)]
+    if not overLimit(groups, limits):
+        return groups, report
+
+    start = time.perf_counter()
+    for (triIndex, quadIndex) in ((0, 1), (2, 3)):
+        numTris = len(groups[triIndex]['pos'])
+        numQuads = len(groups[quadIndex]['pos'])
+        # each merge is 2 fewer tris and 1 more quad
+        maxMerges = min(
+            -(-(numTris - limits[triIndex]) // 2),
+            limits[quadIndex] - numQuads,
+        )
+        groups[triIndex], groups[quadIndex], numMerged = mergeTriPairs(groups[triIndex], groups[quadIndex], maxMerges, planeTolerance)
+    report.append(('merge tris into quads', polygonCounts(groups), time.perf_counter() - start))
+    if not overLimit(groups, limits):
+        return groups, report
+
+    start = time.perf_counter()
+    for i in range(len(groups)):
+        groups[i], numDropped = dropHidden(groups[i], len(groups[i]['pos']) - limits[i])
+    report.append(('drop hidden faces', polygonCounts(groups), time.perf_counter() - start))
+    return groups, report
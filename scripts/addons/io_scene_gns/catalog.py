@@ -0,0 +1,202 @@
+# a SQLite catalog of all the maps in a dir, for answering questions about them without re-parsing everything
+# each map is scanned from its records and its resource files' chunk headers, without a full parse:
+#  records, chunks present with offsets and sizes, mesh polygon counts, tile map sizes, palette counts, and a sha1 per resource file
+# maps are scanned in parallel, and a map is only rescanned if its GNS or resource files' newest mtime changes
+import os
+import os.path
+import hashlib
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from ctypes import sizeof
+import gns
+
+schema = '''
+create table if not exists maps (
+    mapId integer primary key,
+    path text unique not null,
+    name text not null,
+    mtime real not null,    -- newest mtime of the GNS and its resource files
+    numRecords integer,
+    numMapStates integer,
+    error text              -- why the scan failed, or null
+);
+create table if not exists records (
+    mapId integer not null,
+    filename text not null,
+    sector integer,
+    resourceType integer,
+    arrangement integer,
+    isNight integer,
+    weather integer,
+    size integer,           -- from the record, rounded up to 2k sectors
+    fileSize integer,
+    sha1 text
+);
+create table if not exists chunks (
+    mapId integer not null,
+    filename text not null,
+    chunkIndex integer not null,
+    offset integer,
+    size integer
+);
+create table if not exists meshes (
+    mapId integer not null,
+    filename text not null,
+    chunkIndex integer not null,    -- 0x10 for the mesh, 0x24..0x2b for the animated meshes
+    numTriTex integer,
+    numQuadTex integer,
+    numTriUntex integer,
+    numQuadUntex integer
+);
+create table if not exists tiles (
+    mapId integer not null,
+    filename text not null,
+    sizeX integer,
+    sizeZ integer
+);
+create table if not exists palettes (
+    mapId integer not null,
+    filename text not null,
+    chunkIndex integer not null,    -- 0x11 color, 0x1c animated, 0x1f gray
+    numPalettes integer
+);
+create index if not exists records_mapId on records(mapId);
+create index if not exists chunks_mapId on chunks(mapId);
+create index if not exists chunks_chunkIndex on chunks(chunkIndex);
+create index if not exists meshes_mapId on meshes(mapId);
+create index if not exists tiles_mapId on tiles(mapId);
+create index if not exists palettes_mapId on palettes(mapId);
+'''
+
+mapTables = ('records', 'chunks', 'meshes', 'tiles', 'palettes')
+
+meshChunkIndexes = [gns.CHUNK_MESH] + [gns.CHUNK_MESH_ANIM0 + i for i in range(8)]
+palChunkIndexes = [gns.CHUNK_COLORPALS, gns.CHUNK_PAL_ANIM, gns.CHUNK_GRAYPALS]
+
+# GNS files in a dir, and the files that go with each, from one listing
+def listMaps(dirpath):
+    filenames = os.listdir(dirpath)
+    filesForRoot = {}
+    for fn in filenames:
+        filesForRoot.setdefault(os.path.splitext(fn)[0], []).append(fn)
+    maps = []
+    for fn in sorted(filenames):
+        if os.path.splitext(fn)[1].upper() == '.GNS':
+            files = filesForRoot[os.path.splitext(fn)[0]]
+            mtime = max(os.stat(os.path.join(dirpath, f)).st_mtime for f in files)
+            maps.append((os.path.join(dirpath, fn), mtime))
+    return maps, filenames
+
+# worker: scan one map into rows for each table
+# returns (path, mtime, mapRow, {table: rows}), mapRow = (name, numRecords, numMapStates, error)
+def scanMap(args):
+    path, mtime, mapdirFilenames = args
+    name = os.path.splitext(os.path.basename(path))[0]
+    rows = {table: [] for table in mapTables}
+    try:
+        g = gns.GNS(path, catalogOnly=True, mapdirFilenames=mapdirFilenames)
+        for entry in g.catalog():
+            filename = entry['filename']
+            file = open(os.path.join(g.mapdir, filename), 'rb')
+            data = file.read()
+            file.close()
+            arrangement, isNight, weather = entry['mapState']
+            rows['records'].append((
+                filename,
+                entry['sector'],
+                entry['resourceType'],
+                arrangement,
+                isNight,
+                weather,
+                entry['size'],
+                entry['fileSize'],
+                hashlib.sha1(data).hexdigest(),
+            ))
+            if entry['resourceType'] not in (
+                gns.GNSRecord.RESOURCE_MESH_INIT,
+                gns.GNSRecord.RESOURCE_MESH_REPL,
+                gns.GNSRecord.RESOURCE_MESH_ALT,
+            ) or len(data) < sizeof(gns.ResHeader):
+                continue
+            header = gns.ResHeader.from_buffer_copy(data)
+            for (i, begin, end) in gns.NonTexBlob.chunkBounds(header, len(data)):
+                rows['chunks'].append((filename, i, begin, end - begin))
+                if i in meshChunkIndexes and end - begin >= sizeof(gns.MeshHeader):
+                    rows['meshes'].append((filename, i) + gns.MeshHeader.from_buffer_copy(data, begin).toTuple())
+                elif i == gns.CHUNK_TILES and end - begin >= 2:
+                    rows['tiles'].append((filename, data[begin], data[begin + 1]))
+                elif i in palChunkIndexes:
+                    rows['palettes'].append((filename, i, (end - begin) // sizeof(gns.RGBA5551 * 16)))
+        mapRow = (name, len(g.allRecords), len(g.allMapStates), None)
+    except Exception as e:
+        rows = {table: [] for table in mapTables}
+        mapRow = (name, None, None, repr(e))
+    return (path, mtime, mapRow, rows)
+
+def connect(dbpath):
+    db = sqlite3.connect(dbpath)
+    db.executescript(schema)
+    return db
+
+# scan the maps in dirpath that changed since they were last cataloged, and drop the ones that are gone
+# returns (number scanned, number skipped, number removed)
+def refresh(db, dirpath, numProcesses=None):
+    maps, mapdirFilenames = listMaps(dirpath)
+
+    dirPrefix = os.path.join(dirpath, '')
+    catalogued = {
+        path: (mapId, mtime)
+        for (mapId, path, mtime) in db.execute('select mapId, path, mtime from maps')
+        if path.startswith(dirPrefix)
+    }
+    paths = set(path for (path, mtime) in maps)
+    toScan = [(path, mtime, mapdirFilenames)
+        for (path, mtime) in maps
+        if catalogued.get(path, (None, None))[1] != mtime]
+
+    removed = [mapId for (path, (mapId, mtime)) in catalogued.items() if path not in paths]
+    with db:
+        for mapId in removed:
+            deleteMap(db, mapId)
+
+    if numProcesses == None:
+        numProcesses = os.cpu_count() or 1
+    if numProcesses > 1 and len(toScan) > 1:
+        with ProcessPoolExecutor(numProcesses) as pool:
+            results = pool.map(scanMap, toScan, chunksize=4)
+            for result in results:
+                storeMap(db, catalogued, result)
+    else:
+        for args in toScan:
+            storeMap(db, catalogued, scanMap(args))
+
+    return (len(toScan), len(maps) - len(toScan), len(removed))
+
+def deleteMap(db, mapId):
+    for table in mapTables:
+        db.execute('delete from ' + table + ' where mapId = ?', (mapId,))
+    db.execute('delete from maps where mapId = ?', (mapId,))
+
+# replace a map's rows, one transaction per map, so an interrupted refresh keeps what it finished
+def storeMap(db, catalogued, result):
+    path, mtime, mapRow, rows = result
+    name, numRecords, numMapStates, error = mapRow
+    with db:
+        if path in catalogued:
+            deleteMap(db, catalogued[path][0])
+        mapId = db.execute(
+            'insert into maps (path, name, mtime, numRecords, numMapStates, error) values (?, ?, ?, ?, ?, ?)',
+            (path, name, mtime, numRecords, numMapStates, error)
+        ).lastrowid
+        for (table, tableRows) in rows.items():
+            if len(tableRows) == 0:
+                continue
+            placeholders = ', '.join(['?'] * (1 + len(tableRows[0])))
+            db.executemany(
+                'insert into ' + table + ' values (' + placeholders + ')',
+                [(mapId,) + row for row in tableRows])
+
+# run a query, returns (column names, row iterator)
+def query(db, sql):
+    cursor = db.execute(sql)
+    return ([d[0] for d in cursor.description or []], cursor)
@@ -2,7 +2,11 @@
 # I'm not sure what output format I'm aiming for
 import os
 import os.path
+import math
+import sys
+import json
 import argparse
+import contextlib
 import gns
 
 ap = argparse.ArgumentParser()
@@ -10,6 +14,13 @@ ap.add_argument('files', metavar='files', nargs='*')
 ap.add_argument('-d', '--dir', help='process all maps in dir')
 ap.add_argument('-x', '--hex', action='store_true', help='output struct field values in hex')
 ap.add_argument('-v', '--verbose', action='store_true', help='verbose output of all chunk data')
+ap.add_argument('-r', '--records-only', action='store_true', help='only read the GNS records and stat the resource files, without loading them')
+ap.add_argument('--catalog', metavar='DB', help='update the SQLite catalog DB with the maps in --dir / the dirs given, rescanning only changed maps')
+ap.add_argument('--query', metavar='SQL', help='run SQL against the --catalog DB and print the results tab-separated')
+ap.add_argument('--verify', action='store_true', help='check that every chunk and resource file writes back out byte-for-byte the same as it was read, and time it')
+ap.add_argument('-j', '--jobs', type=int, help='number of processes for --catalog or --verify, default is all cpus')
+ap.add_argument('-f', '--format', choices=['text', 'ndjson'], default='text', help='ndjson = stream one json object per line per map, record, resource, chunk, and batch of polygons or tiles')
+ap.add_argument('--batch', type=int, default=256, help='polygons or tiles per line in ndjson output')
 args = ap.parse_args()
 
 if args.hex:
@@ -26,7 +37,73 @@ if args.hex:
 else:
     intToStr = gns.FFTData.intToStr
 
+# ndjson output
+# every object has 'type' and 'map', resource-level ones have 'file', chunk-level ones have 'chunk'
+# each is yielded as soon as it's made, so output starts right away and nothing accumulates
+
+def ndjsonMapRecords(fn, mapdirFilenames=None):
+    g = gns.GNS(fn, catalogOnly=True, mapdirFilenames=mapdirFilenames)
+    yield {'type':'map', 'map':fn, 'mapStates':g.allMapStates}
+    for entry in g.catalog():
+        yield dict(type='record', map=fn, **entry)
+
+def ndjsonMap(fn):
+    g = gns.GNS(fn)
+    yield {'type':'map', 'map':fn, 'mapStates':g.allMapStates}
+    for res in g.allRes:
+        base = {'map':fn, 'file':res.filename}
+        if isinstance(res, gns.TexBlob):
+            yield dict(type='resource', kind='texture', record=res.record.toDict(), **base)
+        elif isinstance(res, gns.NonTexBlob):
+            chunkIndexes = [i for (i, io) in enumerate(res.chunkIOs) if io != None]
+            yield dict(type='resource', kind='chunks', record=res.record.toDict(), chunks=chunkIndexes, **base)
+            for i in chunkIndexes:
+                io = res.chunkIOs[i]
+                yield dict(type='chunk', chunk=i, chunkClass=type(io).__name__, fields=io.toDict(), **base)
+                if isinstance(io, gns.MeshChunk):
+                    polygons = io.polygons()
+                    for first in range(0, len(polygons), args.batch):
+                        yield dict(type='polygons', chunk=i, first=first,
+                            polygons=[p.toDict() for p in polygons[first:first+args.batch]], **base)
+                elif isinstance(io, gns.TileChunk):
+                    # a batch of whole rows at a time
+                    sizeX, sizeZ = io.sizeInTiles
+                    rowsPerBatch = max(1, args.batch // max(1, sizeX))
+                    for y in range(2):
+                        for z in range(0, sizeZ, rowsPerBatch):
+                            yield dict(type='tiles', chunk=i, layer=y, z=z,
+                                tiles=[[tile.toDict() for tile in io.tiles[y][z2]] for z2 in range(z, min(z + rowsPerBatch, sizeZ))], **base)
+        else:
+            yield dict(type='resource', kind='unknown', record=res.record.toDict(), **base)
+
+# write each object as it comes, keeping anything else that gets printed on stderr
+def writeNDJSON(objs):
+    out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        for obj in objs:
+            out.write(json.dumps(obj, separators=(',', ':'), default=gns.toJSONValue))
+            out.write('\n')
+            if obj['type'] in ('map', 'resource'):
+                out.flush()
+
+def processMapRecords(fn, mapdirFilenames=None):
+    if args.format == 'ndjson':
+        writeNDJSON(ndjsonMapRecords(fn, mapdirFilenames))
+        return
+    g = gns.GNS(fn, catalogOnly=True, mapdirFilenames=mapdirFilenames)
+    print(fn, 'map states:', ' '.join(str(state) for state in g.allMapStates))
+    for entry in g.catalog():
+        print('GNS record, file=', entry['filename'],
+            'type=', intToStr(entry['resourceType']),
+            'state=', entry['mapState'],
+            'sector=', intToStr(entry['sector']),
+            'size=', intToStr(entry['size']),
+            'fileSize=', intToStr(entry['fileSize']))
+
 def processMap(fn):
+    if args.format == 'ndjson':
+        writeNDJSON(ndjsonMap(fn))
+        return
     print('Loading', fn)
     try:
         # load the gns file
@@ -73,10 +150,85 @@ def processDir(dirpath):
         if os.path.splitext(fn)[1].upper() == '.GNS':
             fns.append(fn)
     fns.sort()
+    if args.records_only:
+        # list the dir once for all maps
+        mapdirFilenames = os.listdir(dirpath)
+        for fn in fns:
+            processMapRecords(os.path.join(dirpath, fn), mapdirFilenames)
+        return
     for fn in fns:
         processMap(os.path.join(dirpath, fn))
 
-if args.dir:
+def processCatalog():
+    import catalog
+    db = catalog.connect(args.catalog)
+    dirs = ([args.dir] if args.dir else []) + [fn for fn in args.files if os.path.isdir(fn)]
+    for dirpath in dirs:
+        scanned, skipped, removed = catalog.refresh(db, dirpath, args.jobs)
+        print('catalog', dirpath, 'scanned', scanned, 'unchanged', skipped, 'removed', removed)
+    if args.query:
+        columns, rows = catalog.query(db, args.query)
+        print('\t'.join(columns))
+        for row in rows:
+            print('\t'.join('' if x == None else str(x) for x in row))
+    db.close()
+
+# returns True if everything matched
+def processVerify():
+    import verify
+    results = []
+    if args.dir:
+        results.append(verify.verifyDir(args.dir, args.jobs))
+    mapFns = []
+    for fn in args.files:
+        if os.path.isdir(fn):
+            results.append(verify.verifyDir(fn, args.jobs))
+        else:
+            mapFns.append(fn)
+    if len(mapFns) > 0:
+        results.append(verify.verifyMaps(mapFns, None, args.jobs))
+
+    allMatched = True
+    totals = {}
+    for result in (result for dirResults in results for result in dirResults):
+        verify.addTimings(totals, result['timings'])
+        if result['error'] != None or len(result['mismatches']) > 0:
+            allMatched = False
+        if args.format == 'ndjson':
+            writeNDJSON([dict(type='verify', **result)])
+            continue
+        if args.verbose and result['log']:
+            print(result['log'], end='')
+        if result['error'] != None:
+            print(result['map'], 'FAILED to load:', result['error'])
+            continue
+        print(result['map'], 'OK' if len(result['mismatches']) == 0 else 'MISMATCHED')
+        for m in result['mismatches']:
+            where = m['file'] + (' chunk ' + intToStr(m['chunk']) if m['chunk'] != None else '') + ' ' + m['chunkClass']
+            if 'error' in m:
+                print('  ' + where + ' toBin failed:', m['error'])
+            else:
+                print('  ' + where,
+                    'first diff at', intToStr(m['offset']),
+                    'bytes differing', m['numDiffs'],
+                    'size read', intToStr(m['expectedSize']),
+                    'size written', intToStr(m['actualSize']))
+
+    if args.format == 'ndjson':
+        writeNDJSON([dict(type='verifyTimings', timings=totals)])
+    else:
+        print('toBin throughput:')
+        for (name, (count, size, seconds)) in sorted(totals.items()):
+            print('  %-20s %6d calls %10d bytes in %8.4fs = %8.2f MB/s' % (
+                name, count, size, seconds, size / seconds / 1e6 if seconds > 0 else math.inf))
+    return allMatched
+
+allMatched = True
+if args.catalog:
+    processCatalog()
+elif args.verify:
+    allMatched = processVerify()
+elif args.dir:
     processDir(args.dir)
 elif len(args.files) == 0:
     # allow files to be empty so long as dir is provided
@@ -86,7 +238,11 @@ else:
     for fn in args.files:
         if os.path.isdir(fn):
             processDir(fn)
+        elif args.records_only:
+            processMapRecords(fn)
         else:
             processMap(fn)
 
-print("DONE")
+print("DONE", file=sys.stderr if args.format == 'ndjson' else sys.stdout)
+if not allMatched:
+    sys.exit(1)
@@ -1,3 +1,215 @@
+import os.path
+import math
+import numpy as np
+from . import gns
+from . import budget
+from . import visibility
+from .import_gns import meshFaceAttributes, tileFaceAttributes, visAngleAttributes
+
+# FFT vertex i of a polygon is blender loop i of these, within its face
+# undoes the cw => ccw and tristrip => quad reordering of import_gns.BlenderGNS.buildMeshObj
+triLoopOrder = np.array([2, 1, 0])
+quadLoopOrder = np.array([3, 2, 0, 1])
+
+# the imported objects of this map that were made from a resource file
+# the mesh objects by filename, or the tile mesh objects by (filename, layer)
+# selected objects win over the rest of the scene, otherwise the first one found
+def findImportedObjs(context, g, tiles=False):
+    objForKey = {}
+    for obj in list(context.selected_objects) + list(context.scene.objects):
+        if obj.type != 'MESH' or not 'gnsResFile' in obj:
+            continue
+        if ('gnsTileLayer' in obj) != tiles:
+            continue
+        filename = obj['gnsResFile']
+        if os.path.splitext(filename)[0] != g.nameroot:
+            continue
+        objForKey.setdefault((filename, obj['gnsTileLayer']) if tiles else filename, obj)
+    return objForKey
+
+# int array of a face attribute, or of 'default' if the mesh doesn't have it
+# dtype=bool reads a boolean attribute instead
+def faceAttributeArray(mesh, name, default=0, dtype=np.int32):
+    values = np.full(len(mesh.polygons), default, dtype=dtype)
+    attr = mesh.attributes.get(name)
+    if attr != None and attr.domain == 'FACE' and attr.data_type == ('BOOLEAN' if dtype == bool else 'INT'):
+        attr.data.foreach_get('value', values)
+    return values
+
+# int16 array of shape (numLoops, 3) of the mesh's normals in 1/4096ths
+# the 'fftNormal' corner attribute the import keeps, otherwise blender's (custom) split normals
+def loopNormalArray(mesh):
+    numLoops = len(mesh.loops)
+    attr = mesh.attributes.get('fftNormal')
+    if attr != None and attr.domain == 'CORNER' and attr.data_type == 'FLOAT_VECTOR':
+        loopNormal = np.empty(3 * numLoops, dtype=np.float32)
+        attr.data.foreach_get('vector', loopNormal)
+        return np.clip(np.rint(loopNormal.reshape(-1, 3)), -32768, 32767).astype(np.int16)
+
+    # custom normals are ignored while auto smooth is off, so turn it on for the read
+    useAutoSmooth = mesh.use_auto_smooth
+    autoSmoothAngle = mesh.auto_smooth_angle
+    if mesh.has_custom_normals:
+        mesh.use_auto_smooth = True
+        mesh.auto_smooth_angle = math.pi
+    try:
+        mesh.calc_normals_split()
+        loopNormal = np.empty(3 * numLoops, dtype=np.float32)
+        mesh.loops.foreach_get('normal', loopNormal)
+    finally:
+        mesh.use_auto_smooth = useAutoSmooth
+        mesh.auto_smooth_angle = autoSmoothAngle
+    return np.clip(np.rint(4096. * loopNormal.reshape(-1, 3)), -32768, 32767).astype(np.int16)
+
+# read the blender mesh into the arrays of gns.MeshChunk.arraysToBin()
+# the 'textured' face attribute says which faces are textured, without it it's the faces with a material that has a 'gnsPal' >= 0
+# textured faces use their material's palette, or the 'pal' attribute if the material doesn't have one
+def meshChunkArrays(meshObj):
+    mesh = meshObj.data
+    numPolygons = len(mesh.polygons)
+    numLoops = len(mesh.loops)
+
+    loopStart = np.empty(numPolygons, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loopStart)
+    loopTotal = np.empty(numPolygons, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loopTotal)
+    materialIndex = np.empty(numPolygons, dtype=np.int32)
+    mesh.polygons.foreach_get('material_index', materialIndex)
+    badFaces = np.nonzero((loopTotal != 3) & (loopTotal != 4))[0]
+    if len(badFaces) > 0:
+        raise Exception(meshObj.name + " face " + str(badFaces[0]) + " has " + str(loopTotal[badFaces[0]]) + " vertexes, only triangles and quads can be exported")
+
+    # the mesh is in FFT units, the object's scale takes care of the rest
+    co = np.empty(3 * len(mesh.vertices), dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    loopVertex = np.empty(numLoops, dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVertex)
+    loopPos = np.clip(np.rint(co.reshape(-1, 3)[loopVertex]), -32768, 32767).astype(np.int16)
+
+    loopNormal = loopNormalArray(mesh)
+
+    loopUV = np.zeros(2 * numLoops, dtype=np.float32)
+    if len(mesh.uv_layers) > 0:
+        mesh.uv_layers[0].data.foreach_get('uv', loopUV)
+    loopUV = loopUV.reshape(-1, 2)
+
+    palForMaterial = np.array([
+        mat.get('gnsPal', -1) if mat != None else -1
+        for mat in mesh.materials
+    ] + [-1], dtype=np.int32)
+    pal = palForMaterial[np.clip(materialIndex, 0, len(palForMaterial) - 1)]
+
+    faceFields = {name : faceAttributeArray(mesh, name) for name in meshFaceAttributes}
+    if 'textured' in mesh.attributes:
+        isTexFace = faceAttributeArray(mesh, 'textured', False, bool)
+    else:
+        isTexFace = pal >= 0
+    pal = np.where(pal >= 0, pal, np.clip(faceFields['pal'], 0, 15))
+
+    # the VisAngleFlags, packed back from one boolean attribute per camera angle
+    visAngles = None
+    if all(name in mesh.attributes for name in visAngleAttributes):
+        visAngles = gns.visAnglesFromBits(np.stack([
+            faceAttributeArray(mesh, name, False, bool)
+            for name in visAngleAttributes
+        ], axis=-1))
+
+    tileIndex = faceAttributeArray(mesh, 'tileIndex', -1)
+    sizeInTiles = meshObj.get('gnsTileSize', (1, 1))
+    # faces without a tile keep the TilePos they were imported with, if any
+    tilePos = faceAttributeArray(mesh, 'tilePos', -1)
+    tilePos = np.where(
+        tileIndex >= 0,
+        gns.TilePolygonIndex.tilePosForTiles(tileIndex, sizeInTiles).astype(np.int32).T,
+        np.stack([tilePos & 0xff, (tilePos >> 8) & 0xff]) * (tilePos >= 0),
+    ).T.astype(np.uint8)
+
+    groups = []
+    for (isTex, numVtxs, loopOrder) in (
+        (True, 3, triLoopOrder),
+        (True, 4, quadLoopOrder),
+        (False, 3, triLoopOrder),
+        (False, 4, quadLoopOrder),
+    ):
+        faces = np.nonzero((loopTotal == numVtxs) & (isTexFace == isTex))[0]
+        loops = loopStart[faces][:,None] + loopOrder
+        group = {'pos' : loopPos[loops]}
+        if isTex:
+            group['normal'] = loopNormal[loops]
+            # inverse of the import's u = (x + .5) / 256, v = (256 * page + y + .5) / 1024
+            texel = np.floor(loopUV[loops] * (gns.TexBlob.width, gns.TexBlob.height)).astype(np.int32)
+            page = np.clip(texel[:,:,1].mean(axis=1).astype(np.int32) >> 8, 0, 3)
+            texel[:,:,1] -= 256 * page[:,None]
+            group['uv'] = np.clip(texel, 0, 255).astype(np.uint8)
+            group['pal'] = pal[faces]
+            group['page'] = page
+            for name in ('unk2_4', 'unk3', 'unk6_2', 'unk7'):
+                group[name] = faceFields[name][faces]
+            group['tilePos'] = tilePos[faces]
+        else:
+            group['untexUnknown'] = faceFields['untexUnknown'][faces].view(np.uint32)
+        if visAngles is not None:
+            group['visAngles'] = visAngles[faces]
+        groups.append(group)
+    return groups
+
+# replace the resource's MeshChunk with one read from the blender mesh
+# limits = the most (triTex, quadTex, triUntex, quadUntex) polygons allowed, see budget.fitBudget()
+# the mesh's hidden<angle> face attributes go into the VisAngleChunk, or with computeVisAngles they're raycast, see visibility.py
+# with writeVisAngles=False the VisAngleChunk is left as it was imported
+def exportMesh(meshObj, res, limits=gns.VisAngleChunk.numSlots, computeVisAngles=False, writeVisAngles=True):
+    if meshObj.mode == 'EDIT':
+        meshObj.update_from_editmode()
+    groups = meshChunkArrays(meshObj)
+    if computeVisAngles and writeVisAngles:
+        for (group, visAngles) in zip(groups, visibility.computeVisAngles(groups)):
+            group['visAngles'] = visAngles
+    groups, report = budget.fitBudget(groups, limits)
+    for (passName, counts, seconds) in report:
+        print(meshObj.name + " " + passName + ": " + str(counts) + " of " + str(tuple(limits)) + " in " + str(seconds) + "s")
+    if budget.overLimit(groups, limits):
+        raise Exception(meshObj.name + " has " + str(budget.polygonCounts(groups)) + " (triTex, quadTex, triUntex, quadUntex) polygons, and only " + str(tuple(limits)) + " fit")
+    if writeVisAngles and res.visAngleChunk != None and 'visAngles' in groups[0]:
+        res.visAngleChunk.setVisAngles([group['visAngles'] for group in groups])
+    data = gns.MeshChunk.arraysToBin(groups, res.meshChunk.footer)
+    res.meshChunk = gns.MeshChunk(data, res)
+    res.chunkIOs[gns.CHUNK_MESH] = res.meshChunk
+
+# write the tile meshes' corner heights and face attributes into the resource's TileChunk
+# tileObjForLayer = {layer: tile mesh object}, the layers without one are left as they are
+def exportTiles(tileObjForLayer, res):
+    tileChunk = res.tileChunk
+    sizeX, sizeZ = tileChunk.sizeInTiles
+    numTiles = sizeX * sizeZ
+    heights = tileChunk.cornerHeights()
+    fields = {name : tileChunk.getField(name).copy() for name in tileFaceAttributes}
+    for (y, tileObj) in tileObjForLayer.items():
+        if tileObj.mode == 'EDIT':
+            tileObj.update_from_editmode()
+        mesh = tileObj.data
+        # the faces are one per tile in [z][x] order, with their loops in tileCornerOffsets order
+        loopTotal = np.empty(len(mesh.polygons), dtype=np.int32)
+        mesh.polygons.foreach_get('loop_total', loopTotal)
+        if len(loopTotal) != numTiles or np.any(loopTotal != 4):
+            raise Exception(tileObj.name + " needs to have " + str(numTiles) + " quads, one per tile, to be exported")
+        loopStart = np.empty(numTiles, dtype=np.int32)
+        mesh.polygons.foreach_get('loop_start', loopStart)
+        loopVertex = np.empty(len(mesh.loops), dtype=np.int32)
+        mesh.loops.foreach_get('vertex_index', loopVertex)
+        co = np.empty(3 * len(mesh.vertices), dtype=np.float32)
+        mesh.vertices.foreach_get('co', co)
+        # inverse of the import's y = -.5 * height in half-tiles
+        cornerY = co.reshape(-1, 3)[loopVertex[loopStart[:,None] + np.arange(4)], 1]
+        heights[y] = np.rint(-2. * cornerY).reshape(sizeZ, sizeX, 4)
+        for name in tileFaceAttributes:
+            if name in mesh.attributes:
+                fields[name][y] = np.clip(faceAttributeArray(mesh, name), 0, 255).reshape(sizeZ, sizeX)
+    numFlattened = tileChunk.setCornerHeights(heights)
+    if numFlattened > 0:
+        print("WARNING: " + res.filename + " had " + str(numFlattened) + " tiles whose corner heights don't match any slope type, they were flattened")
+    for (name, values) in fields.items():
+        tileChunk.setField(name, values)
+
 def save(
     context,
     filepath,
@@ -9,6 +221,8 @@ def save(
     use_graypals=True,
     use_lights=True,
     use_visangles=True,
+    polygon_limits='VISANGLES',
+    compute_visangles=False,
     global_matrix=None,
     path_mode='AUTO'
 ):
@@ -23,18 +237,41 @@ def save(
     #  and then the collections hold objects pertaining to the resources?
     # then we'd have two sets of collectiosn ... one for the map files, and one for the resources
     #  and don't duplicate nodes between them?  somehow?  would require some rearranging for the mesh...
+    # for now the imported objects remember which resource file they came from, and get written back to it
 
     # first off I gotta load the gns records of what resources are available (right?)
     # ... or should I keep track of that information as well, from the collections?
     if not os.path.exists(filepath):
         raise Exception("currently I can't write new files, just modify old ones.")
-    
-    from . import gns
-    GNS = gns.GNS
 
-    gns = GNS(filepath)
+    g = gns.GNS(filepath)
+
+    changedRes = []
+
+    limits = gns.ganeshaDxPolygonLimits if polygon_limits == 'GANESHADX' else gns.VisAngleChunk.numSlots
+
+    #if use_texture:
+        # TODO export textures ... which textures tho? to where?
+
+    if use_mesh:
+        for (filename, meshObj) in findImportedObjs(context, g).items():
+            for res in g.allMeshRes:
+                if res.filename == filename and res.meshChunk != None:
+                    exportMesh(meshObj, res, limits, compute_visangles, use_visangles)
+                    if not res in changedRes:
+                        changedRes.append(res)
+
+    if use_tiles:
+        tileObjsForFile = {}
+        for ((filename, y), tileObj) in findImportedObjs(context, g, tiles=True).items():
+            tileObjsForFile.setdefault(filename, {})[y] = tileObj
+        for res in g.allMeshRes:
+            if res.filename in tileObjsForFile and res.tileChunk != None:
+                exportTiles(tileObjsForFile[res.filename], res)
+                if not res in changedRes:
+                    changedRes.append(res)
 
-    if use_texture:
-        # export textures ... which textures tho? to where?
+    for res in changedRes:
+        res.write()
 
     return {'FINISHED'}
@@ -1,5 +1,6 @@
 import math
 import os.path
+import numpy as np
 from ctypes import *
 
 class FFTData:
@@ -16,6 +17,29 @@ class FFTData:
     def __str__(self):
         return '{'+', '.join(x[0]+'='+FFTData.intToStr(getattr(self, x[0])) for x in self._fields_)+'}'
 
+    # json-able dict of the fields
+    def toDict(self):
+        return {x[0] : toJSONValue(getattr(self, x[0])) for x in self._fields_}
+
+# convert FFTData, ToStr objects, ctypes arrays, numpy arrays and scalars, and bytes to things json can write
+# the None check has to be 'is', numpy arrays compare elementwise
+def toJSONValue(o):
+    if o is None or isinstance(o, (bool, int, float, str)):
+        return o
+    elif isinstance(o, np.generic):
+        return o.item()
+    elif isinstance(o, (FFTData, ToStr)):
+        return o.toDict()
+    elif isinstance(o, (bytes, bytearray)):
+        return o.hex()
+    elif isinstance(o, np.ndarray):
+        return o.tolist()
+    elif isinstance(o, (list, tuple, Array)):
+        return [toJSONValue(v) for v in o]
+    elif isinstance(o, dict):
+        return {str(k) : toJSONValue(v) for (k, v) in o.items()}
+    return str(o)
+
 """ hmm 'new in 3.11' looks like Blender (python 3.10.9) needs to upgrade?
 class FFTUnion(LittleEndianUnion, FFTData):
     pass
@@ -58,41 +82,41 @@ class TexBlob(ResourceBlob):
         # maybe not?
         self.rowsize = self.width >> 1
         super().__init__(record, filename, mapdir)
-        data = self.readData()
+        # keep the packed 4bpp data, 2 pixels per byte, low nibble first
+        self.packed = self.readData()
+        self.decode()
+
+    # expand the 8-bits into separate 4-bits
+    # this isn't grey, it's indexed into one of the 16 palettes.
+    # self.pixels = bytearray of [colorIndex] in [0,15], width * height long
+    def decode(self):
+        pixels = bytearray(2 * len(self.packed))
+        pixels[0::2] = self.packed.translate(loNibbleTable)
+        pixels[1::2] = self.packed.translate(hiNibbleTable)
+        self.pixels = pixels
+
+    # free the decoded pixels, keeping only the packed data, repacked so edits aren't lost
+    # indexArray() and writeTexture() still work, indexArray() decodes again
+    def dropDecoded(self):
+        if self.pixels != None:
+            self.packed = self.toBin()
+        self.pixels = None
+
+    # [y][x] numpy uint8 view of the color indexes, writes go thru to self.pixels
+    def indexArray(self):
+        if self.pixels == None:
+            self.decode()
+        return np.frombuffer(self.pixels, dtype=np.uint8).reshape(self.height, self.width)
 
-        # expand the 8-bits into separate 4-bits into an image double array
-        # this isn't grey, it's indexed into one of the 16 palettes.
-        pix44 = (TwoNibbles * len(data)).from_buffer_copy(data)
-        # self.pixels = [colorIndex] in [0,15] integers
-        # which is faster?
-        """
-        pix8 = [
-            colorIndex
-            for y in range(self.height)
-            for x in range(self.rowsize)
-            for colorIndex in pix44[x + y * self.rowsize].toTuple()
-        ]
-        """
-        # vs
-        self.pixels = [0] * (self.width * self.height)
-        dsti = 0
-        for srci in range(self.height * self.rowsize):
-            lohi = pix44[srci]
-            self.pixels[dsti] = lohi.lo
-            dsti += 1
-            self.pixels[dsti] = lohi.hi
-            dsti += 1
+    def toBin(self):
+        if self.pixels == None:
+            return bytes(self.packed)
+        pixels = self.indexArray().reshape(-1, 2)
+        return (pixels[:,0] | (pixels[:,1] << 4)).tobytes()
 
     def writeTexture(self, filepath):
-        data = b''
-        for y in range(self.height):
-            for x in range(self.rowsize):
-                data += bytes(TwoNibbles(
-                    int(self.pixels[0 + 2 * (x + self.rowsize * y)]),
-                    int(self.pixels[1 + 2 * (x + self.rowsize * y)])
-                ))
         file = open(filepath, 'wb')
-        file.write(data)
+        file.write(self.toBin())
         file.close()
 
 ################################ non-texture resousre structs ################################
@@ -166,6 +190,17 @@ class QuadTexFace(FFTStruct):
     ]
 assert sizeof(QuadTexFace) == 12
 
+# (name, byte index, bit shift, number of bits) of the non-uv fields of TriTexFace and QuadTexFace
+# for working on the packed bytes of a whole array of them at once
+texFaceFieldBits = [
+    ('pal', 2, 0, 4),
+    ('unk2_4', 2, 4, 4),
+    ('unk3', 3, 0, 8),
+    ('page', 6, 0, 2),
+    ('unk6_2', 6, 2, 6),
+    ('unk7', 7, 0, 8),
+]
+
 # tile in-game position, stored per-textured-face
 class TilePos(FFTStruct):
     _fields_ = [
@@ -208,6 +243,18 @@ class RGBA5551(FFTStruct):
                 31 * clamp(b, 0, 1),
                 1)
 
+    # same as toTuple() but for a whole buffer of RGBA5551's at once
+    # returns a float32 array of shape (n, 4)
+    @staticmethod
+    def arrayToRGBA(data):
+        v = np.frombuffer(data, dtype='<u2')
+        rgba = np.empty((len(v), 4), dtype=np.float32)
+        rgba[:,0] = (v & 0x1f) / 31.
+        rgba[:,1] = ((v >> 5) & 0x1f) / 31.
+        rgba[:,2] = ((v >> 10) & 0x1f) / 31.
+        rgba[:,3] = np.where(v & 0x7fff, 1., (v >> 15) & 1)
+        return rgba
+
 # hmm can I inerit from c_uint16 and override some behavior or something?
 #class LightColorChannel(FFTStruct):
 
@@ -300,6 +347,48 @@ class Tile(FFTStruct):
     ]
 assert sizeof(Tile) == 8
 
+# vertexes of a [-.5, .5]^2 quad, as (x, z) offsets from the tile center
+tileCornerOffsets = [
+    [-.5, -.5],
+    [-.5, .5],
+    [.5, .5],
+    [.5, -.5]
+]
+
+# from GaneshaDx ... seems like there should be some kind of bitfield per modified vertex ...
+# per corner of tileCornerOffsets, which slopeTypes lift it by slopeHeight
+liftPerVertPerSlopeType = [
+    [0x25, 0x58, 0x14, 0x66, 0x69, 0x99],
+    [0x85, 0x58, 0x44, 0x96, 0x69, 0x99],
+    [0x85, 0x52, 0x41, 0x96, 0x66, 0x99],
+    [0x52, 0x25, 0x11, 0x96, 0x66, 0x69],
+]
+
+# the other way: the slopeType of each 4-bit mask of lifted corners, bit i = corner i of tileCornerOffsets
+# -1 for the masks that no slopeType lifts: the two saddles 0b0101 and 0b1010
+# (all four lifted is just a higher flat tile)
+def makeSlopeTypeForLiftMask():
+    table = np.full(16, -1, dtype=np.int32)
+    table[0] = 0
+    for slopeType in set(t for lift in liftPerVertPerSlopeType for t in lift):
+        table[sum(1 << i for (i, lift) in enumerate(liftPerVertPerSlopeType) if slopeType in lift)] = slopeType
+    return table
+slopeTypeForLiftMask = makeSlopeTypeForLiftMask()
+
+# numpy equivalent of Tile, one field per byte
+# the bytes holding bitfields are named by their offset, use TileChunk.getField/setField to get at the bitfields
+tileDtype = np.dtype([
+    ('_00', 'u1'),  # surfaceType, unk0_6
+    ('unk1', 'u1'),
+    ('halfHeight', 'u1'),
+    ('_03', 'u1'),  # slopeHeight, depth
+    ('slopeType', 'u1'),
+    ('thickness', 'u1'),
+    ('_06', 'u1'),  # cantCursor, cantWalk, unk6_2
+    ('rotFlags', 'u1'),
+])
+assert tileDtype.itemsize == sizeof(Tile)
+
 # can python ctypes do arrays-of-bitfields?
 # ... can C structs? nope?
 class TwoNibbles(FFTStruct):
@@ -309,6 +398,10 @@ class TwoNibbles(FFTStruct):
     ]
 assert sizeof(TwoNibbles) == 1
 
+# bytes.translate tables splitting a byte into its TwoNibbles
+loNibbleTable = bytes(i & 0xf for i in range(256))
+hiNibbleTable = bytes(i >> 4 for i in range(256))
+
 class TexAnim(FFTStruct):
     _fields_ = [
 
@@ -360,6 +453,25 @@ class TexAnim(FFTStruct):
         # 12:
         ('unk12', c_uint16),
     ]
+
+    # x and y are in vram units, x is 4 pixels per unit, y is within the texture page
+    # returns (x, y, width, height) in pixels of our 256x1024 texture, which has its pages stacked vertically
+    def canvasRect(self):
+        return (
+            self.xOver4 << 2,
+            (self.texPage << 8) + (self.y & 0xff),
+            self.widthOver4 << 2,
+            self.height
+        )
+
+    # frames are stacked vertically starting at the first_* location
+    def firstFrameRect(self):
+        return (
+            self.first_xOver4 << 2,
+            (self.first_texPage << 8) + (self.first_y & 0xff),
+            self.widthOver4 << 2,
+            self.height
+        )
 assert sizeof(TexAnim) == 0x14
 
 # if TexAnim structSig == 0 && y == 0x01e0 then use this one:
@@ -387,6 +499,22 @@ class VisAngleFlags(FFTStruct):
         ('v', c_uint16),
     ]
 
+# VisAngleFlags bit i set = the polygon isn't drawn when the camera is at angle i
+# the camera goes around the map in 8 directions, at a low and a high elevation
+# bits 0-7 are the low elevation and 8-15 the high, each going counterclockwise from north-northwest
+# (that bit order is from the ffhacktics notes, I haven't checked it against the game)
+visAngleDirections = ['NNW', 'WNW', 'WSW', 'SSW', 'SSE', 'ESE', 'ENE', 'NNE']
+visAngleElevations = ['Low', 'High']
+visAngleNames = [elevation + direction for elevation in visAngleElevations for direction in visAngleDirections]
+
+# uint16 array of VisAngleFlags of shape (n,) => bool array of shape (n, 16), [:,i] = hidden from angle i
+def visAngleBits(visAngles):
+    return ((np.asarray(visAngles, dtype=np.uint16)[:,None] >> np.arange(16, dtype=np.uint16)) & 1).astype(bool)
+
+# bool array of shape (n, 16) => uint16 array of VisAngleFlags of shape (n,)
+def visAnglesFromBits(bits):
+    return (np.asarray(bits, dtype=np.uint16) << np.arange(16, dtype=np.uint16)).sum(axis=-1).astype(np.uint16)
+
 # forcing little-endian-ness via ctypes struct
 class UntexUnknown(FFTStruct):
     _fields_ = [
@@ -542,6 +670,12 @@ class ToStr:
         sep = ', '
         return '{'+sep.join(s)+'}'
 
+    # json-able dict of the fields, skipping the same ones as __str__, and the back-reference to the resource
+    def toDict(self):
+        return {k : toJSONValue(v)
+            for (k, v) in vars(self).items()
+            if k != 'data' and k != 'ofs' and k != 'res'}
+
 class VertexTex(ToStr):
     def __init__(self, pos, normal, texcoord):
         self.pos = pos
@@ -623,8 +757,13 @@ class Chunk(ToStr):
         self.ofs += sizeof(cl)
         return res
 
+# the lower polygon counts GaneshaDx sticks to, (triTex, quadTex, triUntex, quadUntex)
+ganeshaDxPolygonLimits = (360, 710, 64, 256)
+
 class VisAngleChunk(Chunk):
-    # res isn't used.  just here for ctor consistency with other chunks.
+    # how many polygons of each type there's room for, (triTex, quadTex, triUntex, quadUntex)
+    numSlots = (512, 768, 64, 256)
+
     def __init__(self, data, res):
         super().__init__(data)
 
@@ -634,13 +773,13 @@ class VisAngleChunk(Chunk):
         # reading chunk 0x2c
         # from the 'writeVisAngles' function looks like this is written to a 1024 byte block always
         self.header = self.readBytes(0x380)
-        self.triTexVisAngles = self.read(VisAngleFlags * 512)
-        self.quadTexVisAngles = self.read(VisAngleFlags * 768)
-        self.triUntexVisAngles = self.read(VisAngleFlags * 64)
-        self.quadUntexVisAngles = self.read(VisAngleFlags * 256)
+        self.triTexVisAngles = self.read(VisAngleFlags * self.numSlots[0])
+        self.quadTexVisAngles = self.read(VisAngleFlags * self.numSlots[1])
+        self.triUntexVisAngles = self.read(VisAngleFlags * self.numSlots[2])
+        self.quadUntexVisAngles = self.read(VisAngleFlags * self.numSlots[3])
         self.footer = self.readBytes()
         # does this mean we can only have 512 tex'd tris/tex'd quads/untex'd tris/untex'd quads?
-        # GaneshaDx has these constants:
+        # GaneshaDx has these constants: (see ganeshaDxPolygonLimits)
         #MaxTexturedTriangles = 360
         #MaxTexturedQuads = 710
         #MaxUntexturedTriangles = 64
@@ -648,39 +787,51 @@ class VisAngleChunk(Chunk):
         # why are GaneshaDx's textured tri and quad counts lower than original python Ganesha's?
         # done reading chunk 0x2c
 
+    # write a list of 4 uint16 arrays, the visAngles of the (triTex, quadTex, triUntex, quadUntex) polygons, into the slots
+    # the slots past each array's length keep what they had
+    def setVisAngles(self, visAnglesPerType):
+        for (slots, visAngles) in zip((
+            self.triTexVisAngles,
+            self.quadTexVisAngles,
+            self.triUntexVisAngles,
+            self.quadUntexVisAngles,
+        ), visAnglesPerType):
+            if len(visAngles) > len(slots):
+                raise ValueError("mesh has "+str(len(visAngles))+" polygons but there's only room for "+str(len(slots))+" visAngles")
+            np.frombuffer(slots, dtype='<u2')[:len(visAngles)] = visAngles
+
     # rather than crossing VisAngleChunk and MeshChunk,
     #  how about a 3rd party that holds both's info
     # (and the respective blender objects that go with it)
     # and then both can query it?
     # right now MeshChunk is taking responsibility for both.
     def toBin(self):
-        meshChunk = res.meshChunk
-        triTexVisAngles = b''
-        for polygon in meshChunk.triTexs:
-            triTexVisAngles += bytes(polygon.visAngles)
-        triTexVisAngles += b'\0' * (1024 - len(triTexVisAngles))
-
-        quadTexVisAngles = b''
-        for polygon in meshChunk.quadTexs:
-            quadTexVisAngles += bytes(polygon.visAngles)
-        quadTexVisAngles += b'\0' * (1536 - len(quadTexVisAngles))
-
-        triUntexVisAngles = b''
-        for polygon in meshChunk.triUntexs:
-            triUntexVisAngles += bytes(polygon.visAngles)
-        triUntexVisAngles += b'\0' * (128 - len(triUntexVisAngles))
-
-        quadUntexVisAngles = b''
-        for polygon in meshChunk.quadUntexs:
-            quadUntexVisAngles += bytes(polygon.visAngles)
-        quadUntexVisAngles += b'\0' * (512 - len(quadUntexVisAngles))
+        # start from what was read, so the slots past the polygon counts keep whatever they had
+        triTexVisAngles = type(self.triTexVisAngles).from_buffer_copy(self.triTexVisAngles)
+        quadTexVisAngles = type(self.quadTexVisAngles).from_buffer_copy(self.quadTexVisAngles)
+        triUntexVisAngles = type(self.triUntexVisAngles).from_buffer_copy(self.triUntexVisAngles)
+        quadUntexVisAngles = type(self.quadUntexVisAngles).from_buffer_copy(self.quadUntexVisAngles)
+
+        meshChunk = self.res.meshChunk
+        if meshChunk != None:
+            for (visAngles, polygons) in (
+                (triTexVisAngles, meshChunk.triTexs),
+                (quadTexVisAngles, meshChunk.quadTexs),
+                (triUntexVisAngles, meshChunk.triUntexs),
+                (quadUntexVisAngles, meshChunk.quadUntexs),
+            ):
+                if len(polygons) > len(visAngles):
+                    raise ValueError("mesh has "+str(len(polygons))+" polygons but there's only room for "+str(len(visAngles))+" visAngles")
+                for (i, polygon) in enumerate(polygons):
+                    if polygon.visAngles != None:
+                        visAngles[i] = polygon.visAngles
 
         return (
               self.header
-            + triTexVisAngles
-            + quadTexVisAngles
-            + triUntexVisAngles
-            + quadUntexVisAngles
+            + bytes(triTexVisAngles)
+            + bytes(quadTexVisAngles)
+            + bytes(triUntexVisAngles)
+            + bytes(quadUntexVisAngles)
             + self.footer
         )
 
@@ -689,12 +840,18 @@ class VisAngleChunk(Chunk):
 # and only one of those custom face attributes is going to be the visangles
 # so that means load the MeshChunk after visAngles (and all other chunks) are loaded
 class MeshChunk(Chunk):
+    # animated meshes don't have visAngles
+    usesVisAngles = True
+
     # read the mesh chunk
     def __init__(self, data, res):
         super().__init__(data)
 
-        if res.visAngleChunk == None:
-            print("reading a mesh without visAngles ... expect an error in some corner case I forgot to accomodate for")
+        visAngleChunk = None
+        if self.usesVisAngles:
+            visAngleChunk = res.visAngleChunk
+            if visAngleChunk == None:
+                print("reading a mesh without visAngles ... expect an error in some corner case I forgot to accomodate for")
 
         # reading from chunk 0x10
         self.hdr = self.read(MeshHeader)
@@ -723,7 +880,8 @@ class MeshChunk(Chunk):
 
         self.triTexTilePos = self.read(TilePos * self.hdr.numTriTex) # then comes tile info 2 bytes per tex-tri
         self.quadTexTilePos = self.read(TilePos * self.hdr.numQuadTex) # then comes tile info 2 bytes per tex-quad
-        # and that's it from chunk 0x10
+        # and that's it from chunk 0x10, keep any padding after it
+        self.footer = self.readBytes()
 
         # now for aux calcs
         # this is based on 0x10 (mesh) and 0x2c (visAngles)
@@ -754,7 +912,7 @@ class MeshChunk(Chunk):
                 self.triTexNormals[3*i:3*(i+1)],
                 self.triTexFaces[i],
                 self.triTexTilePos[i],
-                res.visAngleChunk.triTexVisAngles[i] if res.visAngleChunk != None else None
+                visAngleChunk.triTexVisAngles[i] if visAngleChunk != None else None
             ))
 
         self.quadTexs = []
@@ -764,7 +922,7 @@ class MeshChunk(Chunk):
                 self.quadTexNormals[4*i:4*(i+1)],
                 self.quadTexFaces[i],
                 self.quadTexTilePos[i],
-                res.visAngleChunk.quadTexVisAngles[i] if res.visAngleChunk != None else None
+                visAngleChunk.quadTexVisAngles[i] if visAngleChunk != None else None
             ))
 
         self.triUntexs = []
@@ -772,7 +930,7 @@ class MeshChunk(Chunk):
             self.triUntexs.append(TriUntex(
                 self.triUntexVtxs[3*i:3*(i+1)],
                 self.triUntexUnknowns[i],
-                res.visAngleChunk.triUntexVisAngles[i] if res.visAngleChunk != None else None
+                visAngleChunk.triUntexVisAngles[i] if visAngleChunk != None else None
             ))
 
         self.quadUntexs = []
@@ -780,41 +938,270 @@ class MeshChunk(Chunk):
             self.quadUntexs.append(QuadUntex(
                 self.quadUntexVtxs[4*i:4*(i+1)],
                 self.quadUntexUnknowns[i],
-                res.visAngleChunk.quadUntexVisAngles[i] if res.visAngleChunk != None else None
+                visAngleChunk.quadUntexVisAngles[i] if visAngleChunk != None else None
             ))
 
+    def polygons(self):
+        return (self.triTexs
+            + self.quadTexs
+            + self.triUntexs
+            + self.quadUntexs)
+
+    # returns int16 array of shape (numVertexes, 3) of all vertex positions
+    # in the same order as polygons(), 3 per tri and 4 per quad
+    def positionArray(self):
+        return np.concatenate([
+            np.frombuffer(vtxs, dtype='<i2').reshape(-1, 3)
+            for vtxs in (
+                self.triTexVtxs,
+                self.quadTexVtxs,
+                self.triUntexVtxs,
+                self.quadUntexVtxs
+            )
+        ])
+
+    # returns int16 array of shape (numVertexes, 3) of all vertex normals, in 1/4096ths
+    # in the same order as positionArray(), untextured polygons don't have normals so theirs are 0
+    def normalArray(self):
+        numTriTex, numQuadTex, numTriUntex, numQuadUntex = self.polygonCounts()
+        return np.concatenate([
+            np.frombuffer(self.triTexNormals, dtype='<i2').reshape(-1, 3),
+            np.frombuffer(self.quadTexNormals, dtype='<i2').reshape(-1, 3),
+            np.zeros((3 * numTriUntex + 4 * numQuadUntex, 3), dtype=np.int16),
+        ])
+
+    # returns uint8 array of shape (numVertexes, 2) of all vertex texcoords, within their texture page
+    # in the same order as positionArray(), untextured polygons' are 0
+    def texCoordArray(self):
+        numTriTex, numQuadTex, numTriUntex, numQuadUntex = self.polygonCounts()
+        return np.concatenate([
+            np.frombuffer(bytes(self.triTexFaces), dtype=np.uint8).reshape(-1, sizeof(TriTexFace))[:,[0,1,4,5,8,9]].reshape(-1, 2),
+            np.frombuffer(bytes(self.quadTexFaces), dtype=np.uint8).reshape(-1, sizeof(QuadTexFace))[:,[0,1,4,5,8,9,10,11]].reshape(-1, 2),
+            np.zeros((3 * numTriUntex + 4 * numQuadUntex, 2), dtype=np.uint8),
+        ])
+
+    # returns uint8 array of shape (numTriTex + numQuadTex, 2) of the textured polygons' TilePos bytes
+    def tilePosArray(self):
+        return np.frombuffer(
+            bytes(self.triTexTilePos) + bytes(self.quadTexTilePos),
+            dtype=np.uint8
+        ).reshape(-1, 2)
+
+    # (numTriTex, numQuadTex, numTriUntex, numQuadUntex)
+    def polygonCounts(self):
+        return self.hdr.toTuple()
+
+    # returns {name: int array of shape (numPolygons,)} of the per-polygon fields that aren't geometry, in polygons() order
+    # the TriTexFace / QuadTexFace fields are 0 for untextured polygons, and untexUnknown is 0 for textured ones
+    # untexUnknown is the UntexUnknown's uint32 viewed as int32, so it fits in a blender INT attribute
+    def faceFieldArrays(self):
+        numTriTex, numQuadTex, numTriUntex, numQuadUntex = self.polygonCounts()
+        numTex = numTriTex + numQuadTex
+        # the fields are at the same offsets in both, quads just have uv3 on the end
+        texFaces = np.concatenate([
+            np.frombuffer(bytes(self.triTexFaces), dtype=np.uint8).reshape(-1, sizeof(TriTexFace))[:,:8],
+            np.frombuffer(bytes(self.quadTexFaces), dtype=np.uint8).reshape(-1, sizeof(QuadTexFace))[:,:8],
+        ]).astype(np.int32)
+        numPolygons = numTex + numTriUntex + numQuadUntex
+        fields = {}
+        for (name, byteIndex, shift, numBits) in texFaceFieldBits:
+            fields[name] = np.zeros(numPolygons, dtype=np.int32)
+            fields[name][:numTex] = (texFaces[:,byteIndex] >> shift) & ((1 << numBits) - 1)
+        fields['untexUnknown'] = np.zeros(numPolygons, dtype=np.int32)
+        fields['untexUnknown'][numTex:] = np.frombuffer(
+            bytes(self.triUntexUnknowns) + bytes(self.quadUntexUnknowns),
+            dtype='<u4'
+        ).view(np.int32)
+        return fields
+
+    # uint16 array of shape (numPolygons,) of each polygon's VisAngleFlags, in polygons() order
+    # or None if the mesh doesn't have visAngles
+    def visAngleArray(self):
+        polygons = self.polygons()
+        if not self.usesVisAngles or any(polygon.visAngles == None for polygon in polygons):
+            return None
+        return np.array([polygon.visAngles.v for polygon in polygons], dtype=np.uint16)
+
+    # pack mesh chunk data from arrays, for meshes that didn't come from a file
+    # groups = [triTex, quadTex, triUntex, quadUntex], each a dict of arrays, one row per polygon:
+    #  'pos' = int16 (n, 3 or 4, 3) vertex positions, in FFT vertex order
+    # the textured groups also have:
+    #  'normal' = int16 (n, 3 or 4, 3) normals, scaled by 4096
+    #  'uv' = uint8 (n, 3 or 4, 2) texcoords
+    #  'pal', 'page', 'unk2_4', 'unk3', 'unk6_2', 'unk7' = (n,) TriTexFace / QuadTexFace fields
+    #  'tilePos' = uint8 (n, 2) TilePos bytes
+    # the untextured groups also have:
+    #  'untexUnknown' = (n,) UntexUnknown values
+    @staticmethod
+    def arraysToBin(groups, footer=b''):
+        triTex, quadTex, triUntex, quadUntex = groups
+        hdr = MeshHeader(*[len(group['pos']) for group in groups])
+        data = [bytes(hdr)]
+        for group in groups:
+            data.append(np.asarray(group['pos'], dtype='<i2').tobytes())
+        for group in (triTex, quadTex):
+            data.append(np.asarray(group['normal'], dtype='<i2').tobytes())
+        for group in (triTex, quadTex):
+            n, numVtxs = group['uv'].shape[:2]
+            # uv0, pal, unk3, uv1, page, unk7, uv2 [, uv3]
+            texFaces = np.zeros((n, 2 * numVtxs + 4), dtype=np.uint8)
+            uv = np.asarray(group['uv'], dtype=np.uint8)
+            texFaces[:,0:2] = uv[:,0]
+            texFaces[:,4:6] = uv[:,1]
+            texFaces[:,8:] = uv[:,2:].reshape(n, 2 * (numVtxs - 2))
+            for (name, byteIndex, shift, numBits) in texFaceFieldBits:
+                texFaces[:,byteIndex] |= ((np.asarray(group[name]) & ((1 << numBits) - 1)) << shift).astype(np.uint8)
+            data.append(texFaces.tobytes())
+        for group in (triUntex, quadUntex):
+            data.append(np.asarray(group['untexUnknown']).astype('<u4').tobytes())
+        for group in (triTex, quadTex):
+            data.append(np.asarray(group['tilePos'], dtype=np.uint8).tobytes())
+        data.append(footer)
+        return b''.join(data)
+
+    # just the summary, the polygons can be written a batch at a time from polygons()
+    def toDict(self):
+        return {
+            'hdr' : self.hdr.toDict(),
+            'bbox' : toJSONValue(self.bbox),
+            'center' : toJSONValue(self.center),
+        }
+
     def toBin(self):
         # TODO recalc mesh based on blender mesh
-        data = bytes(self.hdr)
+        data = [bytes(self.hdr)]
         for polygon in self.polygons():
             for v in polygon.vtxs:
-                data += bytes(v.pos)
+                data.append(bytes(v.pos))
         for polygon in self.triTexs + self.quadTexs:
             for v in polygon.vtxs:
-                data += bytes(v.normal)
+                data.append(bytes(v.normal))
         for polygon in self.triTexs + self.quadTexs:
-            if polygon.texFace.unk3 == 0:
-                polygon.texFace.unk3 = 120
-                polygon.texFace.unk6_2 = 3
-            data += bytes(polygon.texFace)
+            data.append(bytes(polygon.texFace))
         for polygon in self.triUntexs + self.quadUntexs:
-            data += bytes(polygon.unknown)
+            data.append(bytes(polygon.unknown))
         for polygon in self.triTexs + self.quadTexs:
-            data += bytes(polygon.tilePos)
-        return data
+            data.append(bytes(polygon.tilePos))
+        data.append(self.footer)
+        return b''.join(data)
+
+# chunk 0x23
+# I haven't figured this one out yet, just hold onto it so it can be written back out
+class MeshAnimBaseChunk(Chunk):
+    def __init__(self, data, res):
+        super().__init__(data)
+
+    def toBin(self):
+        return self.data
+
+# chunks 0x24..0x2b, same layout as the mesh chunk
+class MeshAnimChunk(MeshChunk):
+    usesVisAngles = False
+
+# groups the animated meshes of a resource into frame sets
+# animated meshes with the same polygon counts as the first in their set are treated as frames of it
+# vertex offsets are relative to the set's first frame
+# GUESS: which animated meshes belong together, and in what order, is probably in chunk 0x23, which isn't decoded yet
+#  matching polygon counts is only a heuristic, two unrelated meshes with the same counts end up as frames of one,
+#  and the frames are played in chunk order
+class MeshAnimFrameSet(object):
+    def __init__(self, meshAnimIndexes, meshAnimChunks):
+        # indexes 0..7 of the animated mesh chunks in this set, 0 = chunk 0x24
+        self.meshAnimIndexes = meshAnimIndexes
+        # the first frame, from which the blender mesh is built
+        self.meshChunk = meshAnimChunks[0]
+        # int16 array of shape (numVertexes, 3)
+        self.basePositions = self.meshChunk.positionArray()
+        # int16 array of shape (numFrames, numVertexes, 3)
+        self.offsets = (
+            np.stack([chunk.positionArray() for chunk in meshAnimChunks])
+            - self.basePositions
+        ).astype(np.int16)
+
+    @staticmethod
+    def fromChunks(meshAnimChunks):
+        sets = []
+        remaining = [(i, chunk) for (i, chunk) in enumerate(meshAnimChunks) if chunk != None]
+        while len(remaining) > 0:
+            counts = remaining[0][1].polygonCounts()
+            same = [(i, chunk) for (i, chunk) in remaining if chunk.polygonCounts() == counts]
+            remaining = [(i, chunk) for (i, chunk) in remaining if chunk.polygonCounts() != counts]
+            sets.append(MeshAnimFrameSet(
+                [i for (i, chunk) in same],
+                [chunk for (i, chunk) in same]
+            ))
+        return sets
+
+# maps tiles to the textured polygons that sit on them, and back, from the per-polygon TilePos
+# tiles are referred to by their flat index (y * sizeZ + z) * sizeX + x, same as the tile meshes' face order
+# polygons are referred to by their index in MeshChunk.polygons(), same as the mesh's face order
+class TilePolygonIndex(object):
+    def __init__(self, tileForPolygon, numTiles):
+        self.numTiles = numTiles
+        # int32 array of shape (numPolygons,), the tile of each polygon
+        # -1 for polygons without one: the untextured ones, and any whose TilePos is outside the map
+        self.tileForPolygon = tileForPolygon
+        # CSR layout: the polygons of tile t are polygonIds[offsets[t]:offsets[t+1]]
+        withTile = np.nonzero(tileForPolygon >= 0)[0]
+        order = np.argsort(tileForPolygon[withTile], kind='stable')
+        self.polygonIds = withTile[order].astype(np.int32)
+        self.offsets = np.zeros(numTiles + 1, dtype=np.int32)
+        np.cumsum(np.bincount(tileForPolygon[withTile], minlength=numTiles), out=self.offsets[1:])
+
+    @staticmethod
+    def fromMesh(meshChunk, sizeInTiles):
+        sizeX, sizeZ = sizeInTiles
+        # TilePos is 2 bytes: x, then y in the low bit and z in the upper 7
+        tilePos = meshChunk.tilePosArray().astype(np.int32)
+        x = tilePos[:,0]
+        y = tilePos[:,1] & 1
+        z = tilePos[:,1] >> 1
+        # textured polygons come first in polygons()
+        tileForPolygon = np.full(sum(meshChunk.polygonCounts()), -1, dtype=np.int32)
+        tileForPolygon[:len(tilePos)] = np.where(
+            (x < sizeX) & (z < sizeZ),
+            (y * sizeZ + z) * sizeX + x,
+            -1)
+        return TilePolygonIndex(tileForPolygon, 2 * sizeZ * sizeX)
+
+    # the other way: uint8 array of shape (n, 2) of the TilePos bytes of flat tile indexes
+    # tiles of -1 get TilePos 0
+    @staticmethod
+    def tilePosForTiles(tiles, sizeInTiles):
+        sizeX, sizeZ = sizeInTiles
+        tiles = np.maximum(np.asarray(tiles, dtype=np.int32), 0)
+        x = tiles % sizeX
+        z = (tiles // sizeX) % sizeZ
+        y = tiles // (sizeX * sizeZ)
+        return np.stack([x, (y & 1) | (z << 1)], axis=-1).astype(np.uint8)
+
+    def polygonsForTile(self, tile):
+        return self.polygonIds[self.offsets[tile]:self.offsets[tile+1]]
+
+    # all polygons of a list of tiles, O(number of polygons returned)
+    def polygonsForTiles(self, tiles):
+        tiles = np.asarray(tiles, dtype=np.int32)
+        starts = self.offsets[tiles]
+        counts = self.offsets[tiles + 1] - starts
+        # each tile's start repeated once per polygon, plus 0..count-1 within the tile
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.polygonIds[np.repeat(starts, counts) + within]
+
+    # unique tiles of a list of polygons
+    def tilesForPolygons(self, polygons):
+        tiles = self.tileForPolygon[np.asarray(polygons, dtype=np.int32)]
+        return np.unique(tiles[tiles >= 0])
 
 class PalChunk(Chunk):
     def __init__(self, data, res):
         super().__init__(data)
         # reading chunk
         self.pals = [self.read(RGBA5551 * 16) for i in range(16)]
+        self.footer = self.readBytes()
         # done reading chunk
 
     def toBin(self):
-        data = b''
-        for colors in self.pals:
-            data += bytes(colors)
-        return data
+        return b''.join(bytes(colors) for colors in self.pals) + self.footer
 
 class ColorPalChunk(PalChunk): # 0x11
     ident = 'Color'
@@ -837,46 +1224,139 @@ class LightChunk(Chunk):
         return (
               bytes(self.dirLightColors)
             + bytes(self.dirLightDirs)
-            + bytes(self.ambientLightColors)
+            + bytes(self.ambientLightColor)
             + bytes(self.backgroundColors)
             + self.footer
         )
 
+# [y][z][x] access to the tiles, like nested lists, but viewing the tile buffer
+# indexing all the way down gives a Tile that shares the buffer, so writes go thru
+class TileView(object):
+    def __init__(self, tileArray, base, shape, strides):
+        self.tileArray = tileArray
+        self.base = base
+        self.shape = shape
+        self.strides = strides
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.shape[0]
+        if not 0 <= i < self.shape[0]:
+            raise IndexError(i)
+        index = self.base + i * self.strides[0]
+        if len(self.shape) == 1:
+            return self.tileArray[index]
+        return TileView(self.tileArray, index, self.shape[1:], self.strides[1:])
+
+    def __iter__(self):
+        for i in range(self.shape[0]):
+            yield self[i]
+
 class TileChunk(Chunk):
+    # first layer always has room for this many tiles, the second layer follows
+    layerStride = 256
+
     def __init__(self, data, res):
         super().__init__(data)
         # reading chunk 0x1a
         self.sizeInTiles = self.read(c_uint8 * 2)  # (sizeX, sizeZ)
         # weird, it leaves room for 256 total tiles for the first xz plane, and then the second is packed?
-        tileSrc = self.read(Tile * (256 + self.sizeInTiles[0] * self.sizeInTiles[1]))
+        sizeX, sizeZ = self.sizeInTiles
+        # the strided [y][z][x] views below don't check their bounds, so check the sizes here
+        if sizeX * sizeZ > self.layerStride:
+            raise ValueError("tile chunk is "+str(sizeX)+"x"+str(sizeZ)+" but the first layer only has room for "+str(self.layerStride)+" tiles")
+        tileBufSize = sizeof(Tile) * (self.layerStride + sizeX * sizeZ)
+        self.tileBuf = bytearray(self.readBytes(tileBufSize))
+        if len(self.tileBuf) != tileBufSize:
+            raise ValueError("tile chunk needs "+str(tileBufSize)+" bytes of tiles for "+str(sizeX)+"x"+str(sizeZ)+" but only has "+str(len(self.tileBuf)))
         self.footer = self.readBytes()
         # done reading chunk 0x1a
 
-        # convert the tiles from [z * sizeInTiles[0] + x] w/padding for y to [y][z][x]
-        self.tiles = []
-        for y in range(2):
-            level = []
-            for z in range(self.sizeInTiles[1]):
-                row = []
-                for x in range(self.sizeInTiles[0]):
-                    row.append(tileSrc[256 * y + z * self.sizeInTiles[0] + x])
-                level.append(row)
-            self.tiles.append(level)
+        # ctypes Tile array over the buffer
+        self.tileArray = (Tile * (len(self.tileBuf) // sizeof(Tile))).from_buffer(self.tileBuf)
+
+        # numpy [y][z][x] structured array over the buffer, with the first-layer padding skipped
+        self.tileGrid = np.lib.stride_tricks.as_strided(
+            np.frombuffer(self.tileBuf, dtype=tileDtype),
+            shape=(2, sizeZ, sizeX),
+            strides=(self.layerStride * sizeof(Tile), sizeX * sizeof(Tile), sizeof(Tile))
+        )
+
+        # [y][z][x] view of the Tile's
+        self.tiles = TileView(
+            self.tileArray,
+            0,
+            (2, sizeZ, sizeX),
+            (self.layerStride, sizeX, 1)
+        )
+
+    # just the summary, the tiles can be written a row at a time from self.tiles
+    def toDict(self):
+        return {
+            'sizeInTiles' : toJSONValue(self.sizeInTiles),
+            'footer' : toJSONValue(self.footer),
+        }
+
+    # returns a [y][z][x] array of the Tile field 'name', bitfields included
+    def getField(self, name):
+        field = getattr(Tile, name)
+        value = self.tileGrid[tileDtype.names[field.offset]]
+        if field.size >> 16:
+            # ctypes bitfield size is (numBits << 16) | bitOffset
+            numBits = field.size >> 16
+            value = (value >> (field.size & 0xffff)) & ((1 << numBits) - 1)
+        return value
+
+    # writes a [y][z][x] array (or anything broadcastable to it) into the Tile field 'name'
+    def setField(self, name, value):
+        field = getattr(Tile, name)
+        byteName = tileDtype.names[field.offset]
+        if field.size >> 16:
+            numBits = field.size >> 16
+            shift = field.size & 0xffff
+            mask = np.uint8(((1 << numBits) - 1) << shift)
+            byte = self.tileGrid[byteName]
+            self.tileGrid[byteName] = (byte & ~mask) | ((np.asarray(value, dtype=np.uint8) << shift) & mask)
+        else:
+            self.tileGrid[byteName] = value
+
+    # returns [y][z][x][corner] array of the height of each corner of tileCornerOffsets, in half-tiles
+    def cornerHeights(self):
+        halfHeight = self.getField('halfHeight').astype(np.int16)
+        slopeHeight = self.getField('slopeHeight').astype(np.int16)
+        slopeType = self.getField('slopeType')
+        return np.stack([
+            halfHeight + slopeHeight * np.isin(slopeType, lift)
+            for lift in liftPerVertPerSlopeType
+        ], axis=-1)
+
+    # the other way from cornerHeights(): set halfHeight, slopeHeight and slopeType from a [y][z][x][corner] array of heights
+    # only the tiles whose corner heights changed are touched, so unused bits of the rest keep what they had
+    # corners that no slopeType can make (saddles, or corners between the lowest and highest) are flattened to the lowest
+    # returns the number of tiles that got flattened
+    def setCornerHeights(self, heights):
+        heights = np.asarray(heights, dtype=np.int16)
+        changed = np.any(heights != self.cornerHeights(), axis=-1)
+        low = np.clip(heights.min(axis=-1), 0, 255)
+        high = np.clip(heights.max(axis=-1), low, low + 31)
+        lifted = (heights == high[...,None]) & (high > low)[...,None]
+        slopeType = slopeTypeForLiftMask[(lifted << np.arange(4)).sum(axis=-1)]
+        flattened = (slopeType < 0) | np.any((heights != low[...,None]) & ~lifted, axis=-1)
+        slopeType[flattened] = 0
+        high[flattened] = low[flattened]
+        for (name, value) in (
+            ('halfHeight', low),
+            ('slopeHeight', high - low),
+            ('slopeType', slopeType),
+        ):
+            self.setField(name, np.where(changed, value, self.getField(name)))
+        return int(np.count_nonzero(changed & flattened))
 
     def toBin(self):
-        # TODO read this back from the blender mesh
-        assert len(self.tiles) == 2
-        self.sizeInTiles[0] = len(self.tiles[0][0])
-        self.sizeInTiles[1] = len(self.tiles[0])
-        data = bytes(self.sizeInTiles)
-        for level in self.tiles:
-            for row in level:
-                for tile in row:
-                    data += bytes(tile)
-            # Skip to second level of tile data
-            data += b'\0' * (sizeof(Tile) * (256 - sizeX * sizeZ))
-        data += self.footer
-        return data
+        return bytes(self.sizeInTiles) + bytes(self.tileBuf) + self.footer
 
 class TexAnimChunk(Chunk):
     def __init__(self, data, res):
@@ -885,23 +1365,54 @@ class TexAnimChunk(Chunk):
         self.anims = self.read(TexAnim * 32)
         # done reading 0x1b
 
+        # sort out which slots are texture animations and which are palette animations
+        # store (slot index, anim) so we can find our way back to self.anims
+        # skip the empty slots
+        self.texAnims = []
+        self.palAnims = []
+        for (i, anim) in enumerate(self.anims):
+            if anim.numFrames == 0:
+                continue
+            if anim.structSig == 0 and anim.y == 0x1e0:
+                self.palAnims.append((i, PalAnim.from_buffer_copy(bytes(anim))))
+            else:
+                self.texAnims.append((i, anim))
+
+    # returns uint8 array of shape (numFrames, height, width) of the texture indexes of each frame
+    # indexArray is the TexBlob.indexArray() of the texture the animation reads from
+    def framesForAnim(self, indexArray, anim):
+        x, y, width, height = anim.firstFrameRect()
+        frames = np.zeros((anim.numFrames * height, width), dtype=np.uint8)
+        src = indexArray[y:y + anim.numFrames * height, x:x + width]
+        frames[:src.shape[0], :src.shape[1]] = src
+        return frames.reshape(anim.numFrames, height, width)
+
+    # copy frame 'frame' of the animation into the animated rectangle of indexArray
+    def applyFrame(self, indexArray, anim, frame):
+        x, y, width, height = anim.canvasRect()
+        indexArray[y:y + height, x:x + width] = self.framesForAnim(indexArray, anim)[frame]
+
     def toBin(self):
         return bytes(self.anims)
 
+# the palette animation frames that chunk 0x1b's PalAnim's point into
 class PalAnimChunk(Chunk):
     def __init__(self, data, res):
         super().__init__(data)
         # begin reading 0x1c
-        self.pals = []
-        for i in range(16):
-            self.pals[i] =  self.read(RGBA5551 * 16)
+        numPals = len(self.data) // sizeof(RGBA5551 * 16)
+        self.pals = [self.read(RGBA5551 * 16) for i in range(numPals)]
+        self.footer = self.readBytes()
         # done reading 0x1c
 
+    # returns float32 array of shape (numFrames, 16, 4) of the frames this PalAnim cycles thru
+    # frames past the end of the chunk wrap around
+    def framesForAnim(self, anim):
+        rgba = RGBA5551.arrayToRGBA(b''.join(bytes(pal) for pal in self.pals)).reshape(len(self.pals), 16, 4)
+        return rgba[(anim.startIndex + np.arange(anim.numFrames)) % len(self.pals)]
+
     def toBin(self):
-        data = b''
-        for pal in self.pals:
-            data += bytes(pal)
-        return data
+        return b''.join(bytes(pal) for pal in self.pals) + self.footer
 
 def countSectors(size):
     return (size >> 11) + (1 if size & ((1<<11)-1) else 0)
@@ -915,8 +1426,17 @@ class NonTexBlob(ResourceBlob):
         CHUNK_LIGHTS : LightChunk,
         CHUNK_TILES : TileChunk,
         CHUNK_TEX_ANIM : TexAnimChunk,
-        #CHUNK_PAL_ANIM : PalAnimChunk,
+        CHUNK_PAL_ANIM : PalAnimChunk,
         CHUNK_GRAYPALS : GrayPalChunk,
+        CHUNK_MESH_ANIM_BASE : MeshAnimBaseChunk,
+        CHUNK_MESH_ANIM0 : MeshAnimChunk,
+        CHUNK_MESH_ANIM1 : MeshAnimChunk,
+        CHUNK_MESH_ANIM2 : MeshAnimChunk,
+        CHUNK_MESH_ANIM3 : MeshAnimChunk,
+        CHUNK_MESH_ANIM4 : MeshAnimChunk,
+        CHUNK_MESH_ANIM5 : MeshAnimChunk,
+        CHUNK_MESH_ANIM6 : MeshAnimChunk,
+        CHUNK_MESH_ANIM7 : MeshAnimChunk,
         CHUNK_VISANGLES : VisAngleChunk,
     }
 
@@ -931,17 +1451,16 @@ class NonTexBlob(ResourceBlob):
         self.header = ResHeader.from_buffer_copy(data)
 
         chunks = [None] * NUM_CHUNKS
-        for i, entry in enumerate(self.header.v):
-            begin = self.header.v[i]
-            if begin:
-                end = None
-                for j in range(i + 1, NUM_CHUNKS):
-                    if self.header.v[j]:
-                        end = self.header.v[j]
-                        break
-                if end == None:
-                    end = len(data)
-                chunks[i] = data[begin:end]
+        bounds = self.chunkBounds(self.header, len(data))
+        for (i, begin, end) in bounds:
+            chunks[i] = data[begin:end]
+
+        # keep the raw chunks, so the ones we don't have a class for can be written back out as-is
+        self.rawChunks = chunks
+        # and anything between the header and the first chunk
+        self.headerPadding = b''
+        if len(bounds) > 0:
+            self.headerPadding = data[sizeof(self.header):min(begin for (i, begin, end) in bounds)]
 
         # each chunk's IO
         self.chunkIOs = [None] * NUM_CHUNKS
@@ -969,25 +1488,52 @@ class NonTexBlob(ResourceBlob):
         self.texAnimChunk = readChunk(CHUNK_TEX_ANIM)
         self.palAnimChunk = readChunk(CHUNK_PAL_ANIM)
         self.grayPalChunk = readChunk(CHUNK_GRAYPALS)
+        self.meshAnimBaseChunk = readChunk(CHUNK_MESH_ANIM_BASE)
+        meshAnimChunks = [readChunk(CHUNK_MESH_ANIM0 + i) for i in range(8)]
+        self.meshAnimFrameSets = None
+        if any(chunk != None for chunk in meshAnimChunks):
+            self.meshAnimFrameSets = MeshAnimFrameSet.fromChunks(meshAnimChunks)
+
+    # (chunkIndex, begin, end) byte ranges of the chunks present in a resource
+    # each chunk runs up to the next one's offset, or to the end of the file
+    @staticmethod
+    def chunkBounds(header, dataLen):
+        bounds = []
+        for i in range(NUM_CHUNKS):
+            begin = header.v[i]
+            if begin:
+                end = None
+                for j in range(i + 1, NUM_CHUNKS):
+                    if header.v[j]:
+                        end = header.v[j]
+                        break
+                if end == None:
+                    end = dataLen
+                bounds.append((i, begin, end))
+        return bounds
 
-    def write(self):
+    # the whole resource file, with each chunk from its toBin(), or as it was read if it has no class
+    # this updates the header offsets
+    def toBin(self):
         chunks = [None] * NUM_CHUNKS
-        for i in range(NUM_CHUNKS):
-            if (i, io) in enumerate(self.chunkIOs):
-                if io != None:
-                    chunks[i] = io.toBin()
+        for (i, io) in enumerate(self.chunkIOs):
+            if io != None:
+                chunks[i] = io.toBin()
+            else:
+                chunks[i] = self.rawChunks[i]
 
         # now write the header
-        ofs = sizeof(self.header.v)
+        ofs = sizeof(self.header) + len(self.headerPadding)
         for (i, chunk) in enumerate(chunks):
             if chunk:
                 self.header.v[i] = ofs
                 ofs += len(chunk)
             else:
                 self.header.v[i] = 0
-        data = bytes(self.header.v)
-        for chunk in chunks:
-            data += chunk
+        return bytes(self.header) + self.headerPadding + b''.join(chunk for chunk in chunks if chunk)
+
+    def write(self):
+        data = self.toBin()
         newNumSectors = countSectors(len(data))
         if newNumSectors > self.numSectors:
             print('WARNING: File has grown from %u sectors to %u sectors!' % (self.numSectors, newNumSectors))
@@ -1099,42 +1645,31 @@ class GNS(object):
     # allow overloading
     TexBlob = TexBlob
     NonTexBlob = NonTexBlob
+    UnknownBlob = UnknownBlob
 
-    def __init__(self, filepath):
+    # mapStates = list of (arrangement, night, weather) to load the resources of, or None for all of them
+    # catalogOnly = only read the records and stat the resource files, don't load any resources.  see catalog()
+    # mapdirFilenames = os.listdir(mapdir), if you already have it, so scanning a whole dir only lists it once
+    def __init__(self, filepath, mapStates=None, catalogOnly=False, mapdirFilenames=None):
         self.filepath = filepath
         self.mapdir = os.path.dirname(filepath)
         self.filename = os.path.basename(filepath)
         self.nameroot = os.path.splitext(self.filename)[0]
+        self.catalogOnly = catalogOnly
 
-        print(filepath, os.path.getsize(filepath))
+        if not catalogOnly:
+            print(filepath, os.path.getsize(filepath))
 
-        file = open(self.filepath, 'rb')
-        self.allRecords = []
-        while True:
-            #def readStruct(file, struct):
-            #    return struct.from_buffer_copy(file.read(sizeof(struct)))
-            #r = readStruct(file, GNSRecord)
-            # but it could be incomplete right?
-            # file.read(numBytes) will fail gracefully
-            # but I think ctype.from_buffer_copy won't ...
-            sdata = file.read(sizeof(GNSRecord))
-            # TODO when is sdata not long enough?  only in the case of RESOURCE_EOF? always in that case?
-            # TODO must GNS be aligned to something?
-            sdata = sdata + b'\0' * (sizeof(GNSRecord) - len(sdata)) # pad?
-            r = GNSRecord.from_buffer_copy(sdata)
-            if r.resourceFlag == 1 and r.resourceType == GNSRecord.RESOURCE_EOF:
-                break
-            self.allRecords.append(r)
-        file.close()
-
-        self.allRecords.sort(key=lambda a: a.sector)
+        self.allRecords = self.readRecords(filepath)
 
         # now using sorted sectors and file suffixes, map all records to their files
         allSectors = sorted(set(r.sector for r in self.allRecords))
 
         # get all files in the same dir with matching prefix ...
         allResFilenames = []
-        for fn in os.listdir(self.mapdir):
+        if mapdirFilenames == None:
+            mapdirFilenames = os.listdir(self.mapdir)
+        for fn in mapdirFilenames:
             if fn != self.filename and os.path.splitext(fn)[0] == self.nameroot:
                 allResFilenames.append(fn)
 
@@ -1158,13 +1693,43 @@ class GNS(object):
         #for s in self.allMapStates:
         #    print(s)
 
-        # now, here, per resource file, load *everything* you can
+        # the map states we're loading
+        if mapStates == None:
+            self.mapStates = self.allMapStates
+        else:
+            self.mapStates = [state for state in self.allMapStates if state in mapStates]
+
+        self.fileSizes = None
+        if catalogOnly:
+            self.fileSizes = {
+                fn : os.stat(os.path.join(self.mapdir, fn)).st_size
+                for fn in self.filenameForSector.values()
+            }
+            self.allRes = []
+            self.allTexRes = []
+            self.allMeshRes = []
+            return
+
+        # setMapState always uses the init mesh and the first texture, so always load those
+        firstTexRecord = None
+        for r in self.allRecords:
+            if r.resourceType == r.RESOURCE_TEXTURE:
+                firstTexRecord = r
+                break
+        def isNeeded(r):
+            return (r.getMapState() in self.mapStates
+                or r.resourceType == r.RESOURCE_MESH_INIT
+                or r is firstTexRecord)
+
+        # now, here, per resource file, load *everything* you can that these map states use
         # I'm gonna put everything inside blender first and then sort it out per-scene later
 
         self.allRes = []
         self.allTexRes = []
         self.allMeshRes = []
         for (i, r) in enumerate(self.allRecords):
+            if not isNeeded(r):
+                continue
             #print('record', self.filenameForSector[r.sector], str(r), end='')
             res = None
             if r.resourceType == r.RESOURCE_TEXTURE:
@@ -1187,10 +1752,51 @@ class GNS(object):
                 #print('...res w/chunks '+str([i for i, e in enumerate(res.header.v) if e != 0]))
                 self.allMeshRes.append(res)
             else:
-                res = self.UnknownBlob(r, self.filenameForSector[r.sector], self.mapdir, self)
+                res = self.UnknownBlob(r, self.filenameForSector[r.sector], self.mapdir)
             self.allRes.append(res)
             # else keep it anywhere?
-        assert len(self.allRes) == len(self.allRecords)
+
+    # read the GNS records, sorted by sector, without loading any resources
+    @staticmethod
+    def readRecords(filepath):
+        file = open(filepath, 'rb')
+        data = file.read()
+        file.close()
+        # read them all as one array
+        # the EOF record might be truncated after 8 bytes, so pad out to a whole record
+        numRecords = -(-len(data) // sizeof(GNSRecord))
+        data += b'\0' * (numRecords * sizeof(GNSRecord) - len(data))
+        allRecords = (GNSRecord * numRecords).from_buffer_copy(data)
+        records = []
+        for r in allRecords:
+            if r.resourceFlag == 1 and r.resourceType == GNSRecord.RESOURCE_EOF:
+                break
+            records.append(r)
+        records.sort(key=lambda a: a.sector)
+        return records
+
+    # one dict per record, in sector order, of what's in the GNS and its resource files
+    # this doesn't need any resources loaded, so it works with catalogOnly
+    # size is the record's, rounded up to 2k sectors, fileSize is the file's
+    def catalog(self):
+        if self.fileSizes == None:
+            self.fileSizes = {
+                fn : os.stat(os.path.join(self.mapdir, fn)).st_size
+                for fn in self.filenameForSector.values()
+            }
+        return [{
+                'filename' : self.filenameForSector[r.sector],
+                'sector' : r.sector,
+                'resourceType' : r.resourceType,
+                'mapState' : r.getMapState(),
+                'size' : r.size,
+                'fileSize' : self.fileSizes[self.filenameForSector[r.sector]],
+            } for r in self.allRecords]
+
+    # the sorted (arrangement, night, weather) map states of a GNS file, from its records alone
+    @staticmethod
+    def readMapStates(filepath):
+        return sorted(set(r.getMapState() for r in GNS.readRecords(filepath)))
 
     def setMapState(self, mapState):
         """
@@ -1271,5 +1877,17 @@ class GNS(object):
             'tileChunk'
         ]:
             setResField(field)
+
+        # animations are optional, so don't let them carry over from the previous state
+        self.texAnimChunk = None
+        self.palAnimChunk = None
+        self.meshAnimFrameSets = None
+        setResField('texAnimChunk')
+        setResField('palAnimChunk')
+        setResField('meshAnimFrameSets')
+
+        self.tilePolygonIndex = None
+        if getattr(self, 'meshChunk', None) != None and getattr(self, 'tileChunk', None) != None:
+            self.tilePolygonIndex = TilePolygonIndex.fromMesh(self.meshChunk, self.tileChunk.sizeInTiles)
  
 
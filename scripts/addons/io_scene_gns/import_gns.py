@@ -2,54 +2,308 @@
 # https://ffhacktics.com/wiki/Maps/GNS
 
 import math
-import array
+import hashlib
+import numpy as np
 import os
 import os.path
 import sys
 import time
+import collections
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import bpy
+from bpy.app.handlers import persistent
 import mathutils
 from ctypes import *
 from datetime import datetime
 
-from bpy_extras.io_utils import unpack_list
 from bpy_extras.image_utils import load_image
 from bpy_extras.wm_utils.progress_report import ProgressReport
 from bpy_extras import node_shader_utils
 from . import gns
 
+# write a whole fcurve's worth of keyframes at once
+# frames and values are equal length sequences, except when cyclic,
+#  then frames has one more at the end, the frame the cycle starts over on, and it gets keyed with the first value
+#  so the cycle lasts the whole of the last frame, the cycles modifier's period is from the first to the last key
+# 'constant' interpolation because everything animated in FFT steps from frame to frame
+def bakeKeyframes(idBlock, dataPath, frames, values, index=0, cyclic=True):
+    if idBlock.animation_data == None:
+        idBlock.animation_data_create()
+    if idBlock.animation_data.action == None:
+        idBlock.animation_data.action = bpy.data.actions.new(idBlock.name + ' Action')
+    action = idBlock.animation_data.action
+    fcurve = action.fcurves.find(dataPath, index=index)
+    if fcurve == None:
+        fcurve = action.fcurves.new(dataPath, index=index)
+    co = np.empty((len(frames), 2), dtype=np.float32)
+    co[:,0] = frames
+    if cyclic:
+        co[:-1,1] = values
+        co[-1,1] = values[0]
+    else:
+        co[:,1] = values
+    fcurve.keyframe_points.add(len(co))
+    fcurve.keyframe_points.foreach_set('co', co.ravel())
+    fcurve.keyframe_points.foreach_set('interpolation', [0] * len(co))    # 'CONSTANT'
+    if cyclic:
+        fcurve.modifiers.new('CYCLES')
+    fcurve.update()
+    return fcurve
+
+# FFT animation frame lengths are in 30Hz ticks
+# the blender frame that each of numFrames frames starts on
+def framesFrom30Hz(numFrames, frameLenIn30Hz):
+    render = bpy.context.scene.render
+    return 1 + np.arange(numFrames) * (frameLenIn30Hz * render.fps / (30. * render.fps_base))
+
+# GUESS: chunk 0x23 probably holds the real timing of the animated meshes, but I haven't figured it out yet
+# until then every frame of every animated mesh lasts this long, it isn't read from the file
+meshAnimFrameLenIn30Hz = 8
+
+# index of each blender vertex into MeshChunk.positionArray()
+# matches the cw => ccw and tristrip => quad reordering of buildMeshObj
+def blenderVertexOrder(meshChunk):
+    order = []
+    base = 0
+    for (n, perm) in zip(meshChunk.polygonCounts(), ([2,1,0], [2,3,1,0], [2,1,0], [2,3,1,0])):
+        order.append((base + len(perm) * np.arange(n)[:,None] + perm).ravel())
+        base += n * len(perm)
+    return np.concatenate(order)
+
+# weld the loops' int16 positions of shape (numLoops, 3) into shared vertexes
+# returns (vertex positions of shape (numVertexes, 3), vertex index of each loop)
+# faces that would end up with a repeated vertex, or with the same vertexes as an earlier face, keep their own vertexes,
+#  since mesh.validate() would delete them and then they wouldn't export back
+def weldVertexes(loopPos, loopTotal):
+    loopPos = np.asarray(loopPos, dtype=np.int64).reshape(-1, 3)
+    keys = ((loopPos[:,0] + 0x8000) << 32) | ((loopPos[:,1] + 0x8000) << 16) | (loopPos[:,2] + 0x8000)
+    keys, firstLoop, loopVertex = np.unique(keys, return_index=True, return_inverse=True)
+    loopVertex = loopVertex.reshape(-1)
+    vertexPos = loopPos[firstLoop]
+
+    loopTotal = np.asarray(loopTotal, dtype=np.int64)
+    loopStart = np.cumsum(loopTotal) - loopTotal
+    faceVertexes = np.full((len(loopTotal), 4), -1, dtype=np.int64)
+    for n in (3, 4):
+        faces = np.nonzero(loopTotal == n)[0]
+        faceVertexes[faces,:n] = loopVertex[loopStart[faces][:,None] + np.arange(n)]
+    faceVertexes.sort(axis=1)
+    keep = ~np.any((faceVertexes[:,1:] == faceVertexes[:,:-1]) & (faceVertexes[:,1:] >= 0), axis=1)
+    keep[np.setdiff1d(np.arange(len(loopTotal)), np.unique(faceVertexes, axis=0, return_index=True)[1])] = False
+
+    unwelded = np.repeat(~keep, loopTotal)
+    loopVertex[unwelded] = len(vertexPos) + np.arange(np.count_nonzero(unwelded))
+    vertexPos = np.concatenate([vertexPos, loopPos[unwelded]])
+    return vertexPos, loopVertex
+
+# MeshChunk.faceFieldArrays() that get stored as face attributes of the mesh
+# page is left out, it comes from the uvs
+# pal comes from the material too, the attribute is for textured polygons imported without a texture, whose material doesn't have one
+meshFaceAttributes = ['pal', 'unk2_4', 'unk3', 'unk6_2', 'unk7', 'untexUnknown']
+
+# boolean face attributes of the mesh, one per camera angle, set = the face isn't drawn from that angle
+# these are the bits of the VisAngleFlags, see gns.visAngleNames
+visAngleAttributes = ['hidden' + name for name in gns.visAngleNames]
+
+# Tile fields that get stored as face attributes of the tile meshes
+tileFaceAttributes = [
+    'surfaceType',
+    'depth',
+    'cantCursor',
+    'cantWalk',
+    'rotFlags',
+    'thickness',
+    'unk0_6',
+    'unk1',
+    'unk6_2'
+    # TODO visAngles
+    # these are modifyable via the tile mesh vertex heights:
+    #'halfHeight',
+    #'slopeHeight',
+    #'slopeType',
+]
+
+# re-importing a map reuses the datablocks the last import made instead of making copies
+# each datablock made from the files gets a 'gnsHash' custom property, the sha1 of what it was made from
+# hashVersion goes into every hash, bump it when the build code changes so the old datablocks aren't reused
+hashVersion = b'gns 2'
+
+# the kinds of datablocks that get reused, everything else (objects, collections, ...) is made new each import
+reusedIDTypes = ('images', 'materials', 'lights', 'meshes', 'node_groups')
+
+# parts are bytes, strings, or anything with a repr that says what it is
+def contentHash(*parts):
+    h = hashlib.sha1(hashVersion)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        elif not isinstance(part, (bytes, bytearray)):
+            part = repr(part).encode()
+        h.update(len(part).to_bytes(8, 'little'))
+        h.update(part)
+    return h.hexdigest()
+
+# properties that only change how things look in the editors, or are blender's bookkeeping, not what the datablock is
+ignoredProperties = {'name', 'rna_type', 'tag', 'use_fake_user', 'paint_active_slot',
+    'location', 'width', 'height', 'width_hidden', 'dimensions', 'select', 'hide', 'label',
+    'show_options', 'show_preview', 'show_texture', 'use_custom_color', 'color'}
+
+# the values of the editable plain properties of a bpy struct, and the names of the datablocks it points to
+# skipPaths = data paths (from the ID) that are animated, whose values change with the frame
+def rnaState(struct, skipPaths=()):
+    state = []
+    for prop in struct.bl_rna.properties:
+        name = prop.identifier
+        if prop.is_readonly or name in ignoredProperties:
+            continue
+        try:
+            if struct.path_from_id(name) in skipPaths:
+                continue
+        except Exception:
+            pass
+        try:
+            value = getattr(struct, name)
+        except Exception:
+            continue
+        if prop.type in ('BOOLEAN', 'INT', 'FLOAT'):
+            state.append((name, tuple(value) if getattr(prop, 'is_array', False) else value))
+        elif prop.type in ('STRING', 'ENUM'):
+            state.append((name, sorted(value) if isinstance(value, set) else value))
+        elif prop.type == 'POINTER' and isinstance(value, bpy.types.ID):
+            state.append((name, value.name))
+    return state
+
+# nodes, their settings and unlinked input values, and links of a node tree
+def nodeTreeState(tree):
+    skipPaths = set()
+    if tree.animation_data != None and tree.animation_data.action != None:
+        skipPaths = {fcurve.data_path for fcurve in tree.animation_data.action.fcurves}
+    state = []
+    for node in sorted(tree.nodes, key=lambda node: node.name):
+        state.append((node.name, node.bl_idname, rnaState(node, skipPaths)))
+        for socket in node.inputs:
+            if hasattr(socket, 'default_value') and not socket.is_linked and not socket.path_from_id('default_value') in skipPaths:
+                value = socket.default_value
+                state.append((socket.identifier, tuple(value) if hasattr(value, '__len__') and not isinstance(value, str) else value))
+    state.append(sorted(
+        (link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+        for link in tree.links))
+    return state
+
+# hash of what a datablock holds now, to tell if it was edited since it was made
+def blockState(idType, block):
+    if idType == 'images':
+        pixels = np.empty(len(block.pixels), dtype=np.float32)
+        block.pixels.foreach_get(pixels)
+        return contentHash(tuple(block.size), pixels.tobytes())
+    if idType == 'meshes':
+        co = np.empty(3 * len(block.vertices), dtype=np.float32)
+        block.vertices.foreach_get('co', co)
+        loopVertex = np.empty(len(block.loops), dtype=np.int32)
+        block.loops.foreach_get('vertex_index', loopVertex)
+        return contentHash(co.tobytes(), loopVertex.tobytes(), [mat.name if mat != None else None for mat in block.materials])
+    if idType == 'materials':
+        return contentHash(rnaState(block), nodeTreeState(block.node_tree) if block.node_tree != None else None)
+    if idType == 'node_groups':
+        return contentHash(rnaState(block), nodeTreeState(block))
+    return contentHash(rnaState(block))
+
+# the datablocks a material or node group uses, that have to be unedited for it to be reused
+def blockDependencies(idType, block):
+    tree = block.node_tree if idType == 'materials' else block if idType == 'node_groups' else None
+    if tree == None:
+        return []
+    dependencies = []
+    for node in tree.nodes:
+        if getattr(node, 'image', None) != None:
+            dependencies.append(('images', node.image))
+        if getattr(node, 'node_tree', None) != None:
+            dependencies.append(('node_groups', node.node_tree))
+    return dependencies
+
+# the hashed datablocks in the .blend, looked up once per import
+# with reuse=False get() never finds anything, but new datablocks still get tagged, for the next import
+# stamp() at the end of the import saves each new datablock's blockState() in 'gnsState'
+#  the next import only reuses datablocks whose state still matches, so edited ones (like a painted texture) get made again
+class DatablockCache(object):
+    def __init__(self, reuse=True):
+        self.reuse = reuse
+        self.blocksForHash = {}
+        for idType in reusedIDTypes:
+            for block in getattr(bpy.data, idType):
+                hash = block.get('gnsHash')
+                if hash != None:
+                    self.blocksForHash.setdefault((idType, hash), []).append(block)
+        # the datablocks made by this import, they don't have their state yet
+        self.added = {}
+        # whether each datablock checked so far is unedited, by its pointer, names can repeat across libraries
+        self.uneditedForBlock = {}
+
+    def isUnedited(self, idType, block):
+        if block in self.added.values():
+            return True
+        key = block.as_pointer()
+        if not key in self.uneditedForBlock:
+            # set it first, in case of cycles
+            self.uneditedForBlock[key] = True
+            self.uneditedForBlock[key] = (block.get('gnsState') == blockState(idType, block)
+                and all(self.isUnedited(*dependency) for dependency in blockDependencies(idType, block)))
+        return self.uneditedForBlock[key]
+
+    # the unedited datablock made from the same content before, or None
+    def get(self, idType, hash):
+        if not self.reuse:
+            return None
+        block = self.added.get((idType, hash))
+        if block != None:
+            return block
+        for block in self.blocksForHash.get((idType, hash), []):
+            if self.isUnedited(idType, block):
+                return block
+        return None
+
+    # tag a newly made datablock, returns it
+    def add(self, idType, hash, block):
+        block['gnsHash'] = hash
+        self.added[(idType, hash)] = block
+        return block
+
+    # save the state of the datablocks this import made, once they're done
+    def stamp(self):
+        for ((idType, hash), block) in self.added.items():
+            block['gnsState'] = blockState(idType, block)
+
 # overload the gns classes to do blender stuff
+# reading doesn't touch bpy, so it can happen off the main thread
+# the blender datablocks get made afterwards in each class's build()
 
 class BlenderTexBlob(gns.TexBlob):
-    def __init__(self, record, filename, mapdir):
-        super().__init__(record, filename, mapdir)
-
+    def build(self, datablocks):
+        hash = contentHash('tex', self.toBin())
+        self.indexImg = datablocks.get('images', hash)
+        if self.indexImg != None:
+            return
         # here's the indexed texture, though it's not attached to anything
         self.indexImg = bpy.data.images.new(self.filename + ' Tex Indexed', width=self.width, height=self.height)
         self.indexImg.alpha_mode = 'NONE'
         self.indexImg.colorspace_settings.name = 'Raw'
-        self.indexImg.pixels = [
-            ch
-            for colorIndex in self.pixels
-            for ch in (
-                (colorIndex+.5)/16.,
-                (colorIndex+.5)/16.,
-                (colorIndex+.5)/16.,
-                1.
-            )
-        ]
+        # gray = (colorIndex + .5) / 16
+        gray = (self.indexArray().ravel().astype(np.float32) + .5) / 16.
+        rgba = np.ones((len(gray), 4), dtype=np.float32)
+        rgba[:,0] = gray
+        rgba[:,1] = gray
+        rgba[:,2] = gray
+        self.indexImg.pixels.foreach_set(rgba.ravel())
+        datablocks.add('images', hash, self.indexImg)
 
     def writeTexture(self, filepath):
-        pixRGBA = self.indexImg.pixels
-        data = b''
-        for y in range(self.height):
-            for x in range(self.rowsize):
-                data += bytes(TwoNibbles(
-                    int(16. * pixRGBA[0 + 4 * (0 + 2 * (x + self.rowsize * y))]),
-                    int(16. * pixRGBA[0 + 4 * (1 + 2 * (x + self.rowsize * y))])
-                ))
+        # read back from the image so edits in blender get written
+        pixRGBA = np.empty(len(self.indexImg.pixels), dtype=np.float32)
+        self.indexImg.pixels.foreach_get(pixRGBA)
+        pixels = np.clip((16. * pixRGBA[0::4]).astype(np.int32), 0, 15).astype(np.uint8).reshape(-1, 2)
         file = open(filepath, 'wb')
-        file.write(data)
+        file.write((pixels[:,0] | (pixels[:,1] << 4)).tobytes())
         file.close()
 
 class BlenderPalChunk(gns.PalChunk):
@@ -65,17 +319,25 @@ class BlenderPalChunk(gns.PalChunk):
 
     def __init__(self, data, res):
         super().__init__(data, res)
-        self.imgs = [
-            self.palToImg(
-                res.filename + ' ' + self.ident + ' Pal Tex ' + str(i),
-                colors
-            ) for (i, colors) in enumerate(self.pals)]
+        self.filename = res.filename
+
+    def build(self, datablocks):
+        self.imgs = []
+        for (i, colors) in enumerate(self.pals):
+            hash = contentHash(self.ident + ' pal', i, bytes(colors))
+            img = datablocks.get('images', hash)
+            if img == None:
+                img = datablocks.add('images', hash, self.palToImg(
+                    self.filename + ' ' + self.ident + ' Pal Tex ' + str(i),
+                    colors
+                ))
+            self.imgs.append(img)
 
     @staticmethod
     def palImgToBytes(palImg):
         data = b''
         pixRGBA = palImg.pixels
-        for i in range(len(pixRGBA)/4):
+        for i in range(len(pixRGBA)//4):
             data += bytes(RGBA5551.fromRGBA(
                 pixRGBA[0 + 4 * i],
                 pixRGBA[1 + 4 * i],
@@ -88,7 +350,7 @@ class BlenderPalChunk(gns.PalChunk):
         data = b''
         for img in self.imgs:
             data += self.palImgToBytes(img)
-        return data
+        return data + self.footer
 
 class BlenderColorPalChunk(BlenderPalChunk):
     ident = 'Color'
@@ -96,25 +358,167 @@ class BlenderColorPalChunk(BlenderPalChunk):
 class BlenderGrayPalChunk(BlenderPalChunk):
     ident = 'Gray'
 
+class BlenderTexAnimChunk(gns.TexAnimChunk):
+    def __init__(self, data, res):
+        super().__init__(data, res)
+        self.filename = res.filename
+        self.uvNodeGroup = None
+
+    # frame sequence of each animType, as frame indexes
+    # 0x01 = play forward, loop
+    # 0x02 = play forward then reverse, loop
+    # 0x05 = play forward upon UseFieldObject
+    # 0x15 = play reverse upon UseFieldObject
+    @staticmethod
+    def frameSequence(anim):
+        frames = np.arange(anim.numFrames)
+        if anim.animType == 0x02:
+            return np.concatenate((frames, frames[-2:0:-1])), True
+        elif anim.animType == 0x05:
+            return frames, False
+        elif anim.animType == 0x15:
+            return frames[::-1], False
+        return frames, True
+
+    # one node group shared by all the textured materials
+    # it takes the uv, and for each texture animation, if the uv is in the animated rectangle
+    #  then it offsets it to the current frame's rectangle
+    # the offset of each animation is keyframed inside the node group
+    def getUVNodeGroup(self, width, height, datablocks):
+        if self.uvNodeGroup != None:
+            return self.uvNodeGroup
+        hash = contentHash('tex anim uv', width, height, self.toBin())
+        self.uvNodeGroup = datablocks.get('node_groups', hash)
+        if self.uvNodeGroup != None:
+            return self.uvNodeGroup
+        ng = bpy.data.node_groups.new(self.filename + ' Tex Anim UV', 'ShaderNodeTree')
+        ng.inputs.new('NodeSocketVector', 'Vector')
+        ng.outputs.new('NodeSocketVector', 'Vector')
+        nodes = ng.nodes
+        links = ng.links
+        inputNode = nodes.new('NodeGroupInput')
+        inputNode.location = (0, 0)
+        outputNode = nodes.new('NodeGroupOutput')
+
+        uvSocket = inputNode.outputs['Vector']
+        for (j, (slot, anim)) in enumerate(self.texAnims):
+            x, y, w, h = anim.canvasRect()
+            fx, fy, _, _ = anim.firstFrameRect()
+            colX = 200 + 800 * j
+
+            sepNode = nodes.new('ShaderNodeSeparateXYZ')
+            sepNode.location = (colX, -200)
+            links.new(sepNode.inputs['Vector'], uvSocket)
+
+            # inside = (u > u0) * (u < u1) * (v > v0) * (v < v1)
+            inside = None
+            for (k, (axis, op, bound)) in enumerate((
+                ('X', 'GREATER_THAN', x / width),
+                ('X', 'LESS_THAN', (x + w) / width),
+                ('Y', 'GREATER_THAN', y / height),
+                ('Y', 'LESS_THAN', (y + h) / height),
+            )):
+                cmpNode = nodes.new('ShaderNodeMath')
+                cmpNode.operation = op
+                cmpNode.location = (colX + 200, -200 * k)
+                links.new(cmpNode.inputs[0], sepNode.outputs[axis])
+                cmpNode.inputs[1].default_value = bound
+                if inside == None:
+                    inside = cmpNode.outputs[0]
+                else:
+                    mulNode = nodes.new('ShaderNodeMath')
+                    mulNode.operation = 'MULTIPLY'
+                    mulNode.location = (colX + 400, -200 * k)
+                    links.new(mulNode.inputs[0], inside)
+                    links.new(mulNode.inputs[1], cmpNode.outputs[0])
+                    inside = mulNode.outputs[0]
+
+            offsetNode = nodes.new('ShaderNodeCombineXYZ')
+            offsetNode.name = 'Tex Anim ' + str(slot) + ' Offset'
+            offsetNode.location = (colX + 400, 200)
+            offsetNode.inputs['X'].default_value = (fx - x) / width
+
+            scaleNode = nodes.new('ShaderNodeVectorMath')
+            scaleNode.operation = 'SCALE'
+            scaleNode.location = (colX + 600, 200)
+            links.new(scaleNode.inputs[0], offsetNode.outputs['Vector'])
+            links.new(scaleNode.inputs['Scale'], inside)
+
+            addNode = nodes.new('ShaderNodeVectorMath')
+            addNode.operation = 'ADD'
+            addNode.location = (colX + 600, 0)
+            links.new(addNode.inputs[0], uvSocket)
+            links.new(addNode.inputs[1], scaleNode.outputs['Vector'])
+            uvSocket = addNode.outputs['Vector']
+
+            frameSeq, cyclic = self.frameSequence(anim)
+            bakeKeyframes(
+                ng,
+                'nodes["' + offsetNode.name + '"].inputs[1].default_value',
+                framesFrom30Hz(len(frameSeq) + 1 if cyclic else len(frameSeq), anim.frameLenIn30Hz),
+                (fy + frameSeq * h - y) / height,
+                cyclic=cyclic)
+
+        outputNode.location = (200 + 800 * len(self.texAnims), 0)
+        links.new(outputNode.inputs['Vector'], uvSocket)
+        self.uvNodeGroup = datablocks.add('node_groups', hash, ng)
+        return ng
+
+class BlenderPalAnimChunk(gns.PalAnimChunk):
+    def __init__(self, data, res):
+        super().__init__(data, res)
+        self.filename = res.filename
+        # one image per animation strip, built on demand, since the PalAnim's that say which frames to use are in chunk 0x1b
+        self.stripImgs = {}
+
+    # image of width 16 (colors) and height numFrames, one row per frame
+    def stripImgForAnim(self, anim, datablocks):
+        key = (anim.startIndex, anim.numFrames)
+        img = self.stripImgs.get(key)
+        if img != None:
+            return img
+        frames = self.framesForAnim(anim)
+        hash = contentHash('pal anim', key, frames.tobytes())
+        img = datablocks.get('images', hash)
+        if img == None:
+            img = bpy.data.images.new(
+                self.filename + ' Pal Anim ' + str(anim.startIndex) + '+' + str(anim.numFrames),
+                width=16,
+                height=anim.numFrames)
+            img.pixels.foreach_set(frames.ravel())
+            datablocks.add('images', hash, img)
+        self.stripImgs[key] = img
+        return img
+
 class BlenderLightChunk(gns.LightChunk):
     def __init__(self, data, res):
         super().__init__(data, res)
+        self.filename = res.filename
 
-        center = (0,0,0)
-        cornerPos = (0,0,0)
+        self.center = (0,0,0)
+        self.cornerPos = (0,0,0)
         if res.meshChunk != None:
-            cornerPos = res.meshChunk.bbox[0]
-            center = res.meshChunk.center
+            self.cornerPos = res.meshChunk.bbox[0]
+            self.center = res.meshChunk.center
+
+    def build(self, datablocks):
+        filename = self.filename
+        center = self.center
+        cornerPos = self.cornerPos
 
         # directional lights
         # https://stackoverflow.com/questions/17355617/can-you-add-a-light-source-in-blender-using-python
         self.dirLightObjs = []
         for i in range(3):
-            lightName = res.filename + ' Light '+str(i)
-            lightData = bpy.data.lights.new(name=lightName, type='SUN')
-            lightData.energy = 20       # ?
-            lightData.color = self.dirLightColors.ithToTuple(i)
-            lightData.angle = math.pi
+            lightName = filename + ' Light '+str(i)
+            color = self.dirLightColors.ithToTuple(i)
+            hash = contentHash('light', color)
+            lightData = datablocks.get('lights', hash)
+            if lightData == None:
+                lightData = datablocks.add('lights', hash, bpy.data.lights.new(name=lightName, type='SUN'))
+                lightData.energy = 20       # ?
+                lightData.color = color
+                lightData.angle = math.pi
             lightObj = bpy.data.objects.new(name=lightName, object_data=lightData)
             # matrix_world rotate y- to z+ ...
             #lightObj.matrix_world = global_matrix
@@ -147,11 +551,15 @@ class BlenderLightChunk(gns.LightChunk):
 
 
         # ambient light?  in blender?
-        lightName = res.filename+' Ambient'
-        lightData = bpy.data.lights.new(name=lightName, type='SUN')
-        lightData.energy = 20       # ?
-        lightData.color = self.ambientLightColor.toTuple()
-        lightData.angle = math.pi
+        lightName = filename+' Ambient'
+        color = self.ambientLightColor.toTuple()
+        hash = contentHash('light', color)
+        lightData = datablocks.get('lights', hash)
+        if lightData == None:
+            lightData = datablocks.add('lights', hash, bpy.data.lights.new(name=lightName, type='SUN'))
+            lightData.energy = 20       # ?
+            lightData.color = color
+            lightData.angle = math.pi
         lightObj = bpy.data.objects.new(name=lightName, object_data=lightData)
         #lightObj.matrix_world = global_matrix
         lightPos = (
@@ -165,33 +573,36 @@ class BlenderLightChunk(gns.LightChunk):
 
         # setup bg mesh mat
 
-        bgMat = bpy.data.materials.new(res.filename + ' Bg Mat')
-        bgMat.use_backface_culling = True
-        bgMatWrap = node_shader_utils.PrincipledBSDFWrapper(bgMat, is_readonly=False)
-        bgMatWrap.use_nodes = True
-
-        bsdf = bgMat.node_tree.nodes['Principled BSDF']
-        bgMixNode = bgMat.node_tree.nodes.new('ShaderNodeMixRGB')
-        bgMixNode.location = (-200, 0)
-        bgMixNode.inputs[1].default_value[:3] = self.backgroundColors[0].toTuple()
-        bgMixNode.inputs[2].default_value[:3] = self.backgroundColors[1].toTuple()
-        bgMat.node_tree.links.new(bsdf.inputs['Base Color'], bgMixNode.outputs[0])
-
-        bgMapRangeNode = bgMat.node_tree.nodes.new('ShaderNodeMapRange')
-        bgMapRangeNode.location = (-400, 0)
-        bgMapRangeNode.inputs['From Min'].default_value = 20.
-        bgMapRangeNode.inputs['From Max'].default_value = -20.
-        bgMapRangeNode.inputs['To Min'].default_value = 0.
-        bgMapRangeNode.inputs['To Max'].default_value = 1.
-        bgMat.node_tree.links.new(bgMixNode.inputs['Fac'], bgMapRangeNode.outputs[0])
-
-        bgSepNode = bgMat.node_tree.nodes.new('ShaderNodeSeparateXYZ')
-        bgSepNode.location = (-600, 0)
-        bgMat.node_tree.links.new(bgMapRangeNode.inputs['Value'], bgSepNode.outputs['Z'])
-
-        bgGeomNode = bgMat.node_tree.nodes.new('ShaderNodeNewGeometry')
-        bgGeomNode.location = (-800, 0)
-        bgMat.node_tree.links.new(bgSepNode.inputs['Vector'], bgGeomNode.outputs['Position'])
+        bgMatHash = contentHash('bg mat', self.backgroundColors[0].toTuple(), self.backgroundColors[1].toTuple())
+        bgMat = datablocks.get('materials', bgMatHash)
+        if bgMat == None:
+            bgMat = datablocks.add('materials', bgMatHash, bpy.data.materials.new(filename + ' Bg Mat'))
+            bgMat.use_backface_culling = True
+            bgMatWrap = node_shader_utils.PrincipledBSDFWrapper(bgMat, is_readonly=False)
+            bgMatWrap.use_nodes = True
+
+            bsdf = bgMat.node_tree.nodes['Principled BSDF']
+            bgMixNode = bgMat.node_tree.nodes.new('ShaderNodeMixRGB')
+            bgMixNode.location = (-200, 0)
+            bgMixNode.inputs[1].default_value[:3] = self.backgroundColors[0].toTuple()
+            bgMixNode.inputs[2].default_value[:3] = self.backgroundColors[1].toTuple()
+            bgMat.node_tree.links.new(bsdf.inputs['Base Color'], bgMixNode.outputs[0])
+
+            bgMapRangeNode = bgMat.node_tree.nodes.new('ShaderNodeMapRange')
+            bgMapRangeNode.location = (-400, 0)
+            bgMapRangeNode.inputs['From Min'].default_value = 20.
+            bgMapRangeNode.inputs['From Max'].default_value = -20.
+            bgMapRangeNode.inputs['To Min'].default_value = 0.
+            bgMapRangeNode.inputs['To Max'].default_value = 1.
+            bgMat.node_tree.links.new(bgMixNode.inputs['Fac'], bgMapRangeNode.outputs[0])
+
+            bgSepNode = bgMat.node_tree.nodes.new('ShaderNodeSeparateXYZ')
+            bgSepNode.location = (-600, 0)
+            bgMat.node_tree.links.new(bgMapRangeNode.inputs['Value'], bgSepNode.outputs['Z'])
+
+            bgGeomNode = bgMat.node_tree.nodes.new('ShaderNodeNewGeometry')
+            bgGeomNode.location = (-800, 0)
+            bgMat.node_tree.links.new(bgSepNode.inputs['Vector'], bgGeomNode.outputs['Position'])
 
 
         # ... but the most common way of doing a skybox in blender is ...
@@ -204,50 +615,45 @@ class BlenderLightChunk(gns.LightChunk):
         # https://blender.stackexchange.com/questions/39409/how-can-i-make-the-outside-of-a-sphere-transparent
         #  or just make a background sphere ...
         # https://blender.stackexchange.com/questions/93298/create-a-uv-sphere-object-in-blender-from-python
-        bgmesh = bpy.data.meshes.new(res.filename + ' Bg')
-        bgmesh.materials.append(bgMat)
-        bgmeshObj = bpy.data.objects.new(bgmesh.name, bgmesh)
-        bgmeshObj.location = center[0]/28., center[1]/24., center[2]/28.
-        bgmeshObj.scale = 20., 20., 20.
+        bgmeshHash = contentHash('bg sphere', bgMat['gnsHash'])
+        bgmesh = datablocks.get('meshes', bgmeshHash)
+        if bgmesh == None:
+            bgmesh = datablocks.add('meshes', bgmeshHash, bpy.data.meshes.new(filename + ' Bg'))
+            bgmesh.materials.append(bgMat)
 
-        # make the mesh a sphere
-        import bmesh
-        bm = bmesh.new()
-        bmesh.ops.create_uvsphere(bm, u_segments=32, v_segments=16, radius=5)
-        for f in bm.faces:
-            # flip the normals so that, with backface culling, we will always see the sphere around the map and behind the map
-            f.normal_flip()
-            # set smooth shading
-            f.smooth = True
-        bm.normal_update()
+            # make the mesh a sphere
+            import bmesh
+            bm = bmesh.new()
+            bmesh.ops.create_uvsphere(bm, u_segments=32, v_segments=16, radius=5)
+            for f in bm.faces:
+                # flip the normals so that, with backface culling, we will always see the sphere around the map and behind the map
+                f.normal_flip()
+                # set smooth shading
+                f.smooth = True
+            bm.normal_update()
+
+            bm.to_mesh(bgmesh)
+            bm.free()
 
-        bm.to_mesh(bgmeshObj.data)
-        bm.free()
+        bgmeshObj = bpy.data.objects.new(filename + ' Bg', bgmesh)
+        bgmeshObj.location = center[0]/28., center[1]/24., center[2]/28.
+        bgmeshObj.scale = 20., 20., 20.
 
         self.bgmeshObj = bgmeshObj
 
 class BlenderTileChunk(gns.TileChunk):
     def __init__(self, data, res):
         super().__init__(data, res)
+        self.res = res
+
+    def build(self, datablocks):
+        res = self.res
 
         ### create the tiles
 
         def makeObjForTileLayer(y):
-            nonlocal res
-            # vertexes of a [-.5, .5]^2 quad
-            quadVtxs = [
-                [-.5, -.5],
-                [-.5, .5],
-                [.5, .5],
-                [.5, -.5]
-            ]
-            # from GaneshaDx ... seems like there should be some kind of bitfield per modified vertex ...
-            liftPerVertPerSlopeType = [
-                [0x25, 0x58, 0x14, 0x66, 0x69, 0x99],
-                [0x85, 0x58, 0x44, 0x96, 0x69, 0x99],
-                [0x85, 0x52, 0x41, 0x96, 0x66, 0x99],
-                [0x52, 0x25, 0x11, 0x96, 0x66, 0x69],
-            ]
+            quadVtxs = gns.tileCornerOffsets
+            liftPerVertPerSlopeType = gns.liftPerVertPerSlopeType
 
             vtxs = []
             faces = []
@@ -270,22 +676,7 @@ class BlenderTileChunk(gns.TileChunk):
             tileMeshObj = bpy.data.objects.new(mesh.name, mesh)
             tileMeshObj.hide_render = True
 
-            tagNames = [
-                'surfaceType',
-                'depth',
-                'cantCursor',
-                'cantWalk',
-                'rotFlags',
-                'thickness',
-                'unk0_6',
-                'unk1',
-                'unk6_2'
-                # TODO visAngles
-                # these are/will be modifyable via tile mesh:
-                #'halfHeight',
-                #'slopeHeight',
-                #'slopeType',
-            ]
+            tagNames = tileFaceAttributes
 
             # custom per-face attributes for the tiles:
             # doI have to do this once at all, or once per mesh?
@@ -313,6 +704,12 @@ class BlenderTileChunk(gns.TileChunk):
                 bm.to_mesh(tileMeshObj.data)
             bm.free()
 
+            # so the tile faces can be matched up with the mesh faces on them
+            tileMeshObj['gnsTileLayer'] = y
+            tileMeshObj['gnsTileSize'] = list(self.sizeInTiles)
+            # the resource file the tiles came from, for export to write them back to
+            tileMeshObj['gnsResFile'] = res.filename
+
             return tileMeshObj
 
         self.tileMeshObjs = []
@@ -321,42 +718,81 @@ class BlenderTileChunk(gns.TileChunk):
 
 
 class BlenderNonTexBlob(gns.NonTexBlob):
+    # start from the gns classes so the ones without blender overloads (like the animated meshes) still get read
     chunkIOClasses = {
+        **gns.NonTexBlob.chunkIOClasses,
         gns.CHUNK_MESH : gns.MeshChunk,
         gns.CHUNK_COLORPALS : BlenderColorPalChunk,
         gns.CHUNK_LIGHTS : BlenderLightChunk,
         gns.CHUNK_TILES : BlenderTileChunk,
-        gns.CHUNK_TEX_ANIM : gns.TexAnimChunk,
-        #gns.CHUNK_PAL_ANIM : gns.PalAnimChunk,
+        gns.CHUNK_TEX_ANIM : BlenderTexAnimChunk,
+        gns.CHUNK_PAL_ANIM : BlenderPalAnimChunk,
         gns.CHUNK_GRAYPALS : BlenderGrayPalChunk,
         gns.CHUNK_VISANGLES : gns.VisAngleChunk,
     }
 
+    def build(self, datablocks):
+        for io in self.chunkIOs:
+            if io != None and hasattr(io, 'build'):
+                io.build(datablocks)
+
 # this class has become a GNS wrapper + collection of all mapstates
 class BlenderGNS(gns.GNS):
     TexBlob = BlenderTexBlob
     NonTexBlob = BlenderNonTexBlob
+    # this only reads the files, it doesn't touch bpy, so it can run off the main thread
+    # the blender datablocks are made by buildSteps() afterwards
     def __init__(self,
         filepath,
-        progress,
-        context,
-        global_scale_x,
-        global_scale_y,
-        global_scale_z,
-        global_matrix
+        *,
+        relpath=None,
+        global_scale_x=28.0,
+        global_scale_y=24.0,
+        global_scale_z=28.0,
+        global_matrix=None,
+        drop_decoded_textures=True,
+        weld_vertices=False,
+        map_states=None
     ):
-        progress.enter_substeps(1, "Importing GNS %r..." % filepath)
-        self.loadCommon()
-        
-        super().__init__(filepath)
-        
-        if len(self.allMapStates) == 0:
+        self.global_scale_x = global_scale_x
+        self.global_scale_y = global_scale_y
+        self.global_scale_z = global_scale_z
+        self.global_matrix = global_matrix if global_matrix != None else mathutils.Matrix()
+        self.drop_decoded_textures = drop_decoded_textures
+        self.weld_vertices = weld_vertices
+
+        super().__init__(filepath, mapStates=map_states)
+
+        if len(self.mapStates) == 0:
             raise Exception("sorry there's no map states for this map...")
 
-        progress.enter_substeps(3, "Parsing GNS file...")
+    def numBuildSteps(self):
+        return 1 + len(self.allRes) + len(self.mapStates)
+
+    # make all the blender datablocks, one resource or map state at a time
+    # yields a status message after each step, so the caller can report progress, or stop in between
+    # datablocks = the DatablockCache to reuse from, shared by all the maps of one import
+    def buildSteps(self, scene, view_layer, datablocks):
+        self.datablocks = datablocks
+        self.loadCommon()
+        yield "Made common materials"
+
+        for res in self.allRes:
+            if hasattr(res, 'build'):
+                res.build(self.datablocks)
+            yield "Built " + res.filename
+
+        # the images have been made, so we don't need the decoded color indexes anymore
+        if self.drop_decoded_textures:
+            for res in self.allTexRes:
+                res.dropDecoded()
+
+        # one collection for the map, holding a collection per map state
+        self.mapCollection = bpy.data.collections.new(self.nameroot)
+        scene.collection.children.link(self.mapCollection)
 
         self.collections = []
-        for (i, mapState) in enumerate(self.allMapStates):
+        for (i, mapState) in enumerate(self.mapStates):
             self.setMapState(mapState)
             mapConfigIndex, dayNight, weather = mapState
             collectionName = (self.nameroot
@@ -365,13 +801,13 @@ class BlenderGNS(gns.GNS):
                 + ' weather=' + str(weather)
             )
             collection = self.buildCollection(
-                context,
-                progress,
+                scene,
+                view_layer,
                 collectionName,
-                global_scale_x,
-                global_scale_y,
-                global_scale_z,
-                global_matrix)
+                self.global_scale_x,
+                self.global_scale_y,
+                self.global_scale_z,
+                self.global_matrix)
             #if i > 0:
                 # when I set 'hide_viewport' here, un-clicking it in the scene collection panel doesn't reveal it ...
                 #collection.hide_viewport = True
@@ -380,16 +816,18 @@ class BlenderGNS(gns.GNS):
                 # but reading this makes it sound like you can't do this until all collections are settled
                 # https://blenderartists.org/t/show-hide-collection-blender-beta-2-80/1141768
             self.collections.append(collection)
-
-        progress.leave_substeps("Done.")
-        progress.leave_substeps("Finished importing: %r" % filepath)
+            yield "Built " + collectionName
 
     # create blender nodes used by everything
     def loadCommon(self):
         # create the tile material
-        # TODO this can be shared with everything
+        # it's the same for every map, so after the first import it's reused
+        hash = contentHash('tile mat')
+        self.tileMat = self.datablocks.get('materials', hash)
+        if self.tileMat != None:
+            return
 
-        tileMat = bpy.data.materials.new('Tile Mat')
+        tileMat = self.datablocks.add('materials', hash, bpy.data.materials.new('Tile Mat'))
         tileMatWrap = node_shader_utils.PrincipledBSDFWrapper(tileMat, is_readonly=False)
         tileMatWrap.ior = 1
         tileMatWrap.alpha = .5
@@ -437,8 +875,8 @@ class BlenderGNS(gns.GNS):
     # return it and map stores it in .collections
     # minimize the # of blender objects created in this -- try to push as many to the chunk creation as possible (to reduce duplication)
     def buildCollection(self,
-        context,
-        progress,
+        scene,
+        view_layer,
         collectionName,
         global_scale_x,
         global_scale_y,
@@ -447,10 +885,9 @@ class BlenderGNS(gns.GNS):
     ):
         newObjects = []  # put new objects here
 
-        view_layer = context.view_layer
         #collection = view_layer.active_layer_collection.collection
         collection = bpy.data.collections.new(collectionName)
-        bpy.context.scene.collection.children.link(collection)
+        self.mapCollection.children.link(collection)
 
         ### make the material for textured faces
 
@@ -461,23 +898,39 @@ class BlenderGNS(gns.GNS):
             # Write out the indexed image with each 16 palettes applied to it
             # This can only be done once the texture and color-palette NonTexBlob have been read in
             # But once we have the texture, it's pretty much 1:1 with the color-palette
+            # the materials also depend on the texture and palette animations that get applied to them
+            animBytes = b''.join(chunk.toBin() for chunk in (self.texAnimChunk, self.palAnimChunk) if chunk != None)
             matPerPal = [None] * len(self.colorPalChunk.imgs)
+            # the ones that were just made, that still need the animations applied
+            newMatPerPal = [None] * len(self.colorPalChunk.imgs)
             for (i, pal) in enumerate(self.colorPalChunk.imgs):
+                hash = contentHash('mat tex', i, pal['gnsHash'], self.indexImg['gnsHash'], animBytes)
+                mat = self.datablocks.get('materials', hash)
+                if mat != None:
+                    uniqueMaterials[mat.name] = mat
+                    matPerPal[i] = mat
+                    continue
+
                 # get image ...
                 # https://blender.stackexchange.com/questions/643/is-it-possible-to-create-image-data-and-save-to-a-file-from-a-script
-                mat = bpy.data.materials.new(self.nameroot + ' Mat Tex w Pal '+str(i))
+                mat = self.datablocks.add('materials', hash, bpy.data.materials.new(self.nameroot + ' Mat Tex w Pal '+str(i)))
+                # export reads the palette of each face from its material
+                mat['gnsPal'] = i
                 uniqueMaterials[mat.name] = mat
                 matPerPal[i] = mat
+                newMatPerPal[i] = mat
                 matWrap = node_shader_utils.PrincipledBSDFWrapper(mat, is_readonly=False)
                 matWrap.use_nodes = True
 
                 # https://blender.stackexchange.com/questions/157531/blender-2-8-python-add-texture-image
                 palNode = mat.node_tree.nodes.new('ShaderNodeTexImage')
+                palNode.name = 'Pal'
                 palNode.image = pal
                 palNode.interpolation = 'Closest'
                 palNode.location = (-300, 0)
 
                 indexNode = mat.node_tree.nodes.new('ShaderNodeTexImage')
+                indexNode.name = 'Index'
                 indexNode.image = self.indexImg
                 indexNode.interpolation = 'Closest'
                 indexNode.location = (-600, 0)
@@ -500,15 +953,21 @@ class BlenderGNS(gns.GNS):
                 matWrap.specular_tint = 0.
                 matWrap.roughness = 0.
 
+            self.applyTexAnims(newMatPerPal)
+            self.applyPalAnims(newMatPerPal)
 
         ### make the material for untextured faces
 
-        matWOTex = bpy.data.materials.new(self.nameroot + ' Mat Untex')
+        hash = contentHash('mat untex')
+        matWOTex = self.datablocks.get('materials', hash)
+        if matWOTex == None:
+            matWOTex = self.datablocks.add('materials', hash, bpy.data.materials.new(self.nameroot + ' Mat Untex'))
+            matWOTex['gnsPal'] = -1
+            matWOTexWrap = node_shader_utils.PrincipledBSDFWrapper(matWOTex, is_readonly=False)
+            matWOTexWrap.use_nodes = True
+            matWOTexWrap.specular = 0
+            matWOTexWrap.base_color = (0., 0., 0.)
         uniqueMaterials[matWOTex.name] = matWOTex
-        matWOTexWrap = node_shader_utils.PrincipledBSDFWrapper(matWOTex, is_readonly=False)
-        matWOTexWrap.use_nodes = True
-        matWOTexWrap.specular = 0
-        matWOTexWrap.base_color = (0., 0., 0.)
 
 
         ### make the mesh
@@ -520,119 +979,42 @@ class BlenderGNS(gns.GNS):
         for name, index in material_mapping.items():
             materials[index] = uniqueMaterials[name]
 
-        mesh = bpy.data.meshes.new(self.nameroot + ' Mesh')
-        for material in materials:
-            mesh.materials.append(material)
-
-        # flip face order
-        # I guess I could just set the cw vs ccw ...
-        # also handle FFT tristrip => Blender quads
-        def vertexesForPoly(poly):
-            if len(poly.vtxs) == 4:
-                return [poly.vtxs[2], poly.vtxs[3], poly.vtxs[1], poly.vtxs[0]]  # cw => ccw and tristrip -> quad
-            return [poly.vtxs[2], poly.vtxs[1], poly.vtxs[0]]                    # cw front-face => ccw front-face
-
-        # TODO try with this
-        # https://blender.stackexchange.com/q/53709
-        meshVtxPos = []
-        meshVtxNormals = []
-        meshVtxTCs = []
-        tot_loops = 0
-        faces = []  # tuples of the faces
-        vi = 0
-        vti = 0
-        for s in self.polygons():
-            # if we didn't get a texture then we're not applying textures
-            # otherwise only apply to TriTex and QuadTex
-            isTexd = matPerPal != None and s.isTex
-            vs = vertexesForPoly(s)
-            n = len(vs)
-            for v in vs:
-                meshVtxPos.append(v.pos.toTuple())
-
-                if isTexd:
-                    meshVtxTCs.append((
-                        (v.texcoord.x + .5) / self.TexBlob.width,
-                        (256 * s.texFace.page + v.texcoord.y + .5) / self.TexBlob.height
-                    ))
-                    meshVtxNormals.append(v.normal.toTuple())
-                else:
-                    meshVtxTCs.append((0,0))
-                    meshVtxNormals.append((0,0,0))
-
-            face_vert_loc_indices = [vi+j for j in range(n)]
-            face_vert_nor_indices = [vti+j for j in range(n)]
-            face_vert_tex_indices = [vti+j for j in range(n)]
-            faces.append((
-                face_vert_loc_indices,
-                face_vert_nor_indices,
-                face_vert_tex_indices,
-                matPerPal[s.texFace.pal].name if isTexd else matWOTex.name
-            ))
-            tot_loops += n
-
-            vi+=n
-            #if isTexd:
-            vti+=n
-
-
-        mesh.polygons.add(len(faces))
-        mesh.loops.add(tot_loops)
-        mesh.vertices.add(len(meshVtxPos))
-
-        mesh.vertices.foreach_set("co", unpack_list(meshVtxPos))
-
-        faces_loop_start = []
-        lidx = 0
-        for f in faces:
-            face_vert_loc_indices = f[0]
-            nbr_vidx = len(face_vert_loc_indices)
-            faces_loop_start.append(lidx)
-            lidx += nbr_vidx
-        faces_loop_total = tuple(len(face_vert_loc_indices) for (face_vert_loc_indices, _, _, _) in faces)
-
-        loops_vert_idx = tuple(vidx for (face_vert_loc_indices, _, _, _) in faces for vidx in face_vert_loc_indices)
-        mesh.loops.foreach_set("vertex_index", loops_vert_idx)
-        mesh.polygons.foreach_set("loop_start", faces_loop_start)
-        mesh.polygons.foreach_set("loop_total", faces_loop_total)
-
-        faces_ma_index = tuple(material_mapping[context_material] for (_, _, _, context_material) in faces)
-        mesh.polygons.foreach_set("material_index", faces_ma_index)
-
-        mesh.polygons.foreach_set("use_smooth", [False] * len(faces))
-
-        if meshVtxNormals and mesh.loops:
-            mesh.create_normals_split()
-            mesh.loops.foreach_set(
-                "normal",
-                tuple(no for (_, face_vert_nor_indices, _, _) in faces
-                                 for face_noidx in face_vert_nor_indices
-                                 for no in meshVtxNormals[face_noidx])
-            )
-
-        if meshVtxTCs and mesh.polygons:
-            mesh.uv_layers.new(do_init=False)
-            loops_uv = tuple(uv for (_, _, face_vert_tex_indices, _) in faces
-                                for face_uvidx in face_vert_tex_indices
-                                for uv in meshVtxTCs[face_uvidx])
-            mesh.uv_layers[0].data.foreach_set("uv", loops_uv)
-
-        mesh.validate(clean_customdata=False)  # *Very* important to not remove lnors here!
-        mesh.update()
-
-        if meshVtxNormals:
-            clnors = array.array('f', [0.0] * (len(mesh.loops) * 3))
-            mesh.loops.foreach_get("normal", clnors)
-            mesh.polygons.foreach_set("use_smooth", [False] * len(mesh.polygons))
-            mesh.normals_split_custom_set(tuple(zip(*(iter(clnors),) * 3)))
-            # use_auto_smooth = True looks too dark ... thanks to all those zero normals I'm betting?
-            mesh.use_auto_smooth = False
-
-        meshObj = bpy.data.objects.new(mesh.name, mesh)
-        meshObj.matrix_world = global_matrix
-        meshObj.scale = 1./28., 1./24., 1./28.
+        meshObj = self.buildMeshObj(
+            self.nameroot + ' Mesh',
+            self.meshChunk,
+            materials,
+            material_mapping,
+            matPerPal,
+            matWOTex,
+            global_matrix,
+            weld=self.weld_vertices)
         newObjects.append(meshObj)
 
+        # the resource file the mesh came from, for export to write it back to
+        for res in self.nonTexRess:
+            if res.meshChunk is self.meshChunk:
+                meshObj['gnsResFile'] = res.filename
+                break
+
+        # store each face's tile, for selecting between the mesh and the tile meshes
+        if self.tilePolygonIndex != None:
+            attr = meshObj.data.attributes.new('tileIndex', 'INT', 'FACE')
+            attr.data.foreach_set('value', self.tilePolygonIndex.tileForPolygon)
+            meshObj['gnsTileSize'] = list(self.tileChunk.sizeInTiles)
+
+        ### make the animated meshes
+
+        if self.meshAnimFrameSets != None:
+            for frameSet in self.meshAnimFrameSets:
+                newObjects.append(self.buildMeshAnimObj(
+                    self.nameroot + ' Mesh Anim ' + str(frameSet.meshAnimIndexes[0]),
+                    frameSet,
+                    materials,
+                    material_mapping,
+                    matPerPal,
+                    matWOTex,
+                    global_matrix))
+
         if hasattr(self, 'tileChunk'):
             for tileMeshObj in self.tileChunk.tileMeshObjs:
                 tileMeshObj.matrix_world = global_matrix
@@ -674,113 +1056,546 @@ class BlenderGNS(gns.GNS):
 
         return collection
 
+    # make a mesh object out of a MeshChunk's polygons
+    def buildMeshObj(self,
+        name,
+        meshChunk,
+        materials,
+        material_mapping,
+        matPerPal,
+        matWOTex,
+        global_matrix,
+        weld=False
+    ):
+        mesh = bpy.data.meshes.new(name)
+        for material in materials:
+            mesh.materials.append(material)
+
+        # flip face order
+        # I guess I could just set the cw vs ccw ...
+        # also handle FFT tristrip => Blender quads
+        # every array here is per-loop in blenderVertexOrder(), or per-face in polygons() order
+        order = blenderVertexOrder(meshChunk)
+        counts = meshChunk.polygonCounts()
+        numTex = counts[0] + counts[1]
+        faceFields = meshChunk.faceFieldArrays()
+
+        faces_loop_total = np.repeat(np.array([3, 4, 3, 4], dtype=np.int32), counts)
+        faces_loop_start = (np.cumsum(faces_loop_total) - faces_loop_total).astype(np.int32)
+        numLoops = int(faces_loop_total.sum())
+
+        # TriTex and QuadTex have normals and uvs
+        # if we didn't get a texture then we're not applying textures, but they still keep theirs for export
+        faceIsTex = np.arange(len(faces_loop_total)) < numTex
+        faceIsTexd = faceIsTex & (matPerPal != None)
+        loopIsTex = np.repeat(faceIsTex, faces_loop_total)
+
+        meshVtxPos = meshChunk.positionArray()[order]
+        loops_vert_idx = np.arange(numLoops, dtype=np.int32)
+
+        # share the vertexes of identical positions, the normals and uvs stay per-loop
+        if weld:
+            meshVtxPos, loops_vert_idx = weldVertexes(meshVtxPos, faces_loop_total)
+            loops_vert_idx = loops_vert_idx.astype(np.int32)
+
+        # normalArray() is 0 for the untextured polygons
+        loopNormals4096 = meshChunk.normalArray()[order].astype(np.float32)
+        loopNormals = loopNormals4096 / 4096.
+
+        texcoord = meshChunk.texCoordArray()[order].astype(np.float32)
+        loopPage = np.repeat(faceFields['page'], faces_loop_total)
+        loopUVs = np.where(
+            loopIsTex[:,None],
+            np.stack([
+                (texcoord[:,0] + .5) / self.TexBlob.width,
+                (256 * loopPage + texcoord[:,1] + .5) / self.TexBlob.height,
+            ], axis=-1),
+            0.
+        ).astype(np.float32)
+
+        matWOTexIndex = material_mapping[matWOTex.name]
+        faces_ma_index = np.full(len(faces_loop_total), matWOTexIndex, dtype=np.int32)
+        if matPerPal != None:
+            matIndexForPal = np.array([material_mapping[mat.name] for mat in matPerPal], dtype=np.int32)
+            faces_ma_index[faceIsTexd] = matIndexForPal[faceFields['pal'][faceIsTexd]]
+
+        mesh.polygons.add(len(faces_loop_total))
+        mesh.loops.add(numLoops)
+        mesh.vertices.add(len(meshVtxPos))
+
+        mesh.vertices.foreach_set("co", np.asarray(meshVtxPos, dtype=np.float32).ravel())
+        mesh.loops.foreach_set("vertex_index", loops_vert_idx)
+        mesh.polygons.foreach_set("loop_start", faces_loop_start)
+        mesh.polygons.foreach_set("loop_total", faces_loop_total)
+        mesh.polygons.foreach_set("material_index", faces_ma_index)
+        mesh.polygons.foreach_set("use_smooth", np.zeros(len(faces_loop_total), dtype=bool))
+
+        if numLoops > 0:
+            mesh.uv_layers.new(do_init=False)
+            mesh.uv_layers[0].data.foreach_set("uv", loopUVs.ravel())
+
+        mesh.validate(clean_customdata=False)  # *Very* important to not remove lnors here!
+        mesh.update()
+
+        # validate() keeps every loop (welding made sure of that), so the normals still line up with them
+        if numLoops > 0:
+            mesh.normals_split_custom_set(loopNormals)
+            # use_auto_smooth = True looks too dark ... thanks to all those zero normals I'm betting?
+            mesh.use_auto_smooth = False
+
+        # blender's custom normals don't come back out exactly, and not at all for the zero ones, so keep the FFT ones for export
+        if numLoops > 0:
+            mesh.attributes.new('fftNormal', 'FLOAT_VECTOR', 'CORNER').data.foreach_set('vector', loopNormals4096.ravel())
+
+        # keep the polygon fields that aren't geometry, so export can write them back
+        for (name, values) in faceFields.items():
+            if name in meshFaceAttributes:
+                mesh.attributes.new(name, 'INT', 'FACE').data.foreach_set('value', values)
+        # whether each polygon is textured, export goes by this and not the material
+        mesh.attributes.new('textured', 'BOOLEAN', 'FACE').data.foreach_set('value', faceIsTex)
+        # the TilePos bytes as x | (y and z) << 8, -1 for untextured
+        # export only uses these for faces whose tileIndex is -1, like the ones whose TilePos is outside the map
+        tilePos = np.full(len(faces_loop_total), -1, dtype=np.int32)
+        tilePosBytes = meshChunk.tilePosArray().astype(np.int32)
+        tilePos[:numTex] = tilePosBytes[:,0] | (tilePosBytes[:,1] << 8)
+        mesh.attributes.new('tilePos', 'INT', 'FACE').data.foreach_set('value', tilePos)
+        visAngles = meshChunk.visAngleArray()
+        if visAngles is not None:
+            bits = gns.visAngleBits(visAngles)
+            for (i, attrName) in enumerate(visAngleAttributes):
+                mesh.attributes.new(attrName, 'BOOLEAN', 'FACE').data.foreach_set('value', bits[:,i])
+
+        meshObj = bpy.data.objects.new(mesh.name, mesh)
+        meshObj.matrix_world = global_matrix
+        meshObj.scale = 1./28., 1./24., 1./28.
+        return meshObj
+
+    # make a mesh object out of the first frame of a set of animated meshes
+    # and a shape key per frame, keyframed to step thru them
+    def buildMeshAnimObj(self,
+        name,
+        frameSet,
+        materials,
+        material_mapping,
+        matPerPal,
+        matWOTex,
+        global_matrix
+    ):
+        meshObj = self.buildMeshObj(
+            name,
+            frameSet.meshChunk,
+            materials,
+            material_mapping,
+            matPerPal,
+            matWOTex,
+            global_matrix)
+
+        numFrames = len(frameSet.meshAnimIndexes)
+        if numFrames < 2:
+            return meshObj
+
+        # buildMeshObj makes one vertex per polygon corner, reordered
+        order = blenderVertexOrder(frameSet.meshChunk)
+        basePositions = frameSet.basePositions[order].astype(np.float32)
+
+        meshObj.shape_key_add(name='Basis', from_mix=False)
+        keys = []
+        for (f, i) in enumerate(frameSet.meshAnimIndexes):
+            key = meshObj.shape_key_add(name='Mesh Anim ' + str(i), from_mix=False)
+            key.data.foreach_set('co', (basePositions + frameSet.offsets[f][order]).ravel())
+            keys.append(key)
+
+        frames = framesFrom30Hz(numFrames + 1, meshAnimFrameLenIn30Hz)
+        for (f, key) in enumerate(keys):
+            bakeKeyframes(
+                meshObj.data.shape_keys,
+                'key_blocks["' + key.name + '"].value',
+                frames,
+                (np.arange(numFrames) == f).astype(np.float32))
+        return meshObj
+
+    # run the uv's of every textured material through the texture animation uv offset node group
+    # materials that are None are skipped
+    def applyTexAnims(self, matPerPal):
+        if self.texAnimChunk == None or len(self.texAnimChunk.texAnims) == 0:
+            return
+        ng = self.texAnimChunk.getUVNodeGroup(self.TexBlob.width, self.TexBlob.height, self.datablocks)
+        for mat in matPerPal:
+            if mat == None:
+                continue
+            nodes = mat.node_tree.nodes
+            links = mat.node_tree.links
+
+            uvNode = nodes.new('ShaderNodeUVMap')
+            uvNode.location = (-1000, 0)
+
+            groupNode = nodes.new('ShaderNodeGroup')
+            groupNode.node_tree = ng
+            groupNode.location = (-800, 0)
+            links.new(groupNode.inputs['Vector'], uvNode.outputs['UV'])
+            links.new(nodes['Index'].inputs['Vector'], groupNode.outputs['Vector'])
+
+    # swap the palette image of each animated palette's material with its animation strip
+    # and keyframe which row of the strip to look up
+    # materials that are None are skipped
+    def applyPalAnims(self, matPerPal):
+        if self.texAnimChunk == None or self.palAnimChunk == None:
+            return
+        for (slot, anim) in self.texAnimChunk.palAnims:
+            mat = matPerPal[anim.pal]
+            if mat == None:
+                continue
+            nodes = mat.node_tree.nodes
+            links = mat.node_tree.links
+            palNode = nodes['Pal']
+            indexNode = nodes['Index']
+            palNode.image = self.palAnimChunk.stripImgForAnim(anim, self.datablocks)
+
+            # palette lookup: x = color index, y = animation frame row
+            sepNode = nodes.new('ShaderNodeSeparateXYZ')
+            sepNode.location = (-450, -200)
+            links.new(sepNode.inputs['Vector'], indexNode.outputs['Color'])
+
+            frameNode = nodes.new('ShaderNodeValue')
+            frameNode.name = 'Pal Anim Frame'
+            frameNode.location = (-600, -300)
+
+            combineNode = nodes.new('ShaderNodeCombineXYZ')
+            combineNode.location = (-450, -400)
+            links.new(combineNode.inputs['X'], sepNode.outputs['X'])
+            links.new(combineNode.inputs['Y'], frameNode.outputs[0])
+            links.new(palNode.inputs['Vector'], combineNode.outputs['Vector'])
+
+            bakeKeyframes(
+                mat.node_tree,
+                'nodes["' + frameNode.name + '"].outputs[0].default_value',
+                framesFrom30Hz(anim.numFrames + 1, anim.frameLenIn30Hz),
+                (np.arange(anim.numFrames) + .5) / anim.numFrames)
+
     def polygons(self):
-        return (self.meshChunk.triTexs
-            + self.meshChunk.quadTexs
-            + self.meshChunk.triUntexs
-            + self.meshChunk.quadUntexs)
+        return self.meshChunk.polygons()
 
 ################################ import_gns ################################
 
+# things to do before building, on the main thread
+def beginLoad(context):
+    # deselect all
+    if bpy.ops.object.select_all.poll():
+        bpy.ops.object.select_all(action='DESELECT')
+
+    # set world color
+    world = bpy.data.worlds['World']
+    background = world.node_tree.nodes['Background']
+    background.inputs[0].default_value = (1, 1, 1, 1)
+    background.inputs[1].default_value = 1
+
+# things to do after building, on the main thread
+# show the first map state of each map and hide the rest
+# this sets the eye icon of each map state's layer collection, all at once, instead of one hide_collection operator per collection
+def finishLoad(context, maps):
+    layerForCollection = {}
+    def walk(layerCollection):
+        layerForCollection[layerCollection.collection] = layerCollection
+        for child in layerCollection.children:
+            walk(child)
+    walk(context.view_layer.layer_collection)
+
+    for m in maps:
+        for (i, collection) in enumerate(m.collections):
+            layerCollection = layerForCollection.get(collection)
+            if layerCollection != None:
+                layerCollection.hide_viewport = i > 0
+
+# the .GNS files of a directory, for importing all of them
+def listMaps(dirpath):
+    return [os.path.join(dirpath, fn)
+        for fn in sorted(os.listdir(dirpath))
+        if os.path.splitext(fn)[1].upper() == '.GNS']
+
+# reads maps in worker threads, a few ahead of the one being built
+# reading is mostly file io and numpy, so it overlaps with building on the main thread
+# map_states = {filepath: list of map states to read}, maps not in it get all their map states
+# the rest of the keywords go to BlenderGNS
+class MapReader(object):
+    def __init__(self, filepaths, map_states=None, numThreads=2, **keywords):
+        self.filepaths = list(filepaths)
+        self.mapStatesForPath = map_states or {}
+        self.keywords = keywords
+        self.pool = ThreadPoolExecutor(numThreads)
+        self.pending = collections.deque()
+        self.numSubmitted = 0
+        for i in range(numThreads + 1):
+            self.submitNext()
+
+    def submitNext(self):
+        if self.numSubmitted == len(self.filepaths):
+            return
+        filepath = self.filepaths[self.numSubmitted]
+        self.pending.append((filepath, self.pool.submit(
+            BlenderGNS,
+            filepath,
+            map_states=self.mapStatesForPath.get(filepath),
+            **self.keywords)))
+        self.numSubmitted += 1
+
+    # whether every map has been handed out by next()
+    def finished(self):
+        return len(self.pending) == 0
+
+    # whether next() would return without waiting
+    def ready(self):
+        return len(self.pending) > 0 and self.pending[0][1].done()
+
+    # the next map in order, waiting for it to be read if it isn't yet
+    # returns (filepath, BlenderGNS or None, exception or None)
+    def next(self):
+        filepath, future = self.pending.popleft()
+        self.submitNext()
+        try:
+            return (filepath, future.result(), None)
+        except Exception as e:
+            return (filepath, None, e)
+
+    # stop reading, whatever is being read gets thrown away
+    def close(self):
+        self.pending.clear()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# filepaths = the .GNS files to import, each gets its own collection
+# when importing more than one, maps that fail to read are skipped with a message
 def load(context,
-         filepath,
+         filepaths,
          *,
          relpath=None,
          global_scale_x=28.0,
          global_scale_y=24.0,
          global_scale_z=28.0,
          global_matrix=None,
+         drop_decoded_textures=True,
+         weld_vertices=False,
+         reuse_datablocks=True,
+         map_states=None,
          ):
-    with ProgressReport(context.window_manager) as progress:
-
-        if global_matrix is None:
-            global_matrix = mathutils.Matrix()
+    reader = MapReader(
+        filepaths,
+        map_states=map_states,
+        relpath=relpath,
+        global_scale_x=global_scale_x,
+        global_scale_y=global_scale_y,
+        global_scale_z=global_scale_z,
+        global_matrix=global_matrix,
+        drop_decoded_textures=drop_decoded_textures,
+        weld_vertices=weld_vertices)
+    try:
+        with ProgressReport(context.window_manager) as progress:
+            progress.enter_substeps(len(filepaths), "Importing %d GNS..." % len(filepaths))
+
+            beginLoad(context)
+            datablocks = DatablockCache(reuse_datablocks)
+
+            maps = []
+            while not reader.finished():
+                filepath, m, error = reader.next()
+                if error != None:
+                    if len(filepaths) == 1:
+                        raise error
+                    print("failed to read", filepath, error)
+                    progress.step("Failed to read %r" % filepath)
+                    continue
+
+                progress.enter_substeps(m.numBuildSteps(), "Building %r..." % filepath)
+                for status in m.buildSteps(context.scene, context.view_layer, datablocks):
+                    progress.step(status)
+                progress.leave_substeps("Finished importing: %r" % filepath)
+                maps.append(m)
+
+            datablocks.stamp()
+            finishLoad(context, maps)
+
+            progress.leave_substeps("Done.")
+    finally:
+        reader.close()
 
-        # deselect all
-        if bpy.ops.object.select_all.poll():
-            bpy.ops.object.select_all(action='DESELECT')
+    return {'FINISHED'}
 
-        # hack for testing
-        if False:
-            mapdir = os.path.dirname(filepath)
-            for i in range(126):
-                fn = os.path.join(mapdir, f'MAP{i:03d}.GNS')
-                print('Loading', fn)
+# every kind of datablock an import makes, for rolling back a cancelled import
+importedIDTypes = (
+    'collections',
+    'objects',
+    'meshes',
+    'lights',
+    'materials',
+    'images',
+    'node_groups',
+    'actions',
+)
+
+# custom property on each datablock a BackgroundLoad makes, set to its jobID until it finishes
+# rollback finds them by it, python references to datablocks don't survive an undo
+jobIDProperty = 'gnsImportJob'
+
+def allImportedIDs():
+    return {id for name in importedIDTypes for id in getattr(bpy.data, name)}
+
+# the BackgroundLoads that are running
+# undo, redo and file loads swap out bpy.data underneath them, so they stop them
+runningLoads = []
+
+@persistent
+def onUndoRedo(*args):
+    for job in list(runningLoads):
+        job.abort("undo or redo during the import", rollback=True)
+
+# the datablocks of the old file are gone, and the new file's aren't ours to remove
+@persistent
+def onLoadPost(*args):
+    for job in list(runningLoads):
+        job.abort("another file was loaded during the import", rollback=False)
+
+# an import that doesn't freeze blender
+# the files are read in worker threads, then the datablocks are built a slice at a time in a bpy.app.timers callback
+# the modal ImportGNS operator polls status / done / error, calls finish() when done, and cancel() on Esc
+# blender keeps working meanwhile, so only the datablocks made during a slice are taken as the import's
+class BackgroundLoad(object):
+    # seconds of building per timer callback
+    sliceTime = .05
+
+    # keywords are the same as load()'s
+    def __init__(self, context, filepaths, *, reuse_datablocks=True, **keywords):
+        self.filepaths = filepaths
+        self.scene = context.scene
+        self.view_layer = context.view_layer
+        self.jobID = uuid.uuid4().hex
+
+        self.maps = []
+        self.filepath = None
+        self.steps = None
+        self.stepIndex = 0
+        self.numSteps = None
+        self.status = "Reading files..."
+        self.error = None
+        self.done = False
+        self.cancelled = False
+
+        beginLoad(context)
+        self.datablocks = DatablockCache(reuse_datablocks)
+
+        self.reader = MapReader(filepaths, **keywords)
+        bpy.app.timers.register(self.tick, first_interval=.1)
+        if len(runningLoads) == 0:
+            bpy.app.handlers.undo_post.append(onUndoRedo)
+            bpy.app.handlers.redo_post.append(onUndoRedo)
+            bpy.app.handlers.load_post.append(onLoadPost)
+        runningLoads.append(self)
+
+    # main thread, returns seconds until the next call, or None to stop
+    def tick(self):
+        if self.cancelled:
+            return None
+        # anything made since the last slice was made by someone else
+        idsBefore = allImportedIDs()
+        nextCall = self.buildSlice()
+        for id in allImportedIDs() - idsBefore:
+            id[jobIDProperty] = self.jobID
+        if self.error != None:
+            self.rollback()
+        return nextCall
+
+    # build for up to sliceTime seconds, returns seconds until the next tick, or None to stop
+    def buildSlice(self):
+        try:
+            endTime = time.perf_counter() + self.sliceTime
+            while time.perf_counter() < endTime:
+                if self.steps == None:
+                    if self.reader.finished():
+                        self.done = True
+                        return None
+                    if not self.reader.ready():
+                        self.status = "Reading files..."
+                        return .1
+                    self.filepath, m, error = self.reader.next()
+                    if error != None:
+                        if len(self.filepaths) == 1:
+                            raise error
+                        print("failed to read", self.filepath, error)
+                        continue
+                    self.maps.append(m)
+                    self.steps = m.buildSteps(self.scene, self.view_layer, self.datablocks)
+                    self.stepIndex = 0
+                    self.numSteps = m.numBuildSteps()
                 try:
-                    gns.GNS(fn)
-                except Exception as e:
-                    print("failed with error", e)
-            print("DONE")
-            raise Exception("done")
-
-        # set world color
-        world = bpy.data.worlds['World']
-        background = world.node_tree.nodes['Background']
-        background.inputs[0].default_value = (1, 1, 1, 1)
-        background.inputs[1].default_value = 1
-
-        # load gns file
-        m = BlenderGNS(
-            filepath,
-            progress,
-            context,
-            global_scale_x,
-            global_scale_y,
-            global_scale_z,
-            global_matrix)
-
-
-        # why is everything in blender api so ridiculously difficult to do...
-        # https://blenderartists.org/t/show-hide-collection-blender-beta-2-80/1141768
-        def get_viewport_ordered_collections(context):
-            def fn(c, out, addme):
-                if addme:
-                    out.append(c)
-                for c1 in c.children:
-                    out.append(c1)
-                for c1 in c.children:
-                    fn(c1, out, False)
-            collections = []
-            fn(context.scene.collection, collections, True)
-            return collections
-
-        def get_area_from_context(context, area_type):
-            area = None
-            for a in context.screen.areas:
-                if a.type == area_type:
-                    area = a
-                    break
-            return area
-
-        def set_collection_viewport_visibility(context, targetCollection, visibility=True):
-            collections = get_viewport_ordered_collections(context)
-            collection = None
-            index = 0
-            for c in collections:
-                if c == targetCollection:
-                    collection = c
-                    break
-                index += 1
-            if collection is None:
-                return
-            first_object = None
-            if len(collection.objects) > 0:
-                first_object = collection.objects[0]
-            try:
-                bpy.ops.object.hide_collection(context, collection_index=index, toggle=True)
-                if first_object.visible_get() != visibility:
-                    bpy.ops.object.hide_collection(context, collection_index=index, toggle=True)
-            except:
-                context_override = context.copy()
-                context_override['area'] = get_area_from_context(context, 'VIEW_3D')
-                bpy.ops.object.hide_collection(context_override, collection_index=index, toggle=True)
-                if first_object.visible_get() != visibility:
-                    bpy.ops.object.hide_collection(context_override, collection_index=index, toggle=True)
-
-        for i in range(1,len(m.collections)):
-            set_collection_viewport_visibility(context, m.collections[i], visibility=False)
-        set_collection_viewport_visibility(context, m.collections[0], visibility=True)
-
-        # ... and those 50 lines of code are what is needed to just hide an object in the viewport
-
-    return {'FINISHED'}
+                    self.status = next(self.steps)
+                    self.stepIndex += 1
+                except StopIteration:
+                    self.steps = None
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self.error = e
+            self.reader.close()
+            self.stop()
+            return None
+        return .01
+
+    def statusText(self):
+        text = "Importing "
+        if self.filepath != None:
+            text += os.path.basename(self.filepath) + " "
+        if len(self.filepaths) > 1:
+            text += "(map " + str(len(self.maps)) + "/" + str(len(self.filepaths)) + ") "
+        text += ": "
+        if self.steps != None:
+            text += str(self.stepIndex) + "/" + str(self.numSteps) + " "
+        return text + self.status + "  (Esc to cancel)"
+
+    def finish(self, context):
+        self.reader.close()
+        self.stop()
+        for id in self.madeIDs():
+            del id[jobIDProperty]
+        self.datablocks.stamp()
+        finishLoad(context, self.maps)
+
+    # stop building, and remove everything made so far
+    # whatever the worker threads are still reading is thrown away
+    def cancel(self):
+        self.cancelled = True
+        if bpy.app.timers.is_registered(self.tick):
+            bpy.app.timers.unregister(self.tick)
+        if self.steps != None:
+            self.steps.close()
+        self.reader.close()
+        self.stop()
+        self.rollback()
+
+    # stop building because bpy.data changed underneath us, the modal operator reports it as an error
+    # the build steps and the datablock cache refer to datablocks that might not exist anymore, so they're dropped unused
+    def abort(self, reason, rollback):
+        self.cancelled = True
+        if bpy.app.timers.is_registered(self.tick):
+            bpy.app.timers.unregister(self.tick)
+        self.steps = None
+        self.datablocks = None
+        self.reader.close()
+        self.error = RuntimeError(reason)
+        self.stop()
+        if rollback:
+            self.rollback()
+
+    # no longer listen for undo, redo and file loads
+    def stop(self):
+        if self not in runningLoads:
+            return
+        runningLoads.remove(self)
+        if len(runningLoads) == 0:
+            bpy.app.handlers.undo_post.remove(onUndoRedo)
+            bpy.app.handlers.redo_post.remove(onUndoRedo)
+            bpy.app.handlers.load_post.remove(onLoadPost)
+
+    # the datablocks this import made that are still around
+    def madeIDs(self):
+        return [id for name in importedIDTypes for id in getattr(bpy.data, name)
+            if id.get(jobIDProperty) == self.jobID]
+
+    def rollback(self):
+        bpy.data.batch_remove(self.madeIDs())
@@ -0,0 +1,107 @@
+# picking faces of the imported tile meshes and mesh with the mouse, to edit their custom face attributes
+# each object gets a BVHTree of its mesh in local space, built on first pick and reused until its geometry changes
+
+import bpy
+import numpy as np
+from bpy.app.handlers import persistent
+from bpy_extras import view3d_utils
+from mathutils.bvhtree import BVHTree
+from . import select_gns
+from .import_gns import meshFaceAttributes, tileFaceAttributes
+
+# BVHTree per mesh name
+bvhCache = {}
+
+def getBVH(mesh):
+    bvh = bvhCache.get(mesh.name_full)
+    if bvh != None:
+        return bvh
+    co = np.empty(3 * len(mesh.vertices), dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    loopStart = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loopStart)
+    loopVertex = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVertex)
+    polygons = [p.tolist() for p in np.split(loopVertex, loopStart[1:])]
+    # FromPolygons triangulates internally but reports hits by polygon index
+    bvh = BVHTree.FromPolygons(co.reshape(-1, 3).tolist(), polygons)
+    bvhCache[mesh.name_full] = bvh
+    return bvh
+
+# drop the trees of anything whose geometry changed
+@persistent
+def onDepsgraphUpdate(scene, depsgraph):
+    if len(bvhCache) == 0:
+        return
+    for update in depsgraph.updates:
+        if not update.is_updated_geometry:
+            continue
+        data = update.id.original
+        if isinstance(data, bpy.types.Object):
+            data = data.data
+        if isinstance(data, bpy.types.Mesh):
+            bvhCache.pop(data.name_full, None)
+
+# undo and file loads swap out the meshes without a geometry update
+@persistent
+def onReset(*args):
+    bvhCache.clear()
+
+def register():
+    bpy.app.handlers.depsgraph_update_post.append(onDepsgraphUpdate)
+    bpy.app.handlers.undo_post.append(onReset)
+    bpy.app.handlers.redo_post.append(onReset)
+    bpy.app.handlers.load_post.append(onReset)
+
+def unregister():
+    bpy.app.handlers.depsgraph_update_post.remove(onDepsgraphUpdate)
+    bpy.app.handlers.undo_post.remove(onReset)
+    bpy.app.handlers.redo_post.remove(onReset)
+    bpy.app.handlers.load_post.remove(onReset)
+    bvhCache.clear()
+
+def isPickable(obj):
+    return select_gns.isTileObj(obj) or select_gns.isMeshObj(obj)
+
+# returns (obj, faceIndex) of the nearest pickable face under the mouse, or None
+# mouseCoord is relative to the 3D view's window region
+def pickFace(context, region, rv3d, mouseCoord):
+    origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, mouseCoord)
+    direction = view3d_utils.region_2d_to_vector_3d(region, rv3d, mouseCoord)
+
+    best = None
+    bestDist = None
+    for obj in context.visible_objects:
+        if not isPickable(obj):
+            continue
+        # cast in local space so moving the object doesn't invalidate its tree
+        toLocal = obj.matrix_world.inverted()
+        localOrigin = toLocal @ origin
+        localDir = (toLocal.to_3x3() @ direction).normalized()
+        loc, normal, faceIndex, dist = getBVH(obj.data).ray_cast(localOrigin, localDir)
+        if loc == None:
+            continue
+        dist = (obj.matrix_world @ loc - origin).length
+        if bestDist == None or dist < bestDist:
+            best = (obj, faceIndex)
+            bestDist = dist
+    return best
+
+# the INT and BOOLEAN face attributes shown in the header
+# that includes the ones import writes for export and the other tools, like tileIndex, tilePos, textured and hidden<angle>
+def shownAttributes(mesh):
+    return [attr for attr in mesh.attributes
+        if attr.domain == 'FACE'
+        and attr.data_type in {'INT', 'BOOLEAN'}
+        and not attr.name.startswith('.')]
+
+# the ones we let you edit, only the fields of the Tiles and mesh polygons, the rest are only shown
+editableAttributeNames = set(meshFaceAttributes + tileFaceAttributes)
+
+def editableAttributes(mesh):
+    return [attr for attr in shownAttributes(mesh) if attr.name in editableAttributeNames]
+
+def faceSummary(obj, faceIndex):
+    return obj.name + ' face ' + str(faceIndex) + ': ' + ' '.join(
+        attr.name + '=' + str(int(attr.data[faceIndex].value))
+        for attr in shownAttributes(obj.data))
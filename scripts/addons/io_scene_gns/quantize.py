@@ -0,0 +1,170 @@
+# quantize RGBA artwork into the 4bpp color indexes + 16 palettes of 16 RGBA5551 colors that TexBlob and PalChunk store
+# the pixels are split into regions (UV islands, or blocks of the page) and each region gets one palette for all its pixels
+# regions are grouped into palettes by k-means on their average colors, each palette's colors are found by weighted k-means,
+#  then each region moves to the palette that fits it best, and that repeats a few times
+# it all works on the distinct (region, RGBA5551 color) pairs weighted by their pixel counts, never on the pixels themselves
+# color 0 of every palette is left transparent, like the game does
+
+import numpy as np
+
+numPalettes = 16
+numColors = 16
+
+# float RGBA in [0,1] of shape (..., 4) => uint16 RGBA5551 values of shape (...)
+# alpha < .5 is transparent, which is 0
+def toRGBA5551(rgba):
+    rgba = np.asarray(rgba, dtype=np.float32)
+    rgb = np.clip(np.rint(rgba[...,:3] * 31.), 0, 31).astype(np.uint16)
+    values = rgb[...,0] | (rgb[...,1] << 5) | (rgb[...,2] << 10) | np.uint16(0x8000)
+    return np.where(rgba[...,3] < .5, np.uint16(0), values).astype(np.uint16)
+
+# uint16 RGBA5551 values => float32 array of shape (..., 3) of the 5-bit channels, in [0,31]
+def rgbOfRGBA5551(values):
+    values = np.asarray(values, dtype=np.int32)
+    return np.stack([values & 0x1f, (values >> 5) & 0x1f, (values >> 10) & 0x1f], axis=-1).astype(np.float32)
+
+# int32 array of shape (height, width) of the block each pixel is in, for when there's no UV islands to go by
+def blockRegions(height, width, blockSize=32):
+    y, x = np.mgrid[0:height, 0:width]
+    return ((y // blockSize) * -(-width // blockSize) + x // blockSize).astype(np.int32)
+
+# squared distance from each point to each center, shape (len(points), len(centers))
+def squaredDistances(points, centers):
+    d = (np.square(points).sum(axis=1)[:,None]
+        - 2. * points @ centers.T
+        + np.square(centers).sum(axis=1)[None,:])
+    return np.maximum(d, 0.)
+
+# weighted k-means, k-means++ seeding
+# returns (centers, labels), with fewer than k centers if there's fewer than k distinct points
+def kmeans(points, weights, k, numIterations=16, rng=None):
+    if rng is None:
+        rng = np.random.default_rng(0)
+    points = np.asarray(points, dtype=np.float32)
+    weights = np.asarray(weights, dtype=np.float64)
+    if len(points) <= k:
+        return points.copy(), np.arange(len(points))
+
+    centers = [points[rng.choice(len(points), p=weights / weights.sum())]]
+    dist = squaredDistances(points, np.array(centers))[:,0]
+    for i in range(1, k):
+        p = dist * weights
+        if p.sum() <= 0:
+            break
+        centers.append(points[rng.choice(len(points), p=p / p.sum())])
+        dist = np.minimum(dist, squaredDistances(points, centers[-1][None,:])[:,0])
+    centers = np.array(centers)
+
+    for iteration in range(numIterations):
+        labels = np.argmin(squaredDistances(points, centers), axis=1)
+        total = np.bincount(labels, weights, minlength=len(centers))
+        used = total > 0
+        newCenters = centers.copy()
+        for axis in range(points.shape[1]):
+            newCenters[used,axis] = np.bincount(labels, weights * points[:,axis], minlength=len(centers))[used] / total[used]
+        if np.allclose(newCenters, centers, atol=1e-3):
+            break
+        centers = newCenters
+    labels = np.argmin(squaredDistances(points, centers), axis=1)
+    return centers, labels
+
+# the 15 opaque colors of a palette, fit to the weighted colors
+# returns uint16 RGBA5551 array of shape (numColors,), color 0 transparent, unused colors repeat the first
+def fitPalette(rgb, weights):
+    palette = np.zeros(numColors, dtype=np.uint16)
+    if len(rgb) == 0:
+        return palette
+    centers, labels = kmeans(rgb, weights, numColors - 1)
+    centers = np.clip(np.rint(centers), 0, 31).astype(np.uint16)
+    colors = centers[:,0] | (centers[:,1] << 5) | (centers[:,2] << 10) | np.uint16(0x8000)
+    palette[1:1+len(colors)] = colors
+    palette[1+len(colors):] = colors[0]
+    return palette
+
+# rgba = float array of shape (height, width, 4) in [0,1], for TexBlob that's (1024, 256, 4), the 4 pages stacked
+# regions = int array of shape (height, width) of the region of each pixel, negative for pixels that don't matter,
+#  or None to use blockRegions()
+# returns (indexes, palettes, palForRegion):
+#  indexes = uint8 array of shape (height, width) of the color index of each pixel, like TexBlob.indexArray()
+#  palettes = uint16 array of shape (16, 16) of RGBA5551 colors, like PalChunk.pals
+#  palForRegion = int32 array of the palette of each region number, -1 for numbers that weren't used
+def quantize(rgba, regions=None, numIterations=4):
+    rgba = np.asarray(rgba, dtype=np.float32)
+    height, width = rgba.shape[:2]
+    if regions is None:
+        regions = blockRegions(height, width)
+    regions = np.asarray(regions, dtype=np.int64)
+
+    # distinct (region, color) pairs
+    # pixels outside any region are quantized with region 0's palette, but don't count towards fitting it
+    codes = toRGBA5551(rgba).ravel()
+    pixelRegions = regions.ravel()
+    keys = (np.maximum(pixelRegions, 0) << 16) | codes
+    counts = np.where(pixelRegions >= 0, 1., 0.)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, counts, minlength=len(keys))
+    regionIds, pairRegion = np.unique(keys >> 16, return_inverse=True)
+    pairCode = (keys & 0xffff).astype(np.uint16)
+    pairRGB = rgbOfRGBA5551(pairCode)
+    opaque = pairCode != 0
+    numRegions = len(regionIds)
+
+    # start by grouping regions by their average opaque color
+    regionWeight = np.bincount(pairRegion, counts * opaque, minlength=numRegions)
+    regionRGB = np.stack([
+        np.bincount(pairRegion, counts * opaque * pairRGB[:,axis], minlength=numRegions)
+        for axis in range(3)
+    ], axis=-1) / np.maximum(regionWeight, 1e-9)[:,None]
+    centers, regionPal = kmeans(regionRGB, regionWeight + 1e-9, numPalettes)
+
+    # the distances only depend on the color, so work those out per distinct color, not per pair
+    colorCodes, pairColor = np.unique(pairCode, return_inverse=True)
+    colorRGB = rgbOfRGBA5551(colorCodes)
+    numDistinct = len(colorCodes)
+
+    palettes = np.zeros((numPalettes, numColors), dtype=np.uint16)
+    for iteration in range(numIterations):
+        for pal in range(numPalettes):
+            weights = np.bincount(pairColor, counts * (opaque & (regionPal[pairRegion] == pal)), minlength=numDistinct)
+            use = weights > 0
+            palettes[pal] = fitPalette(colorRGB[use], weights[use])
+
+        # error of each region under each palette, then move regions to their best one
+        if iteration == numIterations - 1:
+            break
+        regionError = np.zeros((numRegions, numPalettes))
+        for pal in range(numPalettes):
+            err = squaredDistances(colorRGB, rgbOfRGBA5551(palettes[pal,1:])).min(axis=1)
+            regionError[:,pal] = np.bincount(pairRegion, counts * opaque * err[pairColor], minlength=numRegions)
+        newRegionPal = np.argmin(regionError, axis=1)
+        if np.array_equal(newRegionPal, regionPal):
+            break
+        regionPal = newRegionPal
+
+    # nearest opaque color of each distinct color in each palette, then pick each pair's from its region's palette
+    # transparent is always color 0
+    nearest = np.stack([
+        1 + np.argmin(squaredDistances(colorRGB, rgbOfRGBA5551(palettes[pal,1:])), axis=1)
+        for pal in range(numPalettes)
+    ], axis=-1).astype(np.uint8)
+    pairIndex = np.where(opaque, nearest[pairColor, regionPal[pairRegion]], 0).astype(np.uint8)
+    indexes = pairIndex[inverse].reshape(height, width)
+
+    palForRegion = np.full(max(int(regionIds.max()) + 1, 1), -1, dtype=np.int32)
+    palForRegion[regionIds] = regionPal
+    return indexes, palettes, palForRegion
+
+# pack color indexes of shape (height, width) into 4bpp bytes, low nibble first, like TexBlob.toBin()
+def packIndexes(indexes):
+    indexes = np.asarray(indexes, dtype=np.uint8).reshape(-1, 2)
+    return (indexes[:,0] | (indexes[:,1] << 4)).tobytes()
+
+# copy quantize() results into a TexBlob and a PalChunk
+def applyToTexBlob(texBlob, indexes):
+    texBlob.indexArray()[:] = indexes
+
+def applyToPalChunk(palChunk, palettes):
+    palChunk.pals = [
+        type(pal).from_buffer_copy(np.asarray(colors, dtype='<u2').tobytes())
+        for (pal, colors) in zip(palChunk.pals, palettes)
+    ]
@@ -0,0 +1,67 @@
+# import -> export check of unedited meshes, run inside blender:
+#  blender --background --factory-startup --python roundtrip_check.py -- MAP001.GNS [MAP002.GNS ...]
+# each map is imported with and without Weld Vertices, then every imported mesh is read back with export_gns.meshChunkArrays()
+#  and its MeshChunk and VisAngleChunk are compared to the bytes in the resource file, like verify.py does for the toBin()s
+# the export's polygon budget isn't run, the unedited mesh has to fit as it is
+# exits with 1 if any of them differ
+import os.path
+import sys
+import contextlib
+import io
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from io_scene_gns import gns, import_gns, export_gns
+
+# None if they match, otherwise a description of the first difference
+def diffBytes(expected, actual):
+    if expected == actual:
+        return None
+    if expected == None:
+        return 'not in the file'
+    n = min(len(expected), len(actual))
+    offset = next((i for i in range(n) if expected[i] != actual[i]), n)
+    return 'first difference at ' + hex(offset) + ', sizes ' + str(len(expected)) + ' vs ' + str(len(actual))
+
+# returns a list of (resource filename, chunk name, diffBytes()) of the chunks that don't match
+def checkMap(path, weld):
+    bpy.ops.wm.read_factory_settings()
+    import_gns.load(bpy.context, [path], weld_vertices=weld)
+    with contextlib.redirect_stdout(io.StringIO()):
+        g = gns.GNS(path)
+    mismatches = []
+    for (filename, meshObj) in export_gns.findImportedObjs(bpy.context, g).items():
+        for res in g.allMeshRes:
+            if res.filename != filename or res.meshChunk == None:
+                continue
+            data = res.readData()
+            original = {i : data[begin:end] for (i, begin, end) in res.chunkBounds(res.header, len(data))}
+            groups = export_gns.meshChunkArrays(meshObj)
+            meshData = gns.MeshChunk.arraysToBin(groups, res.meshChunk.footer)
+            checks = [('mesh', original.get(gns.CHUNK_MESH), meshData)]
+            if res.visAngleChunk != None and 'visAngles' in groups[0]:
+                res.visAngleChunk.setVisAngles([group['visAngles'] for group in groups])
+                res.meshChunk = gns.MeshChunk(meshData, res)
+                checks.append(('visAngles', original.get(gns.CHUNK_VISANGLES), res.visAngleChunk.toBin()))
+            for (name, expected, actual) in checks:
+                diff = diffBytes(expected, actual)
+                if diff != None:
+                    mismatches.append((filename, name, diff))
+            break
+    return mismatches
+
+def main(paths):
+    ok = True
+    for path in paths:
+        for weld in (False, True):
+            mismatches = checkMap(path, weld)
+            print(path, 'weld' if weld else 'no weld', 'OK' if len(mismatches) == 0 else 'MISMATCH')
+            for (filename, name, diff) in mismatches:
+                print('  ', filename, name, diff)
+            ok = ok and len(mismatches) == 0
+    return ok
+
+if __name__ == '__main__':
+    args = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    sys.exit(0 if main(args) else 1)
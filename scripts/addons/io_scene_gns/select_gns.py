@@ -0,0 +1,101 @@
+# selecting the mesh faces that sit on the selected tiles, and the tiles under the selected mesh faces
+# the mesh stores each face's tile in its 'tileIndex' face attribute, written at import
+# the tile meshes have one face per tile in [z][x] order, and their layer in the 'gnsTileLayer' custom property
+
+import bpy
+import numpy as np
+from . import gns
+
+def isTileObj(obj):
+    return obj.type == 'MESH' and 'gnsTileLayer' in obj
+
+def isMeshObj(obj):
+    return obj.type == 'MESH' and 'gnsTileSize' in obj and 'tileIndex' in obj.data.attributes
+
+# gns.TilePolygonIndex of the mesh's 'tileIndex' attribute
+# built fresh each time, edits can change the faces or their tileIndex without changing the face count,
+#  and selecting reads all the mesh's loops and edges anyway
+def getTilePolygonIndex(meshObj):
+    mesh = meshObj.data
+    tileForPolygon = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.attributes['tileIndex'].data.foreach_get('value', tileForPolygon)
+    sizeX, sizeZ = meshObj['gnsTileSize']
+    return gns.TilePolygonIndex(tileForPolygon, 2 * sizeZ * sizeX)
+
+def getSelectedFaces(mesh):
+    select = np.empty(len(mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get('select', select)
+    return np.nonzero(select)[0]
+
+# select faces, and their vertexes and edges so edit mode agrees
+def setSelectedFaces(mesh, faces, extend):
+    faceSelect = np.zeros(len(mesh.polygons), dtype=bool)
+    if extend:
+        mesh.polygons.foreach_get('select', faceSelect)
+    faceSelect[faces] = True
+
+    loopTotal = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loopTotal)
+    loopVertex = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVertex)
+    vertexSelect = np.zeros(len(mesh.vertices), dtype=bool)
+    vertexSelect[loopVertex[np.repeat(faceSelect, loopTotal)]] = True
+
+    edgeVertexes = np.empty(2 * len(mesh.edges), dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edgeVertexes)
+    edgeVertexes = edgeVertexes.reshape(-1, 2)
+    edgeSelect = vertexSelect[edgeVertexes[:,0]] & vertexSelect[edgeVertexes[:,1]]
+
+    mesh.vertices.foreach_set('select', vertexSelect)
+    mesh.edges.foreach_set('select', edgeSelect)
+    mesh.polygons.foreach_set('select', faceSelect)
+    mesh.update()
+
+# direction is 'TILES_TO_MESH' or 'MESH_TO_TILES'
+# works on the selected objects, so select both the tile meshes and the mesh
+# returns the number of faces selected, or an error string
+def selectLinked(context, direction, extend):
+    tileObjs = [obj for obj in context.selected_objects if isTileObj(obj)]
+    meshObjs = [obj for obj in context.selected_objects if isMeshObj(obj)]
+    if len(tileObjs) == 0 or len(meshObjs) == 0:
+        return "select both the tile meshes and the mesh of an imported map"
+
+    # selection lives in the edit mesh while in edit mode, so sync it thru the mesh data
+    wasEditMode = context.mode == 'EDIT_MESH'
+    if wasEditMode:
+        bpy.ops.object.mode_set(mode='OBJECT')
+
+    numSelected = 0
+    if direction == 'TILES_TO_MESH':
+        for meshObj in meshObjs:
+            sizeX, sizeZ = meshObj['gnsTileSize']
+            tiles = []
+            for tileObj in tileObjs:
+                if list(tileObj['gnsTileSize']) != [sizeX, sizeZ]:
+                    continue
+                tiles.append(getSelectedFaces(tileObj.data) + tileObj['gnsTileLayer'] * sizeZ * sizeX)
+            if len(tiles) == 0:
+                continue
+            polygons = getTilePolygonIndex(meshObj).polygonsForTiles(np.concatenate(tiles))
+            setSelectedFaces(meshObj.data, polygons, extend)
+            numSelected += len(polygons)
+    else:
+        for tileObj in tileObjs:
+            sizeX, sizeZ = tileObj['gnsTileSize']
+            tilesPerLayer = sizeZ * sizeX
+            layerStart = tileObj['gnsTileLayer'] * tilesPerLayer
+            faces = []
+            for meshObj in meshObjs:
+                if list(meshObj['gnsTileSize']) != [sizeX, sizeZ]:
+                    continue
+                tiles = getTilePolygonIndex(meshObj).tilesForPolygons(getSelectedFaces(meshObj.data))
+                faces.append(tiles[(tiles >= layerStart) & (tiles < layerStart + tilesPerLayer)] - layerStart)
+            if len(faces) == 0:
+                continue
+            faces = np.concatenate(faces)
+            setSelectedFaces(tileObj.data, faces, extend)
+            numSelected += len(faces)
+
+    if wasEditMode:
+        bpy.ops.object.mode_set(mode='EDIT')
+    return numSelected
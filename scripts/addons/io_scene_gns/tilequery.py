@@ -0,0 +1,353 @@
+# movement range, pathfinding and line-of-sight queries over a TileChunk's tiles
+# everything is precomputed as [y][z][x] arrays, and tiles are referred to by their flat index (y * sizeZ + z) * sizeX + x
+# heights and jump are in the same units as Tile.halfHeight
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# (dz, dx) of the 4 directions you can walk
+walkDirs = ((0, 1), (0, -1), (1, 0), (-1, 0))
+
+# number of bits in the words the BFS uses to track sources in parallel
+wordBits = 64
+
+class TileMap(object):
+    def __init__(self, tileChunk):
+        sizeX, sizeZ = tileChunk.sizeInTiles
+        self.sizeX = sizeX
+        self.sizeZ = sizeZ
+        self.shape = (2, sizeZ, sizeX)
+        self.numTiles = 2 * sizeZ * sizeX
+
+        # [y][z][x] grids
+        self.halfHeight = tileChunk.getField('halfHeight').astype(np.int16)
+        self.slopeHeight = tileChunk.getField('slopeHeight').astype(np.int16)
+        self.slopeType = tileChunk.getField('slopeType').copy()
+        self.depth = tileChunk.getField('depth').astype(np.int16)
+        # height at the center of the tile, where a unit stands
+        self.height = self.halfHeight + .5 * self.slopeHeight
+
+        # the second layer only has tiles where something is set
+        self.exists = np.ones(self.shape, dtype=bool)
+        layer1 = tileChunk.tileGrid[1]
+        self.exists[1] = np.any([layer1[name] != 0 for name in layer1.dtype.names], axis=0)
+
+        self.walkable = self.exists & (tileChunk.getField('cantWalk') == 0)
+
+        # [y][z][x][corner] heights of the tile corners, for the sloped surfaces
+        self.cornerHeights = tileChunk.cornerHeights().astype(np.float32)
+        # the second layer is a slab this thick under its surface
+        self.thickness = np.maximum(tileChunk.getField('thickness'), 1).astype(np.float32)
+
+        # neighbor tables per (jump, maxDepth)
+        self.neighborCache = {}
+
+    def tileIndex(self, y, z, x):
+        return (np.asarray(y) * self.sizeZ + z) * self.sizeX + x
+
+    # returns (y, z, x)
+    def tileCoords(self, index):
+        return np.unravel_index(index, self.shape)
+
+    # returns int32 array of shape (numTiles, 8), the tiles you can step to from each tile
+    # in each of the 4 directions onto either layer
+    # missing neighbors are set to numTiles, which the BFS uses as an always-empty row
+    def neighbors(self, jump, maxDepth=None):
+        key = (jump, maxDepth)
+        nbrs = self.neighborCache.get(key)
+        if nbrs is not None:
+            return nbrs
+
+        canStand = self.walkable
+        if maxDepth is not None:
+            canStand = canStand & (self.depth <= maxDepth)
+
+        y, z, x = np.indices(self.shape)
+        columns = []
+        for (dz, dx) in walkDirs:
+            nz = z + dz
+            nx = x + dx
+            inBounds = (nz >= 0) & (nz < self.sizeZ) & (nx >= 0) & (nx < self.sizeX)
+            nzc = np.clip(nz, 0, self.sizeZ - 1)
+            nxc = np.clip(nx, 0, self.sizeX - 1)
+            for ny in range(2):
+                ok = (inBounds
+                    & canStand
+                    & canStand[ny, nzc, nxc]
+                    & (np.abs(self.height[ny, nzc, nxc] - self.height) <= jump))
+                columns.append(np.where(ok, self.tileIndex(ny, nzc, nxc), self.numTiles).ravel())
+        nbrs = np.stack(columns, axis=1).astype(np.int32)
+        self.neighborCache[key] = nbrs
+        return nbrs
+
+    # BFS from many sources at once
+    # each tile holds a bitset of which sources have reached it, so one pass of array ops advances every source a step
+    # returns int16 array of shape (numSources, numTiles) of the number of steps to each tile, -1 for unreachable
+    def distances(self, sources, jump, maxDepth=None, maxSteps=None):
+        sources = np.atleast_1d(np.asarray(sources, dtype=np.int64))
+        numSources = len(sources)
+        numWords = (numSources + wordBits - 1) // wordBits
+        nbrs = self.neighbors(jump, maxDepth)
+
+        sourceIndexes = np.arange(numSources)
+        sourceWords = sourceIndexes // wordBits
+        sourceBits = np.left_shift(np.uint64(1), (sourceIndexes % wordBits).astype(np.uint64))
+
+        # last row is the missing-neighbor row, which stays empty
+        visited = np.zeros((self.numTiles + 1, numWords), dtype='<u8')
+        np.bitwise_or.at(visited, (sources, sourceWords), sourceBits)
+        frontier = visited.copy()
+
+        # [tile][source] while we fill it
+        distT = np.full((self.numTiles, numWords * wordBits), -1, dtype=np.int16)
+        distT[sources, sourceIndexes] = 0
+
+        step = 0
+        while maxSteps is None or step < maxSteps:
+            step += 1
+            reached = frontier[nbrs[:,0]]
+            for k in range(1, nbrs.shape[1]):
+                reached |= frontier[nbrs[:,k]]
+            reached &= ~visited[:-1]
+            tiles = np.nonzero(reached.any(axis=1))[0]
+            if len(tiles) == 0:
+                break
+            bits = np.unpackbits(
+                reached[tiles].view(np.uint8),
+                axis=1,
+                bitorder='little').view(bool)
+            rows = distT[tiles]
+            rows[bits] = step
+            distT[tiles] = rows
+            visited[:-1] |= reached
+            frontier[:-1] = reached
+        return np.ascontiguousarray(distT[:, :numSources].T)
+
+    # returns bool array of shape (numSources, 2, sizeZ, sizeX) of the tiles within 'move' steps of each source
+    # sources are flat tile indexes, move and jump can be scalars or one per source
+    def reachable(self, sources, move, jump, maxDepth=None):
+        sources = np.atleast_1d(np.asarray(sources, dtype=np.int64))
+        move = np.broadcast_to(move, sources.shape)
+        jump = np.broadcast_to(jump, sources.shape)
+        result = np.zeros((len(sources),) + self.shape, dtype=bool)
+        # group sources by jump, since the graph depends on it
+        for j in np.unique(jump):
+            group = np.nonzero(jump == j)[0]
+            dist = self.distances(sources[group], j, maxDepth, maxSteps=int(move[group].max()))
+            result[group] = ((dist >= 0) & (dist <= move[group, None])).reshape((len(group),) + self.shape)
+        return result
+
+    # returns the list of (y, z, x) from src to dst inclusive, or None if dst can't be reached
+    def shortestPath(self, src, dst, jump, maxDepth=None):
+        dist = self.distances([src], jump, maxDepth)[0]
+        if dist[dst] < 0:
+            return None
+        nbrs = self.neighbors(jump, maxDepth)
+        distPadded = np.append(dist, -1)
+        path = [dst]
+        i = dst
+        while dist[i] > 0:
+            candidates = nbrs[i][distPadded[nbrs[i]] == dist[i] - 1]
+            i = candidates[0]
+            path.append(i)
+        path.reverse()
+        return [tuple(int(c) for c in self.tileCoords(i)) for i in path]
+
+    # returns (tiles, dist) where tiles are the flat indexes of all walkable tiles
+    # and dist is the int16 array of shape (len(tiles), numTiles) of steps between them
+    def allPairsDistances(self, jump, maxDepth=None):
+        tiles = np.nonzero(self.walkable.ravel())[0]
+        return tiles, self.distances(tiles, jump, maxDepth)
+
+    # returns a VisibilityTable of tile-to-tile line-of-sight
+    # rays go from eyeHeight above each tile's center to targetHeight above each other tile's center
+    # numProcesses > 1 splits the pairs across a process pool
+    def lineOfSight(self, eyeHeight=4, targetHeight=4, numProcesses=None):
+        center = self.cornerHeights.mean(axis=-1).reshape(-1)
+        y, z, x = np.indices(self.shape)
+        tiles = np.nonzero(self.exists.ravel())[0]
+        xz = np.column_stack([x.ravel() + .5, z.ravel() + .5])[tiles].astype(np.float32)
+        eyes = np.column_stack([xz, center[tiles] + eyeHeight]).astype(np.float32)
+        targets = np.column_stack([xz, center[tiles] + targetHeight]).astype(np.float32)
+
+        # every pair, or every pair once if the rays are the same both ways
+        symmetric = eyeHeight == targetHeight
+        src, dst = np.indices((len(tiles), len(tiles))).reshape(2, -1)
+        if symmetric:
+            keep = src < dst
+            src = src[keep]
+            dst = dst[keep]
+
+        # sort pairs by their (|dx|, |dz|), since pairs with the same (|dx|, |dz|) cross tile edges at the same t's
+        adx = np.abs(x.ravel()[tiles][dst] - x.ravel()[tiles][src])
+        adz = np.abs(z.ravel()[tiles][dst] - z.ravel()[tiles][src])
+        order = np.argsort(adx * (self.sizeZ + 1) + adz, kind='stable')
+        src = src[order]
+        dst = dst[order]
+
+        args = (self.cornerHeights, self.thickness, self.exists[1], eyes, targets)
+        if numProcesses != None and numProcesses > 1 and len(src) > 0:
+            # split at group boundaries so each group's work stays in one process
+            key = adx[order] * (self.sizeZ + 1) + adz[order]
+            bounds = np.nonzero(np.diff(key))[0] + 1
+            splits = bounds[np.searchsorted(bounds, np.linspace(0, len(src), 4 * numProcesses + 1)[1:-1])] if len(bounds) else []
+            with ProcessPoolExecutor(numProcesses) as pool:
+                pairVisible = np.concatenate(list(pool.map(losPairs, [
+                    args + (srcPart, dstPart)
+                    for (srcPart, dstPart) in zip(np.split(src, splits), np.split(dst, splits))
+                ])))
+        else:
+            pairVisible = losPairs(args + (src, dst))
+
+        visible = np.zeros((self.numTiles, self.numTiles), dtype=bool)
+        visible[tiles[src], tiles[dst]] = pairVisible
+        if symmetric:
+            visible[tiles[dst], tiles[src]] = pairVisible
+            visible[tiles, tiles] = True
+        return VisibilityTable(np.packbits(visible, axis=1), self.numTiles, (self.sizeX, self.sizeZ), eyeHeight, targetHeight)
+
+# bilinear height of each sample point within its tile, for the corner order of gns.tileCornerOffsets
+def heightsAt(corners, u, v):
+    return (corners[...,0] * (1 - u) * (1 - v)
+        + corners[...,1] * (1 - u) * v
+        + corners[...,2] * u * v
+        + corners[...,3] * u * (1 - v))
+
+# lowest and highest of (ray height - bilinear surface height) along the part of a ray within a tile column
+# the ray goes from (u0, v0, hA) to (u1, v1, hB) in the tile's uv, corners in the order of heightsAt()
+# u and v are linear along the part, so the difference is a quadratic in the fraction s along it,
+#  and its extremes are at the ends or at the vertex
+def aboveSurfaceRange(corners, u0, v0, u1, v1, hA, hB):
+    c0 = corners[...,0]
+    a = corners[...,3] - c0
+    b = corners[...,1] - c0
+    k = c0 - corners[...,1] + corners[...,2] - corners[...,3]
+    du = u1 - u0
+    dv = v1 - v0
+    qa = -k * du * dv
+    qb = (hB - hA) - a * du - b * dv - k * (u0 * dv + v0 * du)
+    qc = hA - c0 - a * u0 - b * v0 - k * u0 * v0
+    f0 = qc
+    f1 = qa + qb + qc
+    hasVertex = np.abs(qa) > 1e-9
+    sv = np.where(hasVertex, -qb / (2 * np.where(hasVertex, qa, 1)), 0)
+    inside = hasVertex & (sv > 0) & (sv < 1)
+    fv = np.where(inside, (qa * sv + qb) * sv + qc, f0)
+    return np.minimum(np.minimum(f0, f1), fv), np.maximum(np.maximum(f0, f1), fv)
+
+# line of sight between pairs of points, given as indexes into eyes and targets, whose rows are (x, z, height)
+# walks each ray thru the tile columns it crosses (a 2D DDA in xz), and tests each crossing exactly
+#  against the first layer's surface and the second layer's slab, see aboveSurfaceRange()
+# pairs are expected to be sorted by (|dx|, |dz|), since all rays with the same (|dx|, |dz|) share their crossing t's
+# returns bool array of whether each pair can see each other
+def losPairs(args):
+    cornerHeights, thickness, hasSlab, eyes, targets, src, dst = args
+    sizeZ, sizeX = cornerHeights.shape[1:3]
+    visible = np.ones(len(src), dtype=bool)
+    if len(src) == 0:
+        return visible
+    cornerMin = cornerHeights.min(axis=-1)
+    cornerMax = cornerHeights.max(axis=-1)
+
+    p0 = eyes[src]
+    delta = targets[dst] - p0
+    # eyes and targets are all at tile centers, so the number of tile edges crossed along x and z are ints
+    adx = np.rint(np.abs(delta[:,0])).astype(np.int32)
+    adz = np.rint(np.abs(delta[:,1])).astype(np.int32)
+    key = adx * (sizeZ + 1) + adz
+    bounds = np.concatenate([[0], np.nonzero(np.diff(key))[0] + 1, [len(key)]])
+
+    for (begin, end) in zip(bounds[:-1], bounds[1:]):
+        gx = adx[begin]
+        gz = adz[begin]
+        # t's where the ray crosses tile edges, each pair of consecutive t's is the part of the ray within one tile column
+        # unique() drops the zero-length parts where a ray passes exactly thru a tile corner
+        t = np.unique(np.concatenate([
+            [0., 1.],
+            (np.arange(1, gx + 1) - .5) / max(gx, 1),
+            (np.arange(1, gz + 1) - .5) / max(gz, 1),
+        ])).astype(np.float32)
+        ta = t[:-1]
+        tb = t[1:]
+        tm = .5 * (ta + tb)
+
+        q0 = p0[begin:end,:,None]
+        d = delta[begin:end,:,None]
+        cx = np.clip(np.floor(q0[:,0] + tm * d[:,0]), 0, sizeX - 1).astype(np.int32)
+        cz = np.clip(np.floor(q0[:,1] + tm * d[:,1]), 0, sizeZ - 1).astype(np.int32)
+
+        # the ray is a line, so within a tile column it is lowest and highest at its ends
+        # use each tile's lowest and highest corner to sort out the columns that the ray clearly clears or clearly hits
+        #  and only do the bilinear test on the rest
+        hA = q0[:,2] + ta * d[:,2]
+        hB = q0[:,2] + tb * d[:,2]
+        rayLo = np.minimum(hA, hB)
+        rayHi = np.maximum(hA, hB)
+        blockedSeg = rayHi < cornerMin[0, cz, cx] - 1e-3
+        maybe0 = (rayLo < cornerMax[0, cz, cx] - 1e-3) & ~blockedSeg
+        maybe1 = (hasSlab[cz, cx]
+            & (rayLo < cornerMax[1, cz, cx] - 1e-3)
+            & (rayHi > cornerMin[1, cz, cx] - thickness[1, cz, cx] + 1e-3))
+
+        for (layer, maybe) in ((0, maybe0), (1, maybe1)):
+            pairIndex, segIndex = np.nonzero(maybe)
+            if len(pairIndex) == 0:
+                continue
+            mcx = cx[pairIndex, segIndex]
+            mcz = cz[pairIndex, segIndex]
+            corners = cornerHeights[layer, mcz, mcx]
+            mq0 = q0[pairIndex,:,0]
+            md = d[pairIndex,:,0]
+            mta = ta[segIndex]
+            mtb = tb[segIndex]
+            u0 = np.clip(mq0[:,0] + mta * md[:,0] - mcx, 0, 1)
+            v0 = np.clip(mq0[:,1] + mta * md[:,1] - mcz, 0, 1)
+            u1 = np.clip(mq0[:,0] + mtb * md[:,0] - mcx, 0, 1)
+            v1 = np.clip(mq0[:,1] + mtb * md[:,1] - mcz, 0, 1)
+            lo, hi = aboveSurfaceRange(corners, u0, v0, u1, v1, mq0[:,2] + mta * md[:,2], mq0[:,2] + mtb * md[:,2])
+            if layer == 0:
+                hit = lo < -1e-3
+            else:
+                # the part of the ray is continuous, so it's inside the slab somewhere if its range overlaps (-thickness, 0)
+                hit = (lo < -1e-3) & (hi > -thickness[1, mcz, mcx] + 1e-3)
+            blockedSeg[pairIndex[hit], segIndex[hit]] = True
+
+        blocked = np.any(blockedSeg, axis=1)
+        visible[begin:end] = ~blocked
+    return visible
+
+# tile-to-tile visibility as one bit per pair
+# bits[src] is np.packbits of the visibility from src to every tile
+class VisibilityTable(object):
+    def __init__(self, bits, numTiles, sizeInTiles, eyeHeight, targetHeight):
+        self.bits = bits
+        self.numTiles = numTiles
+        self.sizeInTiles = tuple(sizeInTiles)
+        self.eyeHeight = eyeHeight
+        self.targetHeight = targetHeight
+
+    def visible(self, src, dst):
+        return bool((self.bits[src, dst >> 3] >> (7 - (dst & 7))) & 1)
+
+    # bool array of shape (numTiles, numTiles)
+    def toArray(self):
+        return np.unpackbits(self.bits, axis=1, count=self.numTiles).astype(bool)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            bits=self.bits,
+            numTiles=self.numTiles,
+            sizeInTiles=self.sizeInTiles,
+            eyeHeight=self.eyeHeight,
+            targetHeight=self.targetHeight)
+
+    @staticmethod
+    def load(path):
+        f = np.load(path)
+        return VisibilityTable(
+            f['bits'],
+            int(f['numTiles']),
+            f['sizeInTiles'],
+            float(f['eyeHeight']),
+            float(f['targetHeight']))
@@ -0,0 +1,109 @@
+# byte-exact round-trip check of every resource of every map in a dir
+# each chunk is written back out with its toBin() and compared to the bytes it was read from,
+#  then the whole resource file is compared to the NonTexBlob's toBin(), and each texture to the TexBlob's
+# maps are checked in parallel, and the time each chunk class spends in toBin() is summed up for throughput
+import os
+import os.path
+import io
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import gns
+
+def listMaps(dirpath):
+    filenames = os.listdir(dirpath)
+    return [os.path.join(dirpath, fn)
+        for fn in sorted(filenames)
+        if os.path.splitext(fn)[1].upper() == '.GNS'], filenames
+
+# returns None if they match, otherwise a dict of:
+#  offset = first byte that differs, numDiffs = number of bytes that differ, counting the length difference
+def diffBytes(expected, actual):
+    if expected == actual:
+        return None
+    n = min(len(expected), len(actual))
+    diff = np.frombuffer(expected[:n], dtype=np.uint8) != np.frombuffer(actual[:n], dtype=np.uint8)
+    return {
+        'offset' : int(np.argmax(diff)) if diff.any() else n,
+        'numDiffs' : int(np.count_nonzero(diff)) + abs(len(expected) - len(actual)),
+        'expectedSize' : len(expected),
+        'actualSize' : len(actual),
+    }
+
+# toBin() of chunkIO, timed into timings[name] = [count, bytes, seconds]
+# returns (data, error)
+def timedToBin(chunkIO, name, timings):
+    start = time.perf_counter()
+    try:
+        data = chunkIO.toBin()
+    except Exception as e:
+        return (None, repr(e))
+    seconds = time.perf_counter() - start
+    timing = timings.setdefault(name, [0, 0, 0.])
+    timing[0] += 1
+    timing[1] += len(data)
+    timing[2] += seconds
+    return (data, None)
+
+# worker: check one map
+# returns a dict of:
+#  map = path, error = why it couldn't be parsed or None, log = whatever parsing printed,
+#  mismatches = list of dicts of file, chunk (None for the whole file), chunkClass, and diffBytes() or error
+#  timings = {class name: [count, bytes, seconds]}
+def verifyMap(args):
+    path, mapdirFilenames = args
+    result = {'map' : path, 'error' : None, 'mismatches' : [], 'timings' : {}}
+    mismatches = result['mismatches']
+    timings = result['timings']
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            g = gns.GNS(path, mapdirFilenames=mapdirFilenames)
+        for res in g.allRes:
+            if isinstance(res, gns.TexBlob):
+                checks = [(None, res, res.readData())]
+            elif isinstance(res, gns.NonTexBlob):
+                data = res.readData()
+                checks = [(i, res.chunkIOs[i], data[begin:end])
+                    for (i, begin, end) in res.chunkBounds(res.header, len(data))
+                    if res.chunkIOs[i] != None]
+                # the whole file last, since toBin() rewrites the header offsets
+                checks.append((None, res, data))
+            else:
+                continue
+            for (chunkIndex, chunkIO, expected) in checks:
+                name = type(chunkIO).__name__
+                actual, error = timedToBin(chunkIO, name, timings)
+                mismatch = {'error' : error} if error != None else diffBytes(expected, actual)
+                if mismatch != None:
+                    mismatches.append(dict(file=res.filename, chunk=chunkIndex, chunkClass=name, **mismatch))
+    except Exception as e:
+        result['error'] = repr(e)
+    result['log'] = log.getvalue()
+    return result
+
+# check all maps in dirpath, yields verifyMap() results in map order as they finish
+def verifyDir(dirpath, numProcesses=None):
+    paths, mapdirFilenames = listMaps(dirpath)
+    yield from verifyMaps(paths, mapdirFilenames, numProcesses)
+
+# only pass mapdirFilenames if all the paths are in that one dir
+def verifyMaps(paths, mapdirFilenames=None, numProcesses=None):
+    toCheck = [(path, mapdirFilenames) for path in paths]
+    if numProcesses == None:
+        numProcesses = os.cpu_count() or 1
+    if numProcesses > 1 and len(toCheck) > 1:
+        with ProcessPoolExecutor(numProcesses) as pool:
+            yield from pool.map(verifyMap, toCheck, chunksize=2)
+    else:
+        for args in toCheck:
+            yield verifyMap(args)
+
+# add a verifyMap() result's timings into totals
+def addTimings(totals, timings):
+    for (name, (count, size, seconds)) in timings.items():
+        total = totals.setdefault(name, [0, 0, 0.])
+        total[0] += count
+        total[1] += size
+        total[2] += seconds
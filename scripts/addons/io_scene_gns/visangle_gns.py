@@ -0,0 +1,75 @@
+# showing only the mesh faces the game draws from one camera angle
+# the mesh has a 'hidden<angle>' boolean face attribute per camera angle, written at import, see import_gns.visAngleAttributes
+# a geometry nodes modifier deletes the faces whose attribute for the picked angle is set
+# the modifier only changes what's shown, export reads the mesh itself
+
+import bpy
+import numpy as np
+from .import_gns import visAngleAttributes
+
+modifierName = 'GNS Vis Angle'
+nodeGroupName = 'GNS Vis Angle'
+
+def isVisAngleObj(obj):
+    return obj.type == 'MESH' and all(name in obj.data.attributes for name in visAngleAttributes)
+
+# geometry => geometry without the faces whose boolean attribute named by the 'Attribute' input is set
+def getNodeGroup():
+    ng = bpy.data.node_groups.get(nodeGroupName)
+    if ng != None and ng.bl_idname == 'GeometryNodeTree':
+        return ng
+    ng = bpy.data.node_groups.new(nodeGroupName, 'GeometryNodeTree')
+    ng.inputs.new('NodeSocketGeometry', 'Geometry')
+    ng.inputs.new('NodeSocketString', 'Attribute')
+    ng.outputs.new('NodeSocketGeometry', 'Geometry')
+    nodes = ng.nodes
+    links = ng.links
+
+    inputNode = nodes.new('NodeGroupInput')
+    inputNode.location = (0, 0)
+
+    attrNode = nodes.new('GeometryNodeInputNamedAttribute')
+    attrNode.data_type = 'BOOLEAN'
+    attrNode.location = (200, -200)
+    links.new(attrNode.inputs['Name'], inputNode.outputs['Attribute'])
+
+    deleteNode = nodes.new('GeometryNodeDeleteGeometry')
+    deleteNode.domain = 'FACE'
+    deleteNode.location = (400, 0)
+    links.new(deleteNode.inputs['Geometry'], inputNode.outputs['Geometry'])
+    # the named attribute node has an output per data type, all called 'Attribute', only the one of data_type is enabled
+    links.new(deleteNode.inputs['Selection'], next(socket for socket in attrNode.outputs if socket.enabled))
+
+    outputNode = nodes.new('NodeGroupOutput')
+    outputNode.location = (600, 0)
+    links.new(outputNode.inputs['Geometry'], deleteNode.outputs['Geometry'])
+    return ng
+
+# bool array of shape (numFaces,) of the faces hidden from camera angle 'angle'
+def hiddenFaces(mesh, angle):
+    hidden = np.zeros(len(mesh.polygons), dtype=bool)
+    mesh.attributes[visAngleAttributes[angle]].data.foreach_get('value', hidden)
+    return hidden
+
+# angle = index into gns.visAngleNames, or None to show every face again
+# returns (number of faces shown, number of faces) summed over the objects changed
+def showVisAngle(objs, angle):
+    numShown = 0
+    numFaces = 0
+    for obj in objs:
+        if not isVisAngleObj(obj):
+            continue
+        mod = obj.modifiers.get(modifierName)
+        numFaces += len(obj.data.polygons)
+        if angle == None:
+            if mod != None:
+                obj.modifiers.remove(mod)
+            numShown += len(obj.data.polygons)
+            continue
+        if mod == None:
+            mod = obj.modifiers.new(modifierName, 'NODES')
+            mod.node_group = getNodeGroup()
+        mod[mod.node_group.inputs['Attribute'].identifier] = visAngleAttributes[angle]
+        obj.update_tag()
+        numShown += np.count_nonzero(~hiddenFaces(obj.data, angle))
+    return (numShown, numFaces)
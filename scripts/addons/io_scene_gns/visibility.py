@@ -0,0 +1,105 @@
+# work out the VisAngleFlags of a mesh by raycasting, for when it was edited and the hidden<angle> attributes don't fit it anymore
+# works on the 4 group dicts of gns.MeshChunk.arraysToBin(), in FFT coordinates (y is down)
+# the game's camera is close to orthographic, so every ray of one camera angle goes the same direction, towards the camera
+# each face gets sample points, its center and its corners pulled a bit towards the center
+# a face is hidden from an angle when the rays from all its sample points hit some other face of the map
+# the rays of an angle are cast in rounds, the centers first, then the corners of the faces that are still hidden
+# the rays go through mathutils.bvhtree.BVHTree.ray_cast one by one, it holds the GIL, so there are no worker threads
+import time
+import numpy as np
+from mathutils import Vector
+from mathutils.bvhtree import BVHTree
+from . import gns
+
+# compass bearings of gns.visAngleDirections, clockwise from north, north is -z and east is +x
+# and the camera's pitch above the horizon of gns.visAngleElevations
+# these are a best guess, like the bit order
+visAngleBearingDegrees = [337.5 - 45. * i for i in range(len(gns.visAngleDirections))]
+visAngleElevationDegrees = [30., 45.]
+
+# how far towards the center the corner samples are pulled, as a fraction of the way
+cornerInset = .2
+# how far along the ray to start, in FFT units, so it doesn't hit the face it starts on
+rayOffset = .25
+
+# float64 array of shape (16, 3), the direction towards the camera for each bit of the VisAngleFlags, in FFT coordinates
+def cameraDirections():
+    dirs = []
+    for elevation in np.radians(visAngleElevationDegrees):
+        for bearing in np.radians(visAngleBearingDegrees):
+            dirs.append((
+                np.sin(bearing) * np.cos(elevation),
+                -np.sin(elevation),
+                -np.cos(bearing) * np.cos(elevation),
+            ))
+    return np.array(dirs)
+
+# BVHTree of every polygon of the groups, quads split into the tris the PSX draws, v0 v1 v2 and v1 v2 v3
+def buildTree(groups):
+    vertexes = []
+    tris = []
+    numVertexes = 0
+    for group in groups:
+        pos = group['pos'].astype(np.float64)
+        numFaces, numVtxs = pos.shape[:2]
+        if numFaces == 0:
+            continue
+        vertexes.append(pos.reshape(-1, 3))
+        first = numVertexes + numVtxs * np.arange(numFaces)[:,None]
+        tris.append(first + [0, 1, 2])
+        if numVtxs == 4:
+            tris.append(first + [1, 3, 2])
+        numVertexes += numFaces * numVtxs
+    if numVertexes == 0:
+        return None
+    return BVHTree.FromPolygons(np.concatenate(vertexes).tolist(), np.concatenate(tris).tolist())
+
+# float64 array of shape (numFaces, 1 + numVtxs, 3), each face's center then its inset corners
+def samplePoints(pos):
+    pos = pos.astype(np.float64)
+    center = pos.mean(axis=1, keepdims=True)
+    return np.concatenate([center, pos + cornerInset * (center - pos)], axis=1)
+
+# bool array of the points whose ray towards direction 'dir' hits nothing
+def castRays(tree, points, dir):
+    dirVec = Vector(dir)
+    origins = points + rayOffset * dir
+    clear = np.zeros(len(points), dtype=bool)
+    for (i, origin) in enumerate(origins.tolist()):
+        clear[i] = tree.ray_cast(origin, dirVec)[0] == None
+    return clear
+
+# returns a list of uint16 VisAngleFlags arrays, one per group, a set bit is hidden from that angle
+def computeVisAngles(groups):
+    groups = list(groups)
+    dirs = cameraDirections()
+    tree = buildTree(groups)
+    samples = [samplePoints(group['pos']) for group in groups]
+    faceCounts = [len(s) for s in samples]
+    if tree == None:
+        return [np.zeros(n, dtype=np.uint16) for n in faceCounts]
+
+    # all the groups' faces in one list, tris padded to the 5 samples of quads
+    allSamples = np.concatenate([
+        np.pad(s, ((0, 0), (0, 5 - s.shape[1]), (0, 0)))
+        for s in samples
+    ])
+    numSamples = np.concatenate([np.full(len(s), s.shape[1]) for s in samples])
+    numFaces = len(allSamples)
+
+    start = time.perf_counter()
+    numRays = 0
+    bits = np.ones((numFaces, len(dirs)), dtype=bool)
+    for (angle, dir) in enumerate(dirs):
+        hidden = np.ones(numFaces, dtype=bool)
+        for sample in range(allSamples.shape[1]):
+            faces = np.nonzero(hidden & (numSamples > sample))[0]
+            if len(faces) == 0:
+                break
+            hidden[faces[castRays(tree, allSamples[faces, sample], dir)]] = False
+            numRays += len(faces)
+        bits[:,angle] = hidden
+    print("computed the vis angles of " + str(numFaces) + " faces with " + str(numRays) + " rays in " + str(time.perf_counter() - start) + "s")
+
+    visAngles = gns.visAnglesFromBits(bits)
+    return np.split(visAngles, np.cumsum(faceCounts)[:-1])